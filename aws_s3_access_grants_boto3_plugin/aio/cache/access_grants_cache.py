@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from botocore.exceptions import ClientError
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.aio.cache.account_id_resolver_cache import AioAccountIdResolverCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.event_loop import PerEventLoop, call_backend
+from aws_s3_access_grants_boto3_plugin.aio.cache.single_flight import AioSingleFlight
+from aws_s3_access_grants_boto3_plugin.cache.access_grants_cache import AccessGrantsCache, \
+    DEFAULT_ACCESS_GRANTS_CACHE_SIZE, GET_DATA_ACCESS_DURATION, DEFAULT_EXPIRATION_SAFETY_MARGIN, METRICS_TAGS
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
+
+logger = logging.getLogger(__name__)
+
+
+class AioAccessGrantsCache(AccessGrantsCache):
+    account_id_resolver_cache = PerEventLoop(AioAccountIdResolverCache)
+
+    def __init__(self, cache_size=DEFAULT_ACCESS_GRANTS_CACHE_SIZE,
+                 duration=GET_DATA_ACCESS_DURATION, refresh_ahead_fraction=None,
+                 expiration_safety_margin=DEFAULT_EXPIRATION_SAFETY_MARGIN, backend=None,
+                 account_id_resolver_cache=None, widen_target_levels=0):
+        super().__init__(cache_size, duration, refresh_ahead_fraction, expiration_safety_margin, backend,
+                         account_id_resolver_cache, widen_target_levels)
+        self._single_flight = AioSingleFlight()
+        self._refresh_tasks = set()
+
+    def _create_signing_credentials(self, credentials):
+        # aiobotocore is an optional dependency, only needed once credentials are fetched.
+        from aiobotocore.credentials import AioCredentials
+        return AioCredentials(access_key=credentials.get('AccessKeyId'), secret_key=credentials.get('SecretAccessKey'),
+                              token=credentials.get('SessionToken'))
+
+    async def _get_credentials_from_service(self, s3_control_client, cache_key, account_id):
+        if s3_control_client is None:
+            raise IllegalArgumentException("S3 Control Client should not be null")
+        bucket_owner_account_id = await self.account_id_resolver_cache.resolve(s3_control_client, account_id,
+                                                                               cache_key.s3_prefix)
+        logger.debug("Fetching credentials from Access Grants for accountId: %s, s3Prefix: %s, permission: %s, "
+                     "privilege: DEFAULT", bucket_owner_account_id, cache_key.s3_prefix, cache_key.permission)
+        with metrics.downstream_call(metrics.GET_DATA_ACCESS_TAGS):
+            return await s3_control_client.get_data_access(AccountId=bucket_owner_account_id,
+                                                           Target=cache_key.s3_prefix,
+                                                           Permission=cache_key.permission, Privilege='Default',
+                                                           DurationSeconds=self.duration)
+
+    async def get_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Fetching credentials from Access Grants for s3Prefix: %s", cache_key.s3_prefix)
+        matched_key, credentials = self._search_cached_entry(cache_key)
+        if credentials is not None and self.refresh_ahead_fraction is not None and self._should_refresh(matched_key):
+            self._schedule_refresh(matched_key, s3_control_client, cache_key, account_id, access_denied_cache)
+        if credentials is None:
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            if debug:
+                logger.debug("Credentials not available in the cache. Fetching credentials from Access Grants service.")
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                credentials = await self._single_flight.do(cache_key, self._load_credentials, s3_control_client,
+                                                           cache_key, account_id, access_denied_cache)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+        return credentials
+
+    async def _load_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
+        if self.backend is not None:
+            credentials = await call_backend(self.backend, self._search_credentials_in_backend, cache_key)
+            if credentials is not None:
+                return credentials
+        return await self._fetch_credentials(s3_control_client, cache_key, account_id, access_denied_cache)
+
+    async def _fetch_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
+        widened_key = self._get_widened_key(cache_key)
+        if widened_key is not None and access_denied_cache.get_value_from_cache(widened_key) is None:
+            try:
+                return await self._single_flight.do(widened_key, self._fetch_target_credentials, s3_control_client,
+                                                    widened_key, account_id, access_denied_cache)
+            except ClientError as e:
+                logger.debug("Could not get credentials for the widened target %s, requesting %s: %s",
+                             widened_key.s3_prefix, cache_key.s3_prefix, e)
+        return await self._fetch_target_credentials(s3_control_client, cache_key, account_id, access_denied_cache)
+
+    async def _fetch_target_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
+        try:
+            response = await self._get_credentials_from_service(s3_control_client, cache_key, account_id)
+        except ClientError as e:
+            self._handle_service_error(cache_key, e, access_denied_cache)
+            raise e
+        return await call_backend(self.backend, self._cache_service_response, cache_key, response)
+
+    def _start_refresh(self, matched_key, s3_control_client, cache_key, account_id, access_denied_cache):
+        # Keep a reference to the task so that it is not garbage collected before it completes.
+        task = asyncio.get_running_loop().create_task(
+            self._refresh(matched_key, s3_control_client, cache_key, account_id, access_denied_cache))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh(self, matched_key, s3_control_client, cache_key, account_id, access_denied_cache):
+        try:
+            await self._fetch_credentials(s3_control_client, cache_key, account_id, access_denied_cache)
+        except Exception as e:
+            logger.debug("Failed to refresh the cached credentials, they will be fetched again once they expire: %s",
+                         e)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(matched_key)
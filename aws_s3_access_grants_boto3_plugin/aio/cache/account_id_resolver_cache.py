@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from aws_s3_access_grants_boto3_plugin.aio.cache.event_loop import call_backend
+from aws_s3_access_grants_boto3_plugin.aio.cache.single_flight import AioSingleFlight
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.cache.account_id_resolver_cache import AccountIdResolverCache, \
+    DEFAULT_ACCOUNT_ID_CACHE_SIZE, DEFAULT_TTL, METRICS_TAGS, DEFAULT_RESOLVE_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class AioAccountIdResolverCache(AccountIdResolverCache):
+
+    def __init__(self, cache_size=DEFAULT_ACCOUNT_ID_CACHE_SIZE,
+                 cache_ttl=DEFAULT_TTL, backend=None, snapshot=None):
+        super().__init__(cache_size, cache_ttl, backend, snapshot)
+        self._single_flight = AioSingleFlight()
+        self._revalidation_tasks = set()
+
+    async def _resolve_from_service(self, s3_control_client, account_id, s3_prefix):
+        with metrics.downstream_call(metrics.GET_ACCESS_GRANTS_INSTANCE_FOR_PREFIX_TAGS):
+            access_grants_instance_for_prefix = await s3_control_client.get_access_grants_instance_for_prefix(
+                AccountId=account_id, S3Prefix=s3_prefix)
+        return self._get_account_id(access_grants_instance_for_prefix)
+
+    async def resolve(self, s3_control_client, requester_account_id, s3_prefix):
+        bucket_name = self._get_bucket_name(s3_prefix)
+        account_id = self.account_id_resolver_cache.get(bucket_name)
+        if account_id is None:
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                account_id = await self._single_flight.do(bucket_name, self._resolve_and_cache, s3_control_client,
+                                                          requester_account_id, s3_prefix, bucket_name)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+            if self._unverified_buckets:
+                self._revalidate(s3_control_client, requester_account_id, s3_prefix, bucket_name)
+        return account_id
+
+    async def resolve_many(self, s3_control_client, requester_account_id, buckets,
+                           max_workers=DEFAULT_RESOLVE_MAX_WORKERS):
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def resolve_bucket(bucket):
+            async with semaphore:
+                return await self.resolve(s3_control_client, requester_account_id, "s3://" + bucket)
+        buckets = list(set(buckets))
+        results = await asyncio.gather(*[resolve_bucket(bucket) for bucket in buckets], return_exceptions=True)
+        account_ids = {bucket: result for bucket, result in zip(buckets, results) if not isinstance(result, Exception)}
+        failures = {bucket: result for bucket, result in zip(buckets, results) if isinstance(result, Exception)}
+        return account_ids, failures
+
+    def _start_revalidation(self, s3_control_client, requester_account_id, s3_prefix, bucket_name):
+        # Keep a reference to the task so that it is not garbage collected before it completes.
+        task = asyncio.get_running_loop().create_task(
+            self._revalidate_from_service(s3_control_client, requester_account_id, s3_prefix, bucket_name))
+        self._revalidation_tasks.add(task)
+        task.add_done_callback(self._revalidation_tasks.discard)
+
+    async def _revalidate_from_service(self, s3_control_client, requester_account_id, s3_prefix, bucket_name):
+        try:
+            account_id = await self._resolve_from_service(s3_control_client, requester_account_id, s3_prefix)
+        except Exception as e:
+            logger.debug("Failed to revalidate the account id of bucket %s: %s", bucket_name, e)
+            return
+        await call_backend(self.backend, self._cache_resolved, bucket_name, account_id)
+
+    async def _resolve_and_cache(self, s3_control_client, requester_account_id, s3_prefix, bucket_name):
+        account_id = await call_backend(self.backend, self._load_from_backend, bucket_name)
+        if account_id is None:
+            account_id = await self._resolve_from_service(s3_control_client, requester_account_id, s3_prefix)
+            await call_backend(self.backend, self._cache_resolved, bucket_name, account_id)
+        return account_id
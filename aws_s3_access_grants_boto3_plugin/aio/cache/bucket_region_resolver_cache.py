@@ -0,0 +1,47 @@
+from botocore.exceptions import ClientError
+import logging
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.aio.cache.event_loop import call_backend
+from aws_s3_access_grants_boto3_plugin.aio.cache.single_flight import AioSingleFlight
+from aws_s3_access_grants_boto3_plugin.cache.bucket_region_resolver_cache import BucketRegionResolverCache, \
+    DEFAULT_BUCKET_REGION_CACHE_SIZE, DEFAULT_BUCKET_REGION_CACHE_TTL, METRICS_TAGS
+
+logger = logging.getLogger(__name__)
+
+
+class AioBucketRegionResolverCache(BucketRegionResolverCache):
+
+    def __init__(self,
+                 cache_size=DEFAULT_BUCKET_REGION_CACHE_SIZE,
+                 cache_ttl=DEFAULT_BUCKET_REGION_CACHE_TTL, backend=None, static_regions=None,
+                 observe_responses=False):
+        super().__init__(cache_size, cache_ttl, backend, static_regions, observe_responses)
+        self._single_flight = AioSingleFlight()
+
+    async def _resolve_from_service(self, s3_client, bucket):
+        try:
+            with metrics.downstream_call(metrics.HEAD_BUCKET_TAGS):
+                head_bucket_response = await s3_client.head_bucket(Bucket=bucket)
+            resolved_region = head_bucket_response['BucketRegion']
+        except ClientError as e:
+            resolved_region = self._resolve_from_error(e)
+        return resolved_region
+
+    async def resolve(self, s3_client, bucket):
+        bucket_region = self.bucket_region_resolver_cache.get(bucket)
+        if bucket_region is None:
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Region for bucket \"%s\" not available in cache. Fetching region from service", bucket)
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                bucket_region = await self._single_flight.do(bucket, self._resolve_and_cache, s3_client, bucket)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+        return bucket_region
+
+    async def _resolve_and_cache(self, s3_client, bucket):
+        bucket_region = await call_backend(self.backend, self._load_from_known_regions, bucket)
+        if bucket_region is None:
+            bucket_region = await self._resolve_from_service(s3_client, bucket)
+            await call_backend(self.backend, self._cache_resolved, bucket, bucket_region)
+        return bucket_region
@@ -0,0 +1,36 @@
+from aws_s3_access_grants_boto3_plugin.aio.cache.event_loop import call_backend
+from aws_s3_access_grants_boto3_plugin.aio.cache.single_flight import AioSingleFlight
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.cache.caller_identity_resolver_cache import CallerIdentityResolverCache, \
+    DEFAULT_CALLER_IDENTITY_CACHE_SIZE, DEFAULT_CALLER_IDENTITY_CACHE_TTL, METRICS_TAGS
+
+
+class AioCallerIdentityResolverCache(CallerIdentityResolverCache):
+
+    def __init__(self, cache_size=DEFAULT_CALLER_IDENTITY_CACHE_SIZE,
+                 cache_ttl=DEFAULT_CALLER_IDENTITY_CACHE_TTL, backend=None):
+        super().__init__(cache_size, cache_ttl, backend)
+        self._single_flight = AioSingleFlight()
+
+    async def _resolve_from_service(self, sts_client):
+        with metrics.downstream_call(metrics.GET_CALLER_IDENTITY_TAGS):
+            caller_identity = await sts_client.get_caller_identity()
+        return caller_identity['Account']
+
+    async def resolve(self, sts_client, requester_credentials):
+        access_key = requester_credentials.access_key
+        account_id = self.caller_identity_resolver_cache.get(access_key)
+        if account_id is None:
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                account_id = await self._single_flight.do(access_key, self._resolve_and_cache, sts_client, access_key)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+        return account_id
+
+    async def _resolve_and_cache(self, sts_client, access_key):
+        account_id = await call_backend(self.backend, self._load_from_backend, access_key)
+        if account_id is None:
+            account_id = await self._resolve_from_service(sts_client)
+            await call_backend(self.backend, self._cache_resolved, access_key, account_id)
+        return account_id
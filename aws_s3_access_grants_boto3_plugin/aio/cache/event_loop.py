@@ -0,0 +1,41 @@
+import asyncio
+import functools
+import weakref
+
+
+async def call_backend(backend, fn, *args):
+    """
+    Calls fn, which reads or writes the cache backend, in the default executor when there is a backend, since
+    backends do blocking I/O that must not hold up the event loop.
+    """
+    if backend is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+
+class PerEventLoop:
+    """
+    Class attribute holding one instance, created by factory, for each event loop it is read from, and one more for
+    code that runs outside of any event loop.
+
+    The aio caches hold futures and tasks, which belong to the loop that created them, so the caches shared by
+    default between plugins are only shared between the plugins of one loop. An instance attribute of the same name,
+    for example a cache passed to a plugin, takes precedence.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._instances = weakref.WeakKeyDictionary()
+        self._instance_outside_loop = None
+
+    def __get__(self, obj, owner=None):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if self._instance_outside_loop is None:
+                self._instance_outside_loop = self.factory()
+            return self._instance_outside_loop
+        instance = self._instances.get(loop)
+        if instance is None:
+            instance = self._instances[loop] = self.factory()
+        return instance
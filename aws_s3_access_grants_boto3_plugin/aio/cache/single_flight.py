@@ -0,0 +1,44 @@
+import asyncio
+
+
+class AioSingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single call, the asyncio counterpart of SingleFlight.
+
+    The first task to ask for a key awaits the coroutine function, every other task asking for the same key while
+    that call is in flight awaits a future that receives its result, or its exception. If the task making the call
+    is cancelled, the call is not failed for the others: the first of them to resume makes the call again.
+    """
+
+    def __init__(self):
+        self._futures = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        future = self._futures.get(key)
+        while future is not None:
+            try:
+                # A waiter being cancelled must not cancel the call the other waiters depend on.
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # The task making the call was cancelled, unless another waiter has taken it over already.
+            future = self._futures.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved, there may be no waiters to retrieve it.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._futures[key]
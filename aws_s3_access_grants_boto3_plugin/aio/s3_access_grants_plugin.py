@@ -0,0 +1,242 @@
+import asyncio
+import contextlib
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+import logging
+from aws_s3_access_grants_boto3_plugin.aio.cache.access_grants_cache import AioAccessGrantsCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.bucket_region_resolver_cache import AioBucketRegionResolverCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.caller_identity_resolver_cache import AioCallerIdentityResolverCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.event_loop import PerEventLoop
+from aws_s3_access_grants_boto3_plugin.aio.cache.single_flight import AioSingleFlight
+from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
+from aws_s3_access_grants_boto3_plugin.operation_permissions import get_s3_operation, get_permission_for_s3_operation
+from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import S3AccessGrantsPlugin, DEFAULT_WARM_MAX_WORKERS, \
+    PINNED_MULTIPART_UPLOAD_OPERATIONS, _delete_objects_batch_credentials, _sending_delete_objects_batches
+
+logger = logging.getLogger(__name__)
+
+
+class AioS3AccessGrantsPlugin(S3AccessGrantsPlugin):
+    """
+    S3 Access Grants plugin for aiobotocore S3 clients.
+
+    The internal sts, s3 and s3control clients are created on first use and stay open until close() is called, so
+    the plugin should be closed, or used as an async context manager, together with the S3 client it is registered on.
+    Closing the plugin also flushes its snapshot, if it has one.
+
+    Caches that are not passed in are shared by the plugins of the same event loop.
+    """
+    access_grants_cache = PerEventLoop(AioAccessGrantsCache)
+    bucket_region_cache = PerEventLoop(AioBucketRegionResolverCache)
+    caller_identity_cache = PerEventLoop(AioCallerIdentityResolverCache)
+
+    def __init__(self, s3_client, fallback_enabled=False, customer_session=None, split_delete_objects=False,
+                 cache_size=None, duration=None, access_grants_cache=None, access_denied_cache=None,
+                 bucket_region_cache=None, caller_identity_cache=None, account_id_resolver_cache=None,
+                 multipart_upload_cache=None, snapshot=None):
+        self.s3_client = s3_client
+        self.fallback_enabled = fallback_enabled
+        self.split_delete_objects = split_delete_objects
+        self.multipart_upload_cache = multipart_upload_cache
+        self._configure_caches(cache_size, duration, access_grants_cache, access_denied_cache, bucket_region_cache,
+                               caller_identity_cache, account_id_resolver_cache, snapshot)
+        self._load_snapshot(snapshot)
+
+        # aiobotocore is an optional dependency, imported by the plugins that use it rather than with the package.
+        from aiobotocore.session import AioSession, get_session
+        if isinstance(customer_session, AioSession):
+            self.session = customer_session
+        elif customer_session is None:  # Customer has not set session explicitly, so we use default aiobotocore session
+            self.session = get_session()
+        else:
+            raise IllegalArgumentException("customer_session must be type of aiobotocore.session.AioSession")
+
+        self._clients = {}
+        self._client_single_flight = AioSingleFlight()
+        self._exit_stack = contextlib.AsyncExitStack()
+
+    def _create_access_grants_cache(self, cache_size, duration, account_id_resolver_cache, backend=None):
+        return AioAccessGrantsCache(**self._get_access_grants_cache_params(cache_size, duration,
+                                                                           account_id_resolver_cache, backend))
+
+    def _create_bucket_region_cache(self, backend):
+        return AioBucketRegionResolverCache(backend=backend)
+
+    def _create_caller_identity_cache(self, backend):
+        return AioCallerIdentityResolverCache(backend=backend)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        self._clients = {}
+        await self._exit_stack.aclose()
+        if self.snapshot is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.snapshot.flush)
+
+    async def _get_client(self, service_name, region_name=None):
+        client = self._clients.get((service_name, region_name))
+        if client is None:
+            client = await self._client_single_flight.do((service_name, region_name), self._create_client,
+                                                         service_name, region_name)
+        return client
+
+    async def _create_client(self, service_name, region_name):
+        from aiobotocore.utils import create_nested_client
+        client = await self._exit_stack.enter_async_context(
+            create_nested_client(self.session, service_name, region_name=region_name, config=self.session_config))
+        self._clients[(service_name, region_name)] = client
+        return client
+
+    async def warm(self, prefixes, permissions=("READ",), max_workers=DEFAULT_WARM_MAX_WORKERS):
+        """
+        Loads the bucket regions, bucket owner account ids, and Access Grants credentials for the given targets into
+        the caches, see S3AccessGrantsPlugin.warm. At most max_workers targets are resolved concurrently.
+        """
+        targets = self._get_warm_targets(prefixes, permissions)
+        requester_credentials = await self.s3_client._get_credentials().get_frozen_credentials()
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def warm_target(s3_prefix, permission):
+            async with semaphore:
+                await self._resolve_credentials(requester_credentials, permission, s3_prefix,
+                                                self._get_bucket_name(s3_prefix))
+        results = await asyncio.gather(*[warm_target(*target) for target in targets], return_exceptions=True)
+        failures = {target: result for target, result in zip(targets, results) if isinstance(result, Exception)}
+        for (s3_prefix, permission), e in failures.items():
+            logger.debug("Could not warm the caches for s3Prefix: %s and permission: %s: %s", s3_prefix, permission, e)
+        return failures
+
+    async def resolve_bucket_owners(self, buckets, max_workers=DEFAULT_WARM_MAX_WORKERS):
+        """
+        Loads the owner account id of the given buckets into the account id cache, asking the S3 Control client of
+        the region of each bucket, see S3AccessGrantsPlugin.resolve_bucket_owners.
+        """
+        requester_credentials = await self.s3_client._get_credentials().get_frozen_credentials()
+        requester_account_id = await self._get_requester_account_id(requester_credentials)
+        buckets = list(set(buckets))
+        s3_client = await self._get_client('s3')
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def resolve_region(bucket):
+            async with semaphore:
+                return await self.bucket_region_cache.resolve(s3_client, bucket)
+        regions = await asyncio.gather(*[resolve_region(bucket) for bucket in buckets], return_exceptions=True)
+        failures = {bucket: region for bucket, region in zip(buckets, regions) if isinstance(region, Exception)}
+        buckets_by_region = self._group_buckets_by_region(
+            {bucket: region for bucket, region in zip(buckets, regions) if bucket not in failures})
+        account_ids = {}
+        for region, region_buckets in buckets_by_region.items():
+            resolved, region_failures = await self.access_grants_cache.account_id_resolver_cache.resolve_many(
+                await self._get_client('s3control', region), requester_account_id, region_buckets, max_workers)
+            account_ids.update(resolved)
+            failures.update(region_failures)
+        return account_ids, failures
+
+    async def _get_access_grants_credentials(self, operation_name, request, **kwargs):
+        requester_credentials = self.s3_client._get_credentials()
+        if self.multipart_upload_cache is not None and operation_name in PINNED_MULTIPART_UPLOAD_OPERATIONS:
+            frozen_credentials = await requester_credentials.get_frozen_credentials()
+            s3ag_credentials = self.multipart_upload_cache.get_credentials(self._get_upload_id(request.context),
+                                                                           frozen_credentials.access_key)
+            if s3ag_credentials is not None:
+                request.context['signing']['request_credentials'] = s3ag_credentials.signing_credentials
+                return
+        if operation_name == 'DeleteObjects' and self._sign_delete_objects_batch(request):
+            return
+        try:
+            permission, get_s3_prefix = get_s3_operation(operation_name)
+            s3_prefix = get_s3_prefix(self, request.context)
+            bucket_name = request.context['input_params']['Bucket']
+            requester_credentials = await requester_credentials.get_frozen_credentials()
+            s3ag_credentials = await self._resolve_credentials(requester_credentials, permission, "s3://" + s3_prefix,
+                                                               bucket_name)
+            # The signing credentials are built when the credentials are cached and shared by the requests signed with
+            # them, so a cache hit does not allocate any.
+            request.context['signing']['request_credentials'] = \
+                self.access_grants_cache._with_signing_credentials(s3ag_credentials).signing_credentials
+            if self.multipart_upload_cache is not None:
+                self._track_multipart_upload(operation_name, request.context, requester_credentials.access_key,
+                                             s3ag_credentials)
+
+        except Exception as e:
+            if self._should_fallback_to_default_credentials_for_this_case(e):
+                pass
+            else:
+                raise e
+
+    async def _split_delete_objects(self, model, params, context, **kwargs):
+        if _sending_delete_objects_batches.get() or 's3_redirect' not in context:
+            return None
+        api_params = self._get_delete_objects_params(model, context)
+        requester_credentials = await self.s3_client._get_credentials().get_frozen_credentials()
+        batches = await self._group_objects_by_grant(requester_credentials, api_params)
+        if len(batches) < 2:
+            return None
+        logger.debug("Splitting DeleteObjects request into %s requests, one per grant.", len(batches))
+        # The sub-requests are sent concurrently, their tasks inherit the flag from this context.
+        token = _sending_delete_objects_batches.set(True)
+        try:
+            results = await asyncio.gather(*[self._delete_objects_batch(api_params, batch, s3ag_credentials)
+                                             for s3ag_credentials, batch in batches])
+        finally:
+            _sending_delete_objects_batches.reset(token)
+        return AWSResponse(params['url'], 200, {}, None), self._merge_delete_objects_results(results)
+
+    async def _group_objects_by_grant(self, requester_credentials, api_params):
+        bucket_name = api_params['Bucket']
+        permission = get_permission_for_s3_operation('DeleteObjects')
+        cache_keys = [CacheKey(permission=permission, credentials=requester_credentials,
+                               s3_prefix="s3://" + bucket_name + "/" + delete_object['Key'])
+                      for delete_object in api_params['Delete']['Objects']]
+        s3_prefixes = self._get_uncovered_directory_prefixes(cache_keys)
+        semaphore = asyncio.Semaphore(DEFAULT_WARM_MAX_WORKERS)
+
+        async def resolve(s3_prefix):
+            async with semaphore:
+                await self._resolve_delete_objects_grant(requester_credentials, permission, s3_prefix, bucket_name)
+        await asyncio.gather(*[resolve(s3_prefix) for s3_prefix in s3_prefixes])
+        return self._group_by_covering_grant(api_params['Delete']['Objects'], cache_keys)
+
+    async def _resolve_delete_objects_grant(self, requester_credentials, permission, s3_prefix, bucket_name):
+        try:
+            await self._resolve_credentials(requester_credentials, permission, s3_prefix, bucket_name)
+        except Exception as e:
+            logger.debug("Could not find a grant for s3Prefix: %s: %s", s3_prefix, e)
+
+    # Each sub-request runs in a task of its own, whose context the credentials are set in.
+    async def _delete_objects_batch(self, api_params, batch, s3ag_credentials):
+        _delete_objects_batch_credentials.set(s3ag_credentials)
+        try:
+            return batch, await self.s3_client.delete_objects(
+                **self._get_delete_objects_batch_params(api_params, batch))
+        except ClientError as e:
+            return batch, e
+
+    async def _resolve_credentials(self, requester_credentials, permission, s3_prefix, bucket_name):
+        cache_key = CacheKey(permission=permission, credentials=requester_credentials, s3_prefix=s3_prefix)
+        # The requester account and the bucket region are independent, resolve them concurrently.
+        requester_account_id, s3_control_client = await asyncio.gather(
+            self._get_requester_account_id(requester_credentials),
+            self._get_s3_control_client_for_region(bucket_name))
+        return await self._get_value_from_cache(cache_key, s3_control_client, requester_account_id)
+
+    async def _get_requester_account_id(self, requester_credentials):
+        return await self.caller_identity_cache.resolve(await self._get_client('sts'), requester_credentials)
+
+    async def _get_s3_control_client_for_region(self, bucket_name):
+        region = await self.bucket_region_cache.resolve(await self._get_client('s3'), bucket_name)
+        return await self._get_client('s3control', region)
+
+    async def _get_value_from_cache(self, cache_key, s3_control_client, requester_account_id):
+        access_denied_exception = self.access_denied_cache.get_value_from_cache(cache_key)
+        if access_denied_exception is not None:
+            logger.debug("Found cached Access Denied Exception.")
+            raise access_denied_exception
+        return await self.access_grants_cache.get_credentials(s3_control_client, cache_key,
+                                                              requester_account_id,
+                                                              self.access_denied_cache)
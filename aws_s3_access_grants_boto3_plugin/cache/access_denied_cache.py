@@ -1,19 +1,84 @@
 from cacheout import Cache
+from botocore.exceptions import ClientError
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
 
 ACCESS_DENIED_CACHE_SIZE = 3000
 ACCESS_DENIED_CACHE_TTL = 5 * 60   # 5 mins
+METRICS_TAGS = {"cache": "access_denied"}
+
+
+class _Denial:
+    """
+    What is kept of a denied request: enough to raise an equivalent error, without the response it came with.
+    """
+    __slots__ = ('code', 'message', 'operation_name')
+
+    def __init__(self, code, message, operation_name):
+        self.code = code
+        self.message = message
+        self.operation_name = operation_name
+
+    def to_error(self):
+        return ClientError({'Error': {'Code': self.code, 'Message': self.message}}, self.operation_name)
 
 
 class AccessDeniedCache:
+    """
+    Caches the errors returned by Access Grants for a requester, permission and s3 prefix, so that a request that
+    was denied is not sent to Access Grants again until its entry expires.
+
+    error_code_ttls maps each error code to cache to the time to live of its entries. Only AccessDenied errors are
+    cached by default.
+
+    With prefix_matching enabled, a denial also applies to the prefixes below the denied one, "s3://bucket/a/"
+    rejecting "s3://bucket/a/b/c". Enable it only if grants are never made on a prefix below a prefix that is denied
+    to the same requester, since such a grant would then not be used until the denial expires.
+    """
     access_denied_cache = None
 
-    def __init__(self, cache_size=ACCESS_DENIED_CACHE_SIZE, ttl=ACCESS_DENIED_CACHE_TTL):
+    def __init__(self, cache_size=ACCESS_DENIED_CACHE_SIZE, ttl=ACCESS_DENIED_CACHE_TTL, error_code_ttls=None,
+                 prefix_matching=False):
         self.cache_size = cache_size
         self.ttl = ttl
+        self.error_code_ttls = error_code_ttls if error_code_ttls is not None else {"AccessDenied": ttl}
+        self.prefix_matching = prefix_matching
+
+        for error_code_ttl in self.error_code_ttls.values():
+            if error_code_ttl <= 0:
+                raise IllegalArgumentException("Error code ttl should be greater than 0")
+
         self.access_denied_cache = Cache(maxsize=self.cache_size, ttl=self.ttl)
 
+    def should_cache(self, error_code):
+        return error_code in self.error_code_ttls
+
     def put_value_in_cache(self, key, value):
-        return self.access_denied_cache.set(key, value)
+        error = value.response.get('Error', {})
+        code = error.get('Code')
+        if not self.should_cache(code):
+            return None
+        denial = _Denial(code, error.get('Message'), value.operation_name)
+        return self.access_denied_cache.set(key, denial, ttl=self.error_code_ttls[code])
 
     def get_value_from_cache(self, key):
-        return self.access_denied_cache.get(key)
+        denial = self.access_denied_cache.get(key)
+        if denial is None and self.prefix_matching:
+            denial = self._search_denied_parent_prefix(key)
+        metrics.increment(metrics.CACHE_MISSES if denial is None else metrics.CACHE_HITS, METRICS_TAGS)
+        return denial.to_error() if denial is not None else None
+
+    # Looks up every parent prefix of the key, "s3://bucket/a/b/" and "s3://bucket/a/b" and so on up to the bucket,
+    # one lookup per '/' in the key.
+    def _search_denied_parent_prefix(self, key):
+        s3_prefix = key.s3_prefix
+        bucket_index = s3_prefix.find('/', len("s3://"))
+        index = s3_prefix.rfind('/')
+        while index >= bucket_index > 0:
+            for parent_prefix in (s3_prefix[:index + 1], s3_prefix[:index]):
+                denial = self.access_denied_cache.get(CacheKey(s3_prefix=parent_prefix, cache_key=key))
+                if denial is not None:
+                    return denial
+            index = s3_prefix.rfind('/', 0, index)
+        return None
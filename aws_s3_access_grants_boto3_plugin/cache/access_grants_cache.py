@@ -1,15 +1,37 @@
 from cacheout import Cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import logging
+import threading
+from botocore.credentials import Credentials
 from botocore.exceptions import ClientError
+from aws_s3_access_grants_boto3_plugin import metrics
 from aws_s3_access_grants_boto3_plugin.cache.account_id_resolver_cache import AccountIdResolverCache
 from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.cache.grant_prefix_index import GrantPrefixIndex
+from aws_s3_access_grants_boto3_plugin.cache.single_flight import SingleFlight
 from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
 
 DEFAULT_ACCESS_GRANTS_CACHE_SIZE = 30000
 MAX_LIMIT_ACCESS_GRANTS_CACHE_SIZE = 1000000
 GET_DATA_ACCESS_DURATION = 1 * 60 * 60  # 1 hour
+MIN_GET_DATA_ACCESS_DURATION = 15 * 60  # 15 minutes, the minimum DurationSeconds of GetDataAccess
 MAX_GET_DATA_ACCESS_DURATION = 12 * 60 * 60  # 12 hours
 CACHE_EXPIRATION_TIME_PERCENTAGE = 90
+DEFAULT_EXPIRATION_SAFETY_MARGIN = 5 * 60  # 5 mins
+REFRESH_RETRY_INTERVAL = 30  # seconds between two refreshes of an entry whose last refresh did not replace it
+BACKEND_NAMESPACE = "access_grants"
+METRICS_TAGS = {"cache": "access_grants"}
+
+logger = logging.getLogger(__name__)
+
+
+class _GrantCredentials(dict):
+    """
+    The credentials returned by GetDataAccess, along with the botocore credentials that sign requests with them. These
+    are built once, when the credentials are cached, so a cache hit does not allocate them again on every request.
+    """
+    __slots__ = ('signing_credentials',)
 
 
 class AccessGrantsCache:
@@ -17,10 +39,20 @@ class AccessGrantsCache:
     account_id_resolver_cache = AccountIdResolverCache()
 
     def __init__(self, cache_size=DEFAULT_ACCESS_GRANTS_CACHE_SIZE,
-                 duration=GET_DATA_ACCESS_DURATION):
+                 duration=GET_DATA_ACCESS_DURATION, refresh_ahead_fraction=None,
+                 expiration_safety_margin=DEFAULT_EXPIRATION_SAFETY_MARGIN, backend=None,
+                 account_id_resolver_cache=None, widen_target_levels=0):
         self.cache_size = cache_size
         self.duration = duration
+        # Used for credentials that come back without an Expiration.
         self.cache_ttl = (duration * CACHE_EXPIRATION_TIME_PERCENTAGE) / 100
+        self.refresh_ahead_fraction = refresh_ahead_fraction
+        self.expiration_safety_margin = expiration_safety_margin
+        self.backend = backend
+        self.widen_target_levels = widen_target_levels
+        # Without a resolver of its own, the cache shares the class level one with the other caches.
+        if account_id_resolver_cache is not None:
+            self.account_id_resolver_cache = account_id_resolver_cache
 
         if self.cache_size > MAX_LIMIT_ACCESS_GRANTS_CACHE_SIZE:
             raise IllegalArgumentException(
@@ -30,43 +62,151 @@ class AccessGrantsCache:
             raise IllegalArgumentException("Maximum duration should be less than or equal to " + str(
                 MAX_GET_DATA_ACCESS_DURATION))
 
-        self.access_grants_cache = Cache(maxsize=self.cache_size, ttl=self.cache_ttl)
+        if self.duration < MIN_GET_DATA_ACCESS_DURATION:
+            raise IllegalArgumentException("Minimum duration should be greater than or equal to " + str(
+                MIN_GET_DATA_ACCESS_DURATION))
+
+        if self.refresh_ahead_fraction is not None and not 0 < self.refresh_ahead_fraction < 1:
+            raise IllegalArgumentException("Refresh ahead fraction should be greater than 0 and less than 1")
+
+        if self.expiration_safety_margin < 0:
+            raise IllegalArgumentException("Expiration safety margin should be greater than or equal to 0")
+
+        if self.widen_target_levels < 0:
+            raise IllegalArgumentException("Widen target levels should be greater than or equal to 0")
+
+        # When refresh ahead is enabled, the time after which a cache hit triggers a background refresh of the entry.
+        self._refresh_times = {}
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._refresh_executor = None
+        self._grant_prefix_index = GrantPrefixIndex()
+        self.access_grants_cache = Cache(maxsize=self.cache_size, ttl=self.cache_ttl,
+                                         on_set=self._on_cache_set, on_delete=self._on_cache_delete)
+        self._single_flight = SingleFlight()
 
-    #  This is for grants of type "s3://bucket/prefix/*"
-    def _search_credentials_at_prefix_level(self, cache_key):
+    def _on_cache_set(self, cache_key, value, old_value):
+        self._grant_prefix_index.add(cache_key)
 
+    def _on_cache_delete(self, cache_key, value, cause):
+        self._grant_prefix_index.remove(cache_key)
+        self._refresh_times.pop(cache_key, None)
+
+    # Grants of type "s3://bucket/prefix/*" are looked up before grants of type "s3://bucket/prefix*", and for each
+    # of them the requested permission is looked up before READWRITE. The longest matching prefix wins.
+    def _search_cached_entry(self, cache_key):
+        search_keys = [cache_key]
+        if cache_key.permission == "READ" or cache_key.permission == "WRITE":
+            search_keys.append(CacheKey(permission="READWRITE", cache_key=cache_key))
+        matches = [self._grant_prefix_index.find(search_key) for search_key in search_keys]
+        for grant_type in (0, 1):
+            for search_key, found in zip(search_keys, matches):
+                for s3_prefix in found[grant_type]:
+                    # The index can briefly hold an entry that has expired, the cache decides what is still valid.
+                    matched_key = CacheKey(s3_prefix=s3_prefix, cache_key=search_key)
+                    cache_value = self.access_grants_cache.get(matched_key)
+                    if cache_value is not None:
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("Successfully retrieved credentials from cache for s3Prefix: %s",
+                                         matched_key.s3_prefix)
+                        return matched_key, cache_value
+        return None, None
+
+    def _search_credentials_in_cache(self, cache_key):
+        return self._search_cached_entry(cache_key)[1]
+
+    # The backend is shared with other processes, cache keys only hold a digest of the requester credentials.
+    def _get_backend_key(self, cache_key):
+        return cache_key.identity + "|" + cache_key.permission + "|" + cache_key.s3_prefix
+
+    # Same candidates, in the same order, as the prefixes checked by _search_cached_entry.
+    def _get_backend_candidates(self, cache_key):
+        search_keys = [cache_key]
+        if cache_key.permission == "READ" or cache_key.permission == "WRITE":
+            search_keys.append(CacheKey(permission="READWRITE", cache_key=cache_key))
+        prefix_level = []
         prefix = cache_key.s3_prefix
         while prefix != "s3:":
-            cache_key = CacheKey(cache_key=cache_key, s3_prefix=prefix)
-            cache_value = self.access_grants_cache.get(cache_key)
-            if cache_value is not None:
-                logging.debug("Successfully retrieved credentials from cache.")
-                return cache_value
+            prefix_level.append(prefix)
             prefix = prefix.rsplit('/', 1)[0]
-        return None
+        character_level = [cache_key.s3_prefix[:length] + "*"
+                           for length in range(len(cache_key.s3_prefix), len("s3://"), -1)]
+        return [CacheKey(s3_prefix=s3_prefix, cache_key=search_key)
+                for prefixes in (prefix_level, character_level)
+                for search_key in search_keys
+                for s3_prefix in prefixes]
 
-    # This is for grants of type "s3://bucket/prefix*"
-    def _search_credentials_at_character_level(self, cache_key):
-        prefix = cache_key.s3_prefix
-        while prefix != "s3://":
-            cache_key = CacheKey(cache_key=cache_key, s3_prefix=prefix + "*")
-            cache_value = self.access_grants_cache.get(cache_key)
-            if cache_value is not None:
-                logging.debug("Successfully retrieved credentials from cache.")
-                return cache_value
-            prefix = prefix[:-1]
+    def _search_credentials_in_backend(self, cache_key):
+        candidates = {self._get_backend_key(candidate): candidate
+                      for candidate in self._get_backend_candidates(cache_key)}
+        entries = self.backend.get_many(BACKEND_NAMESPACE, list(candidates))
+        for backend_key, candidate in candidates.items():
+            entry = entries.get(backend_key)
+            if entry is not None:
+                logger.debug("Successfully retrieved credentials from cache backend.")
+                credentials, ttl = entry
+                credentials = self._with_signing_credentials(credentials)
+                self._put_value_in_cache(candidate, credentials, ttl)
+                return credentials
         return None
 
+    def _should_refresh(self, matched_key):
+        refresh_time = self._refresh_times.get(matched_key)
+        return refresh_time is not None and self.access_grants_cache.timer() >= refresh_time
+
+    # Refreshes the entry in the background, the current credentials keep being served until the refresh completes.
+    # The refresh time of the entry is pushed back first: a refresh that stores new credentials sets it again, while
+    # after a failed one, throttling for example, the hits that follow do not call Access Grants again until the
+    # retry interval has passed.
+    def _schedule_refresh(self, matched_key, s3_control_client, cache_key, account_id, access_denied_cache):
+        with self._refresh_lock:
+            if matched_key in self._refreshing:
+                return
+            self._refreshing.add(matched_key)
+            if matched_key in self._refresh_times:
+                self._refresh_times[matched_key] = self.access_grants_cache.timer() + REFRESH_RETRY_INTERVAL
+        logger.debug("Refreshing the cached credentials for s3Prefix: %s", matched_key.s3_prefix)
+        self._start_refresh(matched_key, s3_control_client, cache_key, account_id, access_denied_cache)
+
+    def _start_refresh(self, matched_key, s3_control_client, cache_key, account_id, access_denied_cache):
+        with self._refresh_lock:
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=1,
+                                                            thread_name_prefix="s3-access-grants-refresh")
+        self._refresh_executor.submit(self._refresh, matched_key, s3_control_client, cache_key, account_id,
+                                      access_denied_cache)
+
+    def _refresh(self, matched_key, s3_control_client, cache_key, account_id, access_denied_cache):
+        try:
+            self._fetch_credentials(s3_control_client, cache_key, account_id, access_denied_cache)
+        except Exception as e:
+            logger.debug("Failed to refresh the cached credentials, they will be fetched again once they expire: %s",
+                         e)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(matched_key)
+
     def _get_credentials_from_service(self, s3_control_client, cache_key, account_id):
         if s3_control_client is None:
             raise IllegalArgumentException("S3 Control Client should not be null")
         bucket_owner_account_id = self.account_id_resolver_cache.resolve(s3_control_client, account_id,
                                                                          cache_key.s3_prefix)
-        logging.debug((
-                "Fetching credentials from Access Grants for accountId: " + bucket_owner_account_id + ", s3Prefix: " + cache_key.s3_prefix +
-                ", permission: " + cache_key.permission + ", privilege: " + "DEFAULT"))
-        return s3_control_client.get_data_access(AccountId=bucket_owner_account_id, Target=cache_key.s3_prefix,
-                                                 Permission=cache_key.permission, Privilege='Default')
+        logger.debug("Fetching credentials from Access Grants for accountId: %s, s3Prefix: %s, permission: %s, "
+                     "privilege: DEFAULT", bucket_owner_account_id, cache_key.s3_prefix, cache_key.permission)
+        with metrics.downstream_call(metrics.GET_DATA_ACCESS_TAGS):
+            return s3_control_client.get_data_access(AccountId=bucket_owner_account_id, Target=cache_key.s3_prefix,
+                                                     Permission=cache_key.permission, Privilege='Default',
+                                                     DurationSeconds=self.duration)
+
+    # The credentials are cached until their Expiration minus the safety margin, so the cache never hands out
+    # credentials that are about to expire.
+    def _get_cache_ttl(self, credentials):
+        expiration = credentials.get("Expiration")
+        if not isinstance(expiration, datetime):
+            return self.cache_ttl
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=timezone.utc)
+        return (expiration - datetime.now(timezone.utc)).total_seconds() - self.expiration_safety_margin
 
     # This method removes '/*' from matchedGrantTarget if present.
     # This helps us differentiate between grants of type "s3://bucket/prefix/*" and "s3://bucket/prefix*".
@@ -76,41 +216,114 @@ class AccessGrantsCache:
         return matched_grant_target
 
     def get_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
-        logging.debug("Fetching credentials from Access Grants for s3Prefix: " + cache_key.s3_prefix)
-        credentials = self._search_credentials_at_prefix_level(cache_key)
-        if credentials is None and (cache_key.permission == "READ" or cache_key.permission == "WRITE"):
-            credentials = self._search_credentials_at_prefix_level(
-                CacheKey(permission="READWRITE", cache_key=cache_key))
+        # Runs on every request, skip the logging call altogether when debug logging is off.
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Fetching credentials from Access Grants for s3Prefix: %s", cache_key.s3_prefix)
+        matched_key, credentials = self._search_cached_entry(cache_key)
+        if credentials is not None and self.refresh_ahead_fraction is not None and self._should_refresh(matched_key):
+            self._schedule_refresh(matched_key, s3_control_client, cache_key, account_id, access_denied_cache)
         if credentials is None:
-            credentials = self._search_credentials_at_character_level(cache_key)
-        if credentials is None and (cache_key.permission == "READ" or cache_key.permission == "WRITE"):
-            credentials = self._search_credentials_at_character_level(
-                CacheKey(permission="READWRITE", cache_key=cache_key))
-        if credentials is None:
-            logging.debug("Credentials not available in the cache. Fetching credentials from Access Grants service.")
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            if debug:
+                logger.debug("Credentials not available in the cache. Fetching credentials from Access Grants service.")
+            # Concurrent misses for the same key share a single call to Access Grants.
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                credentials = self._single_flight.do(cache_key, self._load_credentials, s3_control_client, cache_key,
+                                                     account_id, access_denied_cache)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+        return credentials
+
+    def _load_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
+        if self.backend is not None:
+            credentials = self._search_credentials_in_backend(cache_key)
+            if credentials is not None:
+                return credentials
+        return self._fetch_credentials(s3_control_client, cache_key, account_id, access_denied_cache)
+
+    # With target widening, credentials are first requested for the subtree above the key, so that an object level
+    # grant does not hide a grant on a prefix that covers its neighbours too: the prefix grant is cached and serves
+    # them all. A widened target that is denied is recorded in the access denied cache and not requested again until
+    # its entry expires, and the key itself is requested instead.
+    def _fetch_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
+        widened_key = self._get_widened_key(cache_key)
+        if widened_key is not None and access_denied_cache.get_value_from_cache(widened_key) is None:
             try:
-                response = self._get_credentials_from_service(s3_control_client, cache_key, account_id)
-                credentials = response["Credentials"]
-                matched_grant_target = response["MatchedGrantTarget"]
-                if matched_grant_target.endswith("*"):  # we do not cache object level grants
-                    logging.debug("Caching the credentials for s3Prefix:" + matched_grant_target
-                                  + " and permission: " + cache_key.permission)
-                    self.access_grants_cache.set(
-                        CacheKey(s3_prefix=self._process_matched_target(matched_grant_target),
-                                 cache_key=cache_key), credentials)
-                logging.debug("Successfully retrieved credentials from Access Grants service.")
+                return self._single_flight.do(widened_key, self._fetch_target_credentials, s3_control_client,
+                                              widened_key, account_id, access_denied_cache)
             except ClientError as e:
-                logging.debug(
-                    "Exception occurred while fetching the credentials from Access Grants: " + e.response["Error"][
-                        "Message"])
-                if e.response["Error"]["Code"] == "AccessDenied":
-                    logging.debug("Caching the Access Denied request.")
-                    access_denied_cache.put_value_in_cache(cache_key, e)
-                raise e
+                logger.debug("Could not get credentials for the widened target %s, requesting %s: %s",
+                             widened_key.s3_prefix, cache_key.s3_prefix, e)
+        return self._fetch_target_credentials(s3_control_client, cache_key, account_id, access_denied_cache)
+
+    # The prefix widen_target_levels levels above the key, never above its bucket, as a "/*" target. A key that is
+    # already that target, such as "s3://bucket/a/*" one level up, is not widened: it would wait on its own call.
+    def _get_widened_key(self, cache_key):
+        if not self.widen_target_levels:
+            return None
+        s3_prefix = cache_key.s3_prefix
+        bucket_end = s3_prefix.find('/', len("s3://"))
+        if bucket_end == -1:
+            return None
+        parent_prefix = s3_prefix.rsplit('/', self.widen_target_levels)[0]
+        if len(parent_prefix) < bucket_end:
+            parent_prefix = s3_prefix[:bucket_end]
+        if parent_prefix + "/*" == s3_prefix:
+            return None
+        return CacheKey(s3_prefix=parent_prefix + "/*", cache_key=cache_key)
+
+    def _fetch_target_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
+        try:
+            response = self._get_credentials_from_service(s3_control_client, cache_key, account_id)
+        except ClientError as e:
+            self._handle_service_error(cache_key, e, access_denied_cache)
+            raise e
+        return self._cache_service_response(cache_key, response)
+
+    def _create_signing_credentials(self, credentials):
+        return Credentials(access_key=credentials.get('AccessKeyId'), secret_key=credentials.get('SecretAccessKey'),
+                           token=credentials.get('SessionToken'))
+
+    def _with_signing_credentials(self, credentials):
+        if isinstance(credentials, _GrantCredentials):
+            return credentials
+        grant_credentials = _GrantCredentials(credentials)
+        grant_credentials.signing_credentials = self._create_signing_credentials(credentials)
+        return grant_credentials
+
+    def _cache_service_response(self, cache_key, response):
+        credentials = self._with_signing_credentials(response["Credentials"])
+        matched_grant_target = response["MatchedGrantTarget"]
+        if matched_grant_target.endswith("*"):  # we do not cache object level grants
+            cache_ttl = self._get_cache_ttl(credentials)
+            if cache_ttl > 0:
+                logger.debug("Caching the credentials for s3Prefix: %s and permission: %s", matched_grant_target,
+                             cache_key.permission)
+                matched_key = CacheKey(s3_prefix=self._process_matched_target(matched_grant_target),
+                                       cache_key=cache_key)
+                self._put_value_in_cache(matched_key, credentials, cache_ttl)
+                if self.backend is not None:
+                    self.backend.set(BACKEND_NAMESPACE, self._get_backend_key(matched_key), credentials, cache_ttl)
+            else:
+                logger.debug("Not caching the credentials for s3Prefix: %s since they expire within the safety margin.",
+                             matched_grant_target)
+        logger.debug("Successfully retrieved credentials from Access Grants service.")
         return credentials
 
-    def _put_value_in_cache(self, cache_key, value):
-        return self.access_grants_cache.set(cache_key, value)
+    def _handle_service_error(self, cache_key, e, access_denied_cache):
+        logger.debug("Exception occurred while fetching the credentials from Access Grants: %s",
+                     e.response["Error"]["Message"])
+        if access_denied_cache.should_cache(e.response["Error"]["Code"]):
+            logger.debug("Caching the %s error.", e.response["Error"]["Code"])
+            access_denied_cache.put_value_in_cache(cache_key, e)
+
+    def _put_value_in_cache(self, cache_key, value, ttl=None):
+        if ttl is None:
+            ttl = self.cache_ttl
+        self.access_grants_cache.set(cache_key, value, ttl=ttl)
+        if self.refresh_ahead_fraction is not None:
+            self._refresh_times[cache_key] = self.access_grants_cache.timer() + ttl * self.refresh_ahead_fraction
 
     def _get_value_from_cache(self, cache_key):
         return self.access_grants_cache.get(cache_key)
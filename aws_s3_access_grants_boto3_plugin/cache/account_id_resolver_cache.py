@@ -1,19 +1,39 @@
+import atexit
 from cacheout import Cache
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.cache.single_flight import SingleFlight
 from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
 
 DEFAULT_ACCOUNT_ID_CACHE_SIZE = 1000
 DEFAULT_TTL = 60 * 60
 MAX_LIMIT_ACCOUNT_ID_CACHE_SIZE = 1000000
 MAX_LIMIT_TTL = 2592000
+BACKEND_NAMESPACE = "account_id"
+METRICS_TAGS = {"cache": "account_id"}
+DEFAULT_RESOLVE_MAX_WORKERS = 10
+
+logger = logging.getLogger(__name__)
 
 
 class AccountIdResolverCache:
+    """
+    Caches the account id of the owner of each bucket, resolved with GetAccessGrantsInstanceForPrefix.
+
+    With a snapshot, an AccountIdSnapshot, the cache starts with the account ids saved by a previous process. They are
+    served right away, and revalidated against S3 Control in the background the first time each of them is used.
+    save_snapshot writes the current account ids back to the snapshot, which is done when the process exits.
+    """
     account_id_resolver_cache = None
 
     def __init__(self, cache_size=DEFAULT_ACCOUNT_ID_CACHE_SIZE,
-                 cache_ttl=DEFAULT_TTL):
+                 cache_ttl=DEFAULT_TTL, backend=None, snapshot=None):
         self.cache_size = cache_size
         self.cache_ttl = cache_ttl
+        self.backend = backend
+        self.snapshot = snapshot
 
         if self.cache_size > MAX_LIMIT_ACCOUNT_ID_CACHE_SIZE:
             raise IllegalArgumentException(
@@ -24,21 +44,120 @@ class AccountIdResolverCache:
                 MAX_LIMIT_TTL))
 
         self.account_id_resolver_cache = Cache(maxsize=self.cache_size, ttl=cache_ttl)
+        self._single_flight = SingleFlight()
+        # Buckets loaded from the snapshot that have not been revalidated yet.
+        self._unverified_buckets = set()
+        self._revalidation_lock = threading.Lock()
+        self._revalidation_executor = None
+        if self.snapshot is not None:
+            self._load_snapshot()
+            atexit.register(self.save_snapshot)
+
+    def _load_snapshot(self):
+        account_ids = self.snapshot.load()
+        logger.debug("Loaded %s account ids from the snapshot.", len(account_ids))
+        self.account_id_resolver_cache.set_many(account_ids)
+        self._unverified_buckets.update(account_ids)
+
+    def save_snapshot(self):
+        """
+        Saves the account ids in the cache to the snapshot, if the cache has one.
+        """
+        if self.snapshot is None:
+            return
+        self.account_id_resolver_cache.evict()
+        self.snapshot.save(dict(self.account_id_resolver_cache.items()))
 
     def _get_bucket_name(self, s3_prefix):
         split_prefix = s3_prefix.split("/")
         return split_prefix[2]
 
     def _resolve_from_service(self, s3_control_client, account_id, s3_prefix):
-        access_grants_instance_for_prefix = s3_control_client.get_access_grants_instance_for_prefix(
-            AccountId=account_id, S3Prefix=s3_prefix)
+        with metrics.downstream_call(metrics.GET_ACCESS_GRANTS_INSTANCE_FOR_PREFIX_TAGS):
+            access_grants_instance_for_prefix = s3_control_client.get_access_grants_instance_for_prefix(
+                AccountId=account_id, S3Prefix=s3_prefix)
+        return self._get_account_id(access_grants_instance_for_prefix)
+
+    def _get_account_id(self, access_grants_instance_for_prefix):
         access_grants_instance_arn = access_grants_instance_for_prefix['AccessGrantsInstanceArn']
         return access_grants_instance_arn.split(":")[4]
 
     def resolve(self, s3_control_client, requester_account_id, s3_prefix):
         bucket_name = self._get_bucket_name(s3_prefix)
         account_id = self.account_id_resolver_cache.get(bucket_name)
+        if account_id is None:
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                account_id = self._single_flight.do(bucket_name, self._resolve_and_cache, s3_control_client,
+                                                    requester_account_id, s3_prefix, bucket_name)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+            if self._unverified_buckets:
+                self._revalidate(s3_control_client, requester_account_id, s3_prefix, bucket_name)
+        return account_id
+
+    def resolve_many(self, s3_control_client, requester_account_id, buckets, max_workers=DEFAULT_RESOLVE_MAX_WORKERS):
+        """
+        Resolves the owner account id of the buckets that are not cached yet, with at most max_workers calls to S3
+        Control at a time. The buckets should be in the region of s3_control_client, see
+        S3AccessGrantsPlugin.resolve_bucket_owners for buckets in several regions.
+
+        Returns:
+            tuple: The account id of each bucket that was resolved, and the exception raised for each bucket that
+            could not be.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-access-grants-resolve") as executor:
+            futures = {bucket: executor.submit(self.resolve, s3_control_client, requester_account_id, "s3://" + bucket)
+                       for bucket in set(buckets)}
+        account_ids = {bucket: future.result() for bucket, future in futures.items() if future.exception() is None}
+        failures = {bucket: future.exception() for bucket, future in futures.items()
+                    if future.exception() is not None}
+        return account_ids, failures
+
+    def _revalidate(self, s3_control_client, requester_account_id, s3_prefix, bucket_name):
+        try:
+            self._unverified_buckets.remove(bucket_name)
+        except KeyError:
+            return
+        logger.debug("Revalidating the account id of bucket %s loaded from the snapshot.", bucket_name)
+        self._start_revalidation(s3_control_client, requester_account_id, s3_prefix, bucket_name)
+
+    def _start_revalidation(self, s3_control_client, requester_account_id, s3_prefix, bucket_name):
+        with self._revalidation_lock:
+            if self._revalidation_executor is None:
+                self._revalidation_executor = ThreadPoolExecutor(max_workers=1,
+                                                                 thread_name_prefix="s3-access-grants-revalidate")
+        self._revalidation_executor.submit(self._revalidate_from_service, s3_control_client, requester_account_id,
+                                           s3_prefix, bucket_name)
+
+    # On failure the account id from the snapshot is kept until it expires.
+    def _revalidate_from_service(self, s3_control_client, requester_account_id, s3_prefix, bucket_name):
+        try:
+            account_id = self._resolve_from_service(s3_control_client, requester_account_id, s3_prefix)
+        except Exception as e:
+            logger.debug("Failed to revalidate the account id of bucket %s: %s", bucket_name, e)
+            return
+        self._cache_resolved(bucket_name, account_id)
+
+    def _resolve_and_cache(self, s3_control_client, requester_account_id, s3_prefix, bucket_name):
+        account_id = self._load_from_backend(bucket_name)
         if account_id is None:
             account_id = self._resolve_from_service(s3_control_client, requester_account_id, s3_prefix)
-            self.account_id_resolver_cache.set(bucket_name, account_id)
+            self._cache_resolved(bucket_name, account_id)
+        return account_id
+
+    def _load_from_backend(self, bucket_name):
+        if self.backend is None:
+            return None
+        entry = self.backend.get(BACKEND_NAMESPACE, bucket_name)
+        if entry is None:
+            return None
+        account_id, ttl = entry
+        self.account_id_resolver_cache.set(bucket_name, account_id, ttl=ttl)
         return account_id
+
+    def _cache_resolved(self, bucket_name, account_id):
+        self.account_id_resolver_cache.set(bucket_name, account_id)
+        self._unverified_buckets.discard(bucket_name)
+        if self.backend is not None:
+            self.backend.set(BACKEND_NAMESPACE, bucket_name, account_id, self.cache_ttl)
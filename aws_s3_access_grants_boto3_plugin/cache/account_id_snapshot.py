@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+SNAPSHOT_VERSION = 1
+MAX_SNAPSHOT_AGE = 30 * 24 * 60 * 60  # 30 days
+
+logger = logging.getLogger(__name__)
+
+
+class AccountIdSnapshot:
+    """
+    Local file holding the owner account id of each bucket, so that a process starts with the mappings resolved by
+    the processes before it instead of asking S3 Control again for every bucket.
+
+    The file records the version of its format and when it was saved. A file of another version, or older than
+    MAX_SNAPSHOT_AGE, is ignored. It is created readable and writable by its owner only, and replaced atomically, so
+    a process never loads a partially written snapshot.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def load(self):
+        """
+        Returns:
+            dict: The owner account id of each bucket, empty if there is no usable snapshot.
+        """
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.debug("Ignoring the unreadable account id snapshot %s: %s", self.path, e)
+            return {}
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.debug("Ignoring the account id snapshot %s, its version is not %s", self.path, SNAPSHOT_VERSION)
+            return {}
+        if time.time() - snapshot.get("saved_at", 0) > MAX_SNAPSHOT_AGE:
+            logger.debug("Ignoring the account id snapshot %s, it is older than %s seconds", self.path,
+                         MAX_SNAPSHOT_AGE)
+            return {}
+        return dict(snapshot.get("account_ids", {}))
+
+    def save(self, account_ids):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # mkstemp creates the file readable and writable by its owner only.
+        fd, temporary_path = tempfile.mkstemp(dir=directory, prefix=".account-ids-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": SNAPSHOT_VERSION, "saved_at": time.time(), "account_ids": account_ids}, f)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
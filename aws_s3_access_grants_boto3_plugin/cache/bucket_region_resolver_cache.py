@@ -1,42 +1,120 @@
 from cacheout import Cache
 from botocore.exceptions import ClientError
 import logging
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.cache.single_flight import SingleFlight
 
 DEFAULT_BUCKET_REGION_CACHE_SIZE = 1000
 DEFAULT_BUCKET_REGION_CACHE_TTL = 60 * 60  # 1 hour
+BACKEND_NAMESPACE = "bucket_region"
+METRICS_TAGS = {"cache": "bucket_region"}
+
+logger = logging.getLogger(__name__)
 
 
 class BucketRegionResolverCache:
+    """
+    Caches the region of each bucket, which is resolved with a HeadBucket request. Requests are not needed for the
+    buckets whose region is known beforehand or seen on a response:
+
+    static_regions maps buckets to their region, which is used instead of asking S3. preload adds regions to the
+    cache, for example from an inventory of the buckets. With observe_responses enabled, the plugin records the
+    x-amz-bucket-region header of the responses received by its client, which also keeps the regions of the buckets
+    in use from expiring.
+    """
     bucket_region_resolver_cache = None
 
     def __init__(self,
                  cache_size=DEFAULT_BUCKET_REGION_CACHE_SIZE,
-                 cache_ttl=DEFAULT_BUCKET_REGION_CACHE_TTL):
+                 cache_ttl=DEFAULT_BUCKET_REGION_CACHE_TTL, backend=None, static_regions=None,
+                 observe_responses=False):
         self.cache_size = cache_size
         self.cache_ttl = cache_ttl
+        self.backend = backend
+        self.static_regions = dict(static_regions) if static_regions is not None else {}
+        self.observe_responses = observe_responses
 
         self.bucket_region_resolver_cache = Cache(maxsize=self.cache_size, ttl=self.cache_ttl)
+        self._single_flight = SingleFlight()
 
     def _resolve_from_service(self, s3_client, bucket):
         try:
-            head_bucket_response = s3_client.head_bucket(Bucket=bucket)
+            with metrics.downstream_call(metrics.HEAD_BUCKET_TAGS):
+                head_bucket_response = s3_client.head_bucket(Bucket=bucket)
             resolved_region = head_bucket_response['BucketRegion']
         except ClientError as e:
-            logging.debug("Client error when calling head bucket. Attempting to get region from request headers")
-            # Try to get region from response header
-            if (e.response and
-                    e.response['ResponseMetadata'] and
-                    e.response['ResponseMetadata']['HTTPHeaders'] and
-                    e.response['ResponseMetadata']['HTTPHeaders']['x-amz-bucket-region']):
-                resolved_region = e.response['ResponseMetadata']['HTTPHeaders']['x-amz-bucket-region']
-            else:
-                raise e
+            resolved_region = self._resolve_from_error(e)
         return resolved_region
 
+    def _resolve_from_error(self, e):
+        logger.debug("Client error when calling head bucket. Attempting to get region from request headers")
+        # Try to get region from response header
+        if (e.response and
+                e.response['ResponseMetadata'] and
+                e.response['ResponseMetadata']['HTTPHeaders'] and
+                e.response['ResponseMetadata']['HTTPHeaders']['x-amz-bucket-region']):
+            return e.response['ResponseMetadata']['HTTPHeaders']['x-amz-bucket-region']
+        raise e
+
     def resolve(self, s3_client, bucket):
         bucket_region = self.bucket_region_resolver_cache.get(bucket)
         if bucket_region is None:
-            logging.debug(f"Region for bucket \"{bucket}\" not available in cache. Fetching region from service")
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Region for bucket \"%s\" not available in cache. Fetching region from service", bucket)
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                bucket_region = self._single_flight.do(bucket, self._resolve_and_cache, s3_client, bucket)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+        return bucket_region
+
+    def _resolve_and_cache(self, s3_client, bucket):
+        bucket_region = self._load_from_known_regions(bucket)
+        if bucket_region is None:
             bucket_region = self._resolve_from_service(s3_client, bucket)
-            self.bucket_region_resolver_cache.set(bucket, bucket_region)
+            self._cache_resolved(bucket, bucket_region)
+        return bucket_region
+
+    def _load_from_known_regions(self, bucket):
+        bucket_region = self.static_regions.get(bucket)
+        if bucket_region is None:
+            return self._load_from_backend(bucket)
+        self.bucket_region_resolver_cache.set(bucket, bucket_region)
+        return bucket_region
+
+    def _load_from_backend(self, bucket):
+        if self.backend is None:
+            return None
+        entry = self.backend.get(BACKEND_NAMESPACE, bucket)
+        if entry is None:
+            return None
+        bucket_region, ttl = entry
+        self.bucket_region_resolver_cache.set(bucket, bucket_region, ttl=ttl)
         return bucket_region
+
+    def _cache_resolved(self, bucket, bucket_region):
+        self.bucket_region_resolver_cache.set(bucket, bucket_region)
+        if self.backend is not None:
+            self.backend.set(BACKEND_NAMESPACE, bucket, bucket_region, self.cache_ttl)
+
+    def preload(self, bucket_regions):
+        """
+        Adds the region of each bucket to the cache, and to the backend if there is one.
+
+        Args:
+            bucket_regions: A mapping of bucket names to their region.
+        """
+        for bucket, bucket_region in bucket_regions.items():
+            self._cache_resolved(bucket, bucket_region)
+
+    def observe(self, s3_client):
+        """
+        Records the region of the buckets from the x-amz-bucket-region header of the responses received by s3_client.
+        """
+        s3_client.meta.events.register('after-call.s3', self._record_response_region)
+
+    def _record_response_region(self, http_response, context, **kwargs):
+        bucket_region = http_response.headers.get('x-amz-bucket-region')
+        bucket = context.get('input_params', {}).get('Bucket')
+        if bucket_region and bucket:
+            self.bucket_region_resolver_cache.set(bucket, bucket_region)
@@ -0,0 +1,39 @@
+from abc import ABC, abstractmethod
+
+
+class CacheBackend(ABC):
+    """
+    Second level store behind the in-process caches, used to share cache entries between plugins that do not share
+    memory, for example the worker processes of a host.
+
+    Entries are stored per namespace, one namespace per cache, with a time to live in seconds. A cache only looks in
+    the backend when an entry is missing from its own memory, and writes every entry it fetches from the service
+    through to the backend.
+    """
+
+    @abstractmethod
+    def get(self, namespace, key):
+        """
+        Returns:
+            tuple: The value and its remaining time to live in seconds, or None if the key is missing or expired.
+        """
+
+    def get_many(self, namespace, keys):
+        """
+        Returns:
+            dict: The (value, remaining time to live) of each key that is present and not expired.
+        """
+        entries = {}
+        for key in keys:
+            entry = self.get(namespace, key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    @abstractmethod
+    def set(self, namespace, key, value, ttl):
+        pass
+
+    @abstractmethod
+    def delete(self, namespace, key):
+        pass
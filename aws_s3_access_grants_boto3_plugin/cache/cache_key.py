@@ -1,28 +1,41 @@
+import hashlib
+from operator import itemgetter
+import sys
 from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
 
 
-class CacheKey:
-    def __init__(self, credentials=None, permission=None, s3_prefix=None, cache_key=None):
+# Not memoized, a memo keyed by the credentials would keep their secret keys alive.
+def _get_identity(access_key, secret_key):
+    # Interned, so that all the keys of an identity share one string and compare by reference.
+    return sys.intern(hashlib.sha256((access_key + ":" + secret_key).encode("utf-8")).hexdigest())
+
+
+class CacheKey(tuple):
+    """
+    Immutable cache key of a requester, permission and s3 prefix.
+
+    The requester is kept as an identity token, a digest of its access key and secret key, instead of its
+    credentials: keys do not hold on to credential objects, and hashing or comparing them never reads credentials.
+    A key is a tuple of three strings, which cache their own hashes, so hashing a key does not hash its s3 prefix
+    again.
+    """
+    __slots__ = ()
+
+    def __new__(cls, credentials=None, permission=None, s3_prefix=None, cache_key=None):
         if cache_key is None:
-            self.credentials = credentials
-            self.permission = permission
-            self.s3_prefix = s3_prefix
+            identity = _get_identity(credentials.access_key, credentials.secret_key) if credentials is not None \
+                else None
         else:
-            if permission is not None:
-                self.credentials = cache_key.credentials
-                self.s3_prefix = cache_key.s3_prefix
-                self.permission = permission
-            elif s3_prefix is not None:
-                self.credentials = cache_key.credentials
-                self.permission = cache_key.permission
-                self.s3_prefix = s3_prefix
-
-        if self.credentials is None or self.permission is None or self.s3_prefix is None:
-            raise IllegalArgumentException("Credentials, permission, and s3_prefix must be provided")
+            identity = cache_key.identity
+            if permission is None:
+                permission = cache_key.permission
+            if s3_prefix is None:
+                s3_prefix = cache_key.s3_prefix
 
-    def __eq__(self, other):
-        return ((self.credentials.access_key, self.credentials.secret_key, self.permission, self.s3_prefix) ==
-                (other.credentials.access_key, other.credentials.secret_key, other.permission, other.s3_prefix))
+        if identity is None or permission is None or s3_prefix is None:
+            raise IllegalArgumentException("Credentials, permission, and s3_prefix must be provided")
+        return tuple.__new__(cls, (identity, permission, s3_prefix))
 
-    def __hash__(self):
-        return hash((self.credentials.access_key, self.credentials.secret_key, self.permission, self.s3_prefix))
+    identity = property(itemgetter(0))
+    permission = property(itemgetter(1))
+    s3_prefix = property(itemgetter(2))
@@ -0,0 +1,75 @@
+from cacheout import Cache
+import hashlib
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.cache.single_flight import SingleFlight
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
+
+DEFAULT_CALLER_IDENTITY_CACHE_SIZE = 1000
+DEFAULT_CALLER_IDENTITY_CACHE_TTL = 60 * 60  # 1 hour
+MAX_LIMIT_CALLER_IDENTITY_CACHE_SIZE = 1000000
+MAX_LIMIT_CALLER_IDENTITY_CACHE_TTL = 2592000
+BACKEND_NAMESPACE = "caller_identity"
+METRICS_TAGS = {"cache": "caller_identity"}
+
+
+class CallerIdentityResolverCache:
+    caller_identity_resolver_cache = None
+
+    def __init__(self, cache_size=DEFAULT_CALLER_IDENTITY_CACHE_SIZE,
+                 cache_ttl=DEFAULT_CALLER_IDENTITY_CACHE_TTL, backend=None):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.backend = backend
+
+        if self.cache_size > MAX_LIMIT_CALLER_IDENTITY_CACHE_SIZE:
+            raise IllegalArgumentException(
+                "Max cache size should be less than or equal to " + str(MAX_LIMIT_CALLER_IDENTITY_CACHE_SIZE))
+
+        if self.cache_ttl > MAX_LIMIT_CALLER_IDENTITY_CACHE_TTL:
+            raise IllegalArgumentException("Maximum ttl should be less than or equal to " + str(
+                MAX_LIMIT_CALLER_IDENTITY_CACHE_TTL))
+
+        self.caller_identity_resolver_cache = Cache(maxsize=self.cache_size, ttl=self.cache_ttl)
+        self._single_flight = SingleFlight()
+
+    def _resolve_from_service(self, sts_client):
+        with metrics.downstream_call(metrics.GET_CALLER_IDENTITY_TAGS):
+            return sts_client.get_caller_identity()['Account']
+
+    # The account id behind an access key never changes, so the access key alone is enough to key the cache.
+    def resolve(self, sts_client, requester_credentials):
+        access_key = requester_credentials.access_key
+        account_id = self.caller_identity_resolver_cache.get(access_key)
+        if account_id is None:
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                account_id = self._single_flight.do(access_key, self._resolve_and_cache, sts_client, access_key)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+        return account_id
+
+    def _resolve_and_cache(self, sts_client, access_key):
+        account_id = self._load_from_backend(access_key)
+        if account_id is None:
+            account_id = self._resolve_from_service(sts_client)
+            self._cache_resolved(access_key, account_id)
+        return account_id
+
+    # Access keys are only stored in the backend as a digest.
+    def _get_backend_key(self, access_key):
+        return hashlib.sha256(access_key.encode("utf-8")).hexdigest()
+
+    def _load_from_backend(self, access_key):
+        if self.backend is None:
+            return None
+        entry = self.backend.get(BACKEND_NAMESPACE, self._get_backend_key(access_key))
+        if entry is None:
+            return None
+        account_id, ttl = entry
+        self.caller_identity_resolver_cache.set(access_key, account_id, ttl=ttl)
+        return account_id
+
+    def _cache_resolved(self, access_key, account_id):
+        self.caller_identity_resolver_cache.set(access_key, account_id)
+        if self.backend is not None:
+            self.backend.set(BACKEND_NAMESPACE, self._get_backend_key(access_key), account_id, self.cache_ttl)
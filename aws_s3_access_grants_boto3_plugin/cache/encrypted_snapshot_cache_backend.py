@@ -0,0 +1,106 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from aws_s3_access_grants_boto3_plugin.cache.cache_backend import CacheBackend
+from aws_s3_access_grants_boto3_plugin.cache.sqlite_cache_backend import PURGE_EXPIRED_INTERVAL, _decode, _encode
+
+SNAPSHOT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class EncryptedSnapshotCacheBackend(CacheBackend):
+    """
+    CacheBackend held in memory and saved to a local file encrypted at rest, so that a short lived process, for
+    example a batch job or a CLI tool, starts with the entries cached by the processes before it instead of calling
+    STS, HeadBucket, and Access Grants again.
+
+    The entries are kept under the keys the caches give them, so credentials stay bound to the requester they were
+    issued for, and with the time at which they expire, so they are only served for what remains of their time to
+    live. load() adds the entries of the file to memory and flush() replaces the file with the unexpired entries in
+    memory. The S3AccessGrantsPlugin given the backend as its snapshot loads it when it is created, and flushes it
+    when the process exits.
+
+    The file is encrypted with Fernet, from the cryptography package, which is installed with the snapshot extra:
+    key is a Fernet key, as returned by cryptography.fernet.Fernet.generate_key(), which should be kept outside the
+    host, for example in a secrets manager. A file that cannot be decrypted with the key, or of another version, is
+    ignored. It is created readable and writable by its owner only, and replaced atomically.
+    """
+
+    def __init__(self, path, key):
+        from cryptography.fernet import Fernet
+        self.path = os.path.abspath(path)
+        self._fernet = Fernet(key)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                token = f.read()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.debug("Ignoring the unreadable cache snapshot %s: %s", self.path, e)
+            return
+        from cryptography.fernet import InvalidToken
+        try:
+            snapshot = _decode(self._fernet.decrypt(token))
+        except (InvalidToken, ValueError) as e:
+            logger.debug("Ignoring the cache snapshot %s, it cannot be decrypted: %s", self.path, e)
+            return
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.debug("Ignoring the cache snapshot %s, its version is not %s", self.path, SNAPSHOT_VERSION)
+            return
+        now = time.time()
+        with self._lock:
+            for namespace, key, value, expires_at in snapshot.get("entries", []):
+                entry = self._entries.get((namespace, key))
+                # Entries cached since the process started are at least as recent as the ones of the file.
+                if expires_at > now and (entry is None or entry[1] < expires_at):
+                    self._entries[(namespace, key)] = (value, expires_at)
+
+    def flush(self):
+        now = time.time()
+        with self._lock:
+            entries = [[namespace, key, value, expires_at]
+                       for (namespace, key), (value, expires_at) in self._entries.items() if expires_at > now]
+        token = self._fernet.encrypt(_encode({"version": SNAPSHOT_VERSION, "entries": entries}).encode("utf-8"))
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # mkstemp creates the file readable and writable by its owner only.
+        fd, temporary_path = tempfile.mkstemp(dir=directory, prefix=".cache-snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(token)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def get(self, namespace, key):
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return None
+        return value, ttl
+
+    def set(self, namespace, key, value, ttl):
+        if ttl <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._entries[(namespace, key)] = (value, now + ttl)
+            self._writes += 1
+            if self._writes % PURGE_EXPIRED_INTERVAL == 0:
+                self._entries = {entry_key: entry for entry_key, entry in self._entries.items() if entry[1] > now}
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._entries.pop((namespace, key), None)
@@ -0,0 +1,146 @@
+import threading
+
+# Length of "s3:" and "s3://". Grant lookups never go above these prefixes.
+_MIN_PREFIX_LEVEL_LENGTH = len("s3:") + 1
+_MIN_CHARACTER_LEVEL_LENGTH = len("s3://") + 1
+
+
+class _Node:
+    __slots__ = ('label', 'children', 'cached')
+
+    def __init__(self, label, cached=False):
+        self.label = label
+        # None rather than an empty dict for the leaves, which are most of the nodes.
+        self.children = None
+        self.cached = cached
+
+
+def _common_length(label, s3_prefix, start):
+    length = 0
+    for character in label:
+        if start + length == len(s3_prefix) or s3_prefix[start + length] != character:
+            break
+        length += 1
+    return length
+
+
+class GrantPrefixIndex:
+    """
+    Radix tree over the s3 prefixes stored in AccessGrantsCache, one tree per identity and permission.
+
+    Each edge holds the part of a prefix that no other cached prefix branches off, so the tree has at most two nodes
+    per cached prefix, and below "s3://" every tree branches by bucket name first, so a lookup only ever walks the
+    subtree of the bucket being accessed. The index only answers which cached prefixes could cover a key, the cache
+    itself stays the source of truth for TTL and eviction.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roots = {}
+
+    def _get_root(self, cache_key):
+        return cache_key.identity, cache_key.permission
+
+    def add(self, cache_key):
+        s3_prefix = cache_key.s3_prefix
+        with self._lock:
+            node = self._roots.get(self._get_root(cache_key))
+            if node is None:
+                node = self._roots[self._get_root(cache_key)] = _Node("")
+            index = 0
+            while index < len(s3_prefix):
+                if node.children is None:
+                    node.children = {}
+                child = node.children.get(s3_prefix[index])
+                if child is None:
+                    node.children[s3_prefix[index]] = _Node(s3_prefix[index:], cached=True)
+                    return
+                common = _common_length(child.label, s3_prefix, index)
+                if common < len(child.label):
+                    # The prefix leaves the edge part way, split the edge where it does.
+                    parent = _Node(child.label[:common])
+                    child.label = child.label[common:]
+                    parent.children = {child.label[0]: child}
+                    node.children[s3_prefix[index]] = parent
+                    child = parent
+                node = child
+                index += common
+            node.cached = True
+
+    def remove(self, cache_key):
+        s3_prefix = cache_key.s3_prefix
+        root_key = self._get_root(cache_key)
+        with self._lock:
+            root = self._roots.get(root_key)
+            if root is None:
+                return
+            path = [root]
+            index = 0
+            while index < len(s3_prefix):
+                node = path[-1].children.get(s3_prefix[index]) if path[-1].children else None
+                if node is None or not s3_prefix.startswith(node.label, index):
+                    return
+                path.append(node)
+                index += len(node.label)
+            node = path[-1]
+            if not node.cached:
+                return
+            node.cached = False
+            if len(path) == 1:
+                if not root.children:
+                    del self._roots[root_key]
+                return
+            parent = path[-2]
+            if not node.children:
+                del parent.children[node.label[0]]
+                if not parent.children:
+                    parent.children = None
+                node = parent
+                parent = path[-3] if len(path) > 2 else None
+            # A node that is neither cached nor a branch is merged into its only child.
+            if parent is not None and not node.cached and node.children and len(node.children) == 1:
+                (child,) = node.children.values()
+                child.label = node.label + child.label
+                parent.children[child.label[0]] = child
+            if not root.children and not root.cached:
+                del self._roots[root_key]
+
+    def find(self, cache_key):
+        """
+        Returns the cached prefixes that cover cache_key.s3_prefix, longest first, as a tuple of two lists:
+        grants of type "s3://bucket/prefix/*" (stored without "/*") and grants of type "s3://bucket/prefix*".
+        """
+        s3_prefix = cache_key.s3_prefix
+        prefix_level = []
+        character_level = []
+        with self._lock:
+            node = self._roots.get(self._get_root(cache_key))
+            length = len(s3_prefix)
+            index = 0
+            while node is not None:
+                if node.cached and index >= _MIN_PREFIX_LEVEL_LENGTH and (
+                        index == length or s3_prefix[index] == '/'):
+                    prefix_level.append(s3_prefix[:index])
+                if not node.children:
+                    break
+                if index >= _MIN_CHARACTER_LEVEL_LENGTH:
+                    wildcard = node.children.get('*')
+                    if wildcard is not None and wildcard.cached and wildcard.label == '*':
+                        character_level.append(s3_prefix[:index] + '*')
+                if index == length:
+                    break
+                node = node.children.get(s3_prefix[index])
+                if node is None:
+                    break
+                label = node.label
+                # A "prefix*" grant whose '*' ends the edge the key leaves right before it.
+                end = index + len(label) - 1
+                if len(label) > 1 and label[-1] == '*' and node.cached and end >= _MIN_CHARACTER_LEVEL_LENGTH \
+                        and s3_prefix.startswith(label[:-1], index):
+                    character_level.append(s3_prefix[:end] + '*')
+                if not s3_prefix.startswith(label, index):
+                    break
+                index += len(label)
+        prefix_level.reverse()
+        character_level.reverse()
+        return prefix_level, character_level
@@ -0,0 +1,35 @@
+from cacheout import Cache
+from aws_s3_access_grants_boto3_plugin import metrics
+
+DEFAULT_MULTIPART_UPLOAD_CACHE_SIZE = 10000
+METRICS_TAGS = {"cache": "multipart_upload"}
+
+
+class MultipartUploadCache:
+    """
+    Pins the Access Grants credentials of a multipart upload to its UploadId, so that its UploadPart,
+    CompleteMultipartUpload and AbortMultipartUpload requests are signed with them without resolving the grant again.
+
+    A pin is only used by the requester it was made for, and expires with its credentials, after which the next part
+    resolves the grant again and pins the new credentials.
+    """
+    multipart_upload_cache = None
+
+    def __init__(self, cache_size=DEFAULT_MULTIPART_UPLOAD_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.multipart_upload_cache = Cache(maxsize=self.cache_size)
+
+    def pin(self, upload_id, requester_access_key, credentials, ttl):
+        if ttl > 0:
+            self.multipart_upload_cache.set(upload_id, (requester_access_key, credentials), ttl=ttl)
+
+    def unpin(self, upload_id):
+        self.multipart_upload_cache.delete(upload_id)
+
+    def get_credentials(self, upload_id, requester_access_key):
+        pinned = self.multipart_upload_cache.get(upload_id)
+        if pinned is None or pinned[0] != requester_access_key:
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            return None
+        metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+        return pinned[1]
@@ -0,0 +1,48 @@
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'exception')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single call.
+
+    The first thread to ask for a key runs the function, every other thread asking for the same key while that call
+    is in flight waits for it and receives its result, or its exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
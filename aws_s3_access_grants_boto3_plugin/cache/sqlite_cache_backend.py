@@ -0,0 +1,97 @@
+from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from aws_s3_access_grants_boto3_plugin.cache.cache_backend import CacheBackend
+
+DEFAULT_SQLITE_TIMEOUT = 5  # seconds to wait for a lock held by another process
+PURGE_EXPIRED_INTERVAL = 1000  # number of writes between two purges of expired entries
+# Stay below the default limit of bound parameters of older SQLite versions.
+MAX_KEYS_PER_QUERY = 500
+
+
+def _encode(value):
+    return json.dumps(value, default=_encode_datetime)
+
+
+def _encode_datetime(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError("Object of type " + type(value).__name__ + " cannot be stored in the cache backend")
+
+
+def _decode(value):
+    return json.loads(value, object_hook=_decode_datetime)
+
+
+def _decode_datetime(value):
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    CacheBackend stored in a local SQLite database, so that all the processes of a host share one warm cache.
+
+    The database holds temporary credentials: it is created readable and writable by its owner only, in a directory
+    that is created accessible by its owner only. Values must be JSON serializable, datetimes included.
+    """
+
+    def __init__(self, path, timeout=DEFAULT_SQLITE_TIMEOUT):
+        self.path = os.path.abspath(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(self.path, 0o600)
+        self._get_connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))")
+
+    # SQLite connections can neither be shared between threads nor survive a fork, so every thread of every
+    # process opens its own.
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, namespace, key):
+        return self.get_many(namespace, [key]).get(key)
+
+    def get_many(self, namespace, keys):
+        now = time.time()
+        entries = {}
+        for start in range(0, len(keys), MAX_KEYS_PER_QUERY):
+            chunk = keys[start:start + MAX_KEYS_PER_QUERY]
+            rows = self._get_connection().execute(
+                "SELECT key, value, expires_at FROM cache_entries WHERE namespace = ? AND expires_at > ? AND key IN ("
+                + ",".join("?" * len(chunk)) + ")", [namespace, now] + chunk)
+            for key, value, expires_at in rows:
+                entries[key] = (_decode(value), expires_at - now)
+        return entries
+
+    def set(self, namespace, key, value, ttl):
+        if ttl <= 0:
+            return
+        connection = self._get_connection()
+        connection.execute("INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                           (namespace, key, _encode(value), time.time() + ttl))
+        with self._writes_lock:
+            self._writes += 1
+            purge = self._writes % PURGE_EXPIRED_INTERVAL == 0
+        if purge:
+            connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, namespace, key):
+        self._get_connection().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
@@ -0,0 +1,89 @@
+import time
+
+CACHE_HITS = "cache.hits"
+CACHE_MISSES = "cache.misses"
+CACHE_MISS_LATENCY = "cache.miss_latency"
+DOWNSTREAM_CALLS = "downstream.calls"
+DOWNSTREAM_ERRORS = "downstream.errors"
+DOWNSTREAM_LATENCY = "downstream.latency"
+FALLBACKS = "fallbacks"
+
+GET_CALLER_IDENTITY_TAGS = {"operation": "GetCallerIdentity"}
+HEAD_BUCKET_TAGS = {"operation": "HeadBucket"}
+GET_ACCESS_GRANTS_INSTANCE_FOR_PREFIX_TAGS = {"operation": "GetAccessGrantsInstanceForPrefix"}
+GET_DATA_ACCESS_TAGS = {"operation": "GetDataAccess"}
+UNSUPPORTED_OPERATION_FALLBACK_TAGS = {"reason": "unsupported_operation"}
+FALLBACK_ENABLED_FALLBACK_TAGS = {"reason": "fallback_enabled"}
+
+
+class MetricsSink:
+    """
+    Receives the metrics reported by the plugin. Subclass it to export them to a metrics system.
+
+    Counters are reported through increment, latencies are reported in seconds through observe and are meant to be
+    recorded as histograms. Tags are shared between calls and must not be modified. The methods are called on the
+    request path, from any thread, so they should be fast and must not raise.
+    """
+
+    def increment(self, name, tags, value=1):
+        pass
+
+    def observe(self, name, tags, value):
+        pass
+
+
+# None stands for the no-op sink, so that reporting a metric costs a single check while no sink is set.
+_sink = None
+
+
+def set_metrics_sink(sink):
+    global _sink
+    _sink = sink
+
+
+def get_metrics_sink():
+    return _sink
+
+
+def increment(name, tags, value=1):
+    if _sink is not None:
+        _sink.increment(name, tags, value)
+
+
+def timer(name, tags, errors=None):
+    """
+    Context manager reporting the time spent in its block to the histogram name. When errors is set, that counter
+    is also incremented if the block raises.
+    """
+    return _Timer(name, tags, errors)
+
+
+def downstream_call(tags):
+    """
+    Context manager counting and timing a call to an AWS service, tagged with its operation.
+    """
+    increment(DOWNSTREAM_CALLS, tags)
+    return _Timer(DOWNSTREAM_LATENCY, tags, DOWNSTREAM_ERRORS)
+
+
+class _Timer:
+    __slots__ = ('name', 'tags', 'errors', 'start')
+
+    def __init__(self, name, tags, errors):
+        self.name = name
+        self.tags = tags
+        self.errors = errors
+        self.start = None
+
+    def __enter__(self):
+        if _sink is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        sink = _sink
+        if sink is not None and self.start is not None:
+            sink.observe(self.name, self.tags, time.perf_counter() - self.start)
+            if exc_type is not None and self.errors is not None:
+                sink.increment(self.errors, self.tags)
+        return False
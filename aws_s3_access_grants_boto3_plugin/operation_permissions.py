@@ -1,33 +1,99 @@
-from types import MappingProxyType
-from aws_s3_access_grants_boto3_plugin.exceptions import UnsupportedOperationError
-
-_s3_operation_to_permission_map = MappingProxyType(
-    {
-        "HEADOBJECT": "READ",
-        "GETOBJECT": "READ",
-        "GETOBJECTACL": "READ",
-        "LISTMULTIPARTUPLOADS": "READ",
-        "LISTOBJECTS": "READ",
-        "LISTOBJECTSV2": "READ",
-        "LISTOBJECTVERSIONS": "READ",
-        "LISTPARTS": "READ",
-        "PUTOBJECT": "WRITE",
-        "PUTOBJECTACL": "WRITE",
-        "DELETEOBJECT": "WRITE",
-        "DELETEOBJECTS": "WRITE",
-        "ABORTMULTIPARTUPLOAD": "WRITE",
-        "CREATEMULTIPARTUPLOAD": "WRITE",
-        "UPLOADPART": "WRITE",
-        "COMPLETEMULTIPARTUPLOAD": "WRITE",
-        "COPYOBJECT": "READWRITE",
-        "HEADBUCKET": "READ",
-        "GETOBJECTATTRIBUTES": "READ"
-    }
-)
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException, UnsupportedOperationError
+
+ACCESS_GRANTS_PERMISSIONS = ("READ", "WRITE", "READWRITE")
+
+
+# Prefix extractors take the plugin and the context of a request, and return the "bucket/prefix" it accesses.
+def get_object_prefix(plugin, context):
+    input_params = context['input_params']
+    key = input_params.get('Key')
+    if key is None:
+        return input_params['Bucket']
+    return input_params['Bucket'] + "/" + key
+
+
+def get_listing_prefix(plugin, context):
+    input_params = context['input_params']
+    prefix = input_params.get('Prefix')
+    if prefix is None:
+        return input_params['Bucket']
+    return input_params['Bucket'] + "/" + prefix
+
+
+def get_delete_objects_prefix(plugin, context):
+    input_params = context['input_params']
+    keys = [delete_object['Key'] for delete_object in input_params['Delete']['Objects']]
+    return input_params['Bucket'] + plugin._get_common_prefix_for_multiple_prefixes(keys)
+
+
+def get_copy_object_prefix(plugin, context):
+    destination_bucket_name = context['input_params']['Bucket']
+    source_bucket, source_key = context['s3_redirect']['params']['CopySource'].split('/', 1)
+    if source_bucket != destination_bucket_name:
+        raise IllegalArgumentException("Source bucket and destination bucket must be the same.")
+    keys = [source_key, context['input_params']['Key']]
+    return destination_bucket_name + plugin._get_common_prefix_for_multiple_prefixes(keys)
+
+
+# Operation name, as in the events emitted by botocore, to its permission and prefix extractor.
+_s3_operations = {}
+# The same operations, by upper case name, for the case insensitive lookups of get_permission_for_s3_operation.
+_s3_operations_by_upper_name = {}
+
+
+def register_s3_operation(operation, permission, prefix_extractor=get_object_prefix):
+    """
+    Adds an S3 operation to the ones signed with Access Grants credentials, or changes how an operation is handled.
+    Operations should be registered before the clients that use the plugin send requests.
+
+    Args:
+        operation: The name of the operation, for example "GetObjectTagging".
+        permission: The permission requested for the operation, one of READ, WRITE, and READWRITE.
+        prefix_extractor: A function of the plugin and the request context that returns the "bucket/prefix" the
+            request accesses. Defaults to the bucket and the Key of the request.
+    """
+    if permission not in ACCESS_GRANTS_PERMISSIONS:
+        raise IllegalArgumentException("Permission must be one of " + ", ".join(ACCESS_GRANTS_PERMISSIONS))
+    _s3_operations[operation] = (permission, prefix_extractor)
+    _s3_operations_by_upper_name[operation.upper()] = (permission, prefix_extractor)
+
+
+for _operation, _permission, _prefix_extractor in (
+        ("HeadObject", "READ", get_object_prefix),
+        ("GetObject", "READ", get_object_prefix),
+        ("GetObjectAcl", "READ", get_object_prefix),
+        ("ListMultipartUploads", "READ", get_listing_prefix),
+        ("ListObjects", "READ", get_listing_prefix),
+        ("ListObjectsV2", "READ", get_listing_prefix),
+        ("ListObjectVersions", "READ", get_listing_prefix),
+        ("ListParts", "READ", get_object_prefix),
+        ("PutObject", "WRITE", get_object_prefix),
+        ("PutObjectAcl", "WRITE", get_object_prefix),
+        ("DeleteObject", "WRITE", get_object_prefix),
+        ("DeleteObjects", "WRITE", get_delete_objects_prefix),
+        ("AbortMultipartUpload", "WRITE", get_object_prefix),
+        ("CreateMultipartUpload", "WRITE", get_object_prefix),
+        ("UploadPart", "WRITE", get_object_prefix),
+        ("CompleteMultipartUpload", "WRITE", get_object_prefix),
+        ("CopyObject", "READWRITE", get_copy_object_prefix),
+        ("HeadBucket", "READ", get_object_prefix),
+        ("GetObjectAttributes", "READ", get_object_prefix)):
+    register_s3_operation(_operation, _permission, _prefix_extractor)
+
+
+def get_s3_operation(operation):
+    """
+    Returns:
+        tuple: The permission and the prefix extractor of the operation, looked up by its exact name.
+    """
+    s3_operation = _s3_operations.get(operation)
+    if s3_operation is None:
+        raise UnsupportedOperationError("Access Grants does not support the requested operation.")
+    return s3_operation
 
 
 def get_permission_for_s3_operation(operation):
-    permission = _s3_operation_to_permission_map.get(operation.upper())
-    if permission is None:
+    s3_operation = _s3_operations_by_upper_name.get(operation.upper())
+    if s3_operation is None:
         raise UnsupportedOperationError("Access Grants does not support the requested operation.")
-    return permission
+    return s3_operation[0]
@@ -1,16 +1,41 @@
+import atexit
 import botocore
 from botocore import session
 from botocore import config
 from botocore import credentials
 from botocore.utils import create_nested_client
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+from cacheout import Cache
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import logging
 import os
+import threading
 from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
 from aws_s3_access_grants_boto3_plugin.cache.access_grants_cache import AccessGrantsCache
 from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
 from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
-from aws_s3_access_grants_boto3_plugin.operation_permissions import get_permission_for_s3_operation
+from aws_s3_access_grants_boto3_plugin.operation_permissions import ACCESS_GRANTS_PERMISSIONS, get_s3_operation, \
+    get_permission_for_s3_operation
 from aws_s3_access_grants_boto3_plugin.cache.bucket_region_resolver_cache import BucketRegionResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.caller_identity_resolver_cache import CallerIdentityResolverCache
+from aws_s3_access_grants_boto3_plugin.s3_control_client_pool import S3ControlClientPool
+from aws_s3_access_grants_boto3_plugin import metrics
+
+DEFAULT_WARM_MAX_WORKERS = 10
+DEFAULT_QUEUED_TRANSFER_CACHE_SIZE = 10000
+# Requests of a multipart upload that are signed with the credentials pinned to its UploadId.
+PINNED_MULTIPART_UPLOAD_OPERATIONS = frozenset(("UploadPart", "CompleteMultipartUpload", "AbortMultipartUpload"))
+# Carries the credentials of a CreateMultipartUpload request to its after-call handler, which pins them.
+MULTIPART_UPLOAD_CONTEXT_KEY = "s3_access_grants_multipart_upload"
+
+logger = logging.getLogger(__name__)
+
+# Set while the plugin sends the sub-batches of a split DeleteObjects request, which must not be split again.
+_sending_delete_objects_batches = contextvars.ContextVar("sending_delete_objects_batches", default=False)
+# The credentials of the grant covering the keys of the DeleteObjects sub-request being sent, which sign it.
+_delete_objects_batch_credentials = contextvars.ContextVar("delete_objects_batch_credentials", default=None)
 
 
 class S3AccessGrantsPlugin:
@@ -18,43 +43,230 @@ class S3AccessGrantsPlugin:
     access_denied_cache = AccessDeniedCache()
     access_grants_cache = AccessGrantsCache()
     bucket_region_cache = BucketRegionResolverCache()
-    client_dict = {}
+    caller_identity_cache = CallerIdentityResolverCache()
+    multipart_upload_cache = None
+    snapshot = None
+    s3_control_client_pool = S3ControlClientPool()
+    # Plugins created without a session share this one, so that they share their S3 Control clients too.
+    _default_session = None
+    _default_session_lock = threading.Lock()
+    # Created by the first transfer an AccessGrantsTransferSubscriber pins, so that plugins that never pin any do not
+    # look it up when signing.
+    _queued_transfer_credentials = None
+    _queued_transfer_credentials_lock = threading.Lock()
     session_config = botocore.config.Config(user_agent="aws_s3_access_grants_boto3_plugin")
 
-    def __init__(self, s3_client, fallback_enabled=False, customer_session=None):
+    def __init__(self, s3_client, fallback_enabled=False, customer_session=None, warm_up_regions=None,
+                 max_pool_connections=None, split_delete_objects=False, cache_size=None, duration=None,
+                 access_grants_cache=None, access_denied_cache=None, bucket_region_cache=None,
+                 caller_identity_cache=None, account_id_resolver_cache=None, multipart_upload_cache=None,
+                 snapshot=None):
         self.s3_client = s3_client
         self.fallback_enabled = fallback_enabled
+        self.split_delete_objects = split_delete_objects
+        self.multipart_upload_cache = multipart_upload_cache
+        self._configure_caches(cache_size, duration, access_grants_cache, access_denied_cache, bucket_region_cache,
+                               caller_identity_cache, account_id_resolver_cache, snapshot)
+        self._load_snapshot(snapshot)
+        self.client_config = self.session_config
+        if max_pool_connections is not None:
+            self.client_config = self.session_config.merge(
+                botocore.config.Config(max_pool_connections=max_pool_connections))
 
         if isinstance(customer_session, botocore.session.Session):
             self.session = customer_session
-            self.sts_client = create_nested_client(self.session, 'sts', config=self.session_config)
-            self.internal_s3_client = create_nested_client(self.session, 's3', config=self.session_config)
+            self.sts_client = create_nested_client(self.session, 'sts', config=self.client_config)
+            self.internal_s3_client = create_nested_client(self.session, 's3', config=self.client_config)
         elif customer_session is None:  # Customer has not set session explicitly, so we use default botocore session
-            self.session = botocore.session.get_session()
-            self.sts_client = create_nested_client(self.session, 'sts', config=self.session_config)
-            self.internal_s3_client = create_nested_client(self.session, 's3', config=self.session_config)
+            with S3AccessGrantsPlugin._default_session_lock:
+                self.session = self._get_default_session()
+                self.sts_client = create_nested_client(self.session, 'sts', config=self.client_config)
+                self.internal_s3_client = create_nested_client(self.session, 's3', config=self.client_config)
         else:
             raise IllegalArgumentException("customer_session must be type of botocore.session")
 
+        if warm_up_regions:
+            self.s3_control_client_pool.warm_up(self.session, warm_up_regions, self.client_config)
+
+    @staticmethod
+    def _get_default_session():
+        if S3AccessGrantsPlugin._default_session is None:
+            S3AccessGrantsPlugin._default_session = botocore.session.get_session()
+        return S3AccessGrantsPlugin._default_session
+
+    # Caches that are not passed in stay the class level ones, shared by all the plugins of the process. With a
+    # snapshot, the access grants, caller identity and bucket region caches that are not passed in are the plugin's
+    # own, backed by the snapshot.
+    def _configure_caches(self, cache_size, duration, access_grants_cache, access_denied_cache, bucket_region_cache,
+                          caller_identity_cache, account_id_resolver_cache, snapshot=None):
+        if cache_size is not None or duration is not None or account_id_resolver_cache is not None:
+            if access_grants_cache is not None:
+                raise IllegalArgumentException("cache_size, duration and account_id_resolver_cache cannot be set "
+                                               "together with access_grants_cache")
+            access_grants_cache = self._create_access_grants_cache(cache_size, duration, account_id_resolver_cache,
+                                                                   snapshot)
+        if snapshot is not None:
+            if access_grants_cache is None:
+                access_grants_cache = self._create_access_grants_cache(cache_size, duration,
+                                                                       account_id_resolver_cache, snapshot)
+            if bucket_region_cache is None:
+                bucket_region_cache = self._create_bucket_region_cache(snapshot)
+            if caller_identity_cache is None:
+                caller_identity_cache = self._create_caller_identity_cache(snapshot)
+        if access_grants_cache is not None:
+            self.access_grants_cache = access_grants_cache
+        if access_denied_cache is not None:
+            self.access_denied_cache = access_denied_cache
+        if bucket_region_cache is not None:
+            self.bucket_region_cache = bucket_region_cache
+        if caller_identity_cache is not None:
+            self.caller_identity_cache = caller_identity_cache
+
+    def _create_access_grants_cache(self, cache_size, duration, account_id_resolver_cache, backend=None):
+        return AccessGrantsCache(**self._get_access_grants_cache_params(cache_size, duration,
+                                                                        account_id_resolver_cache, backend))
+
+    def _get_access_grants_cache_params(self, cache_size, duration, account_id_resolver_cache, backend=None):
+        params = {'cache_size': cache_size, 'duration': duration,
+                  'account_id_resolver_cache': account_id_resolver_cache, 'backend': backend}
+        return {name: value for name, value in params.items() if value is not None}
+
+    def _create_bucket_region_cache(self, backend):
+        return BucketRegionResolverCache(backend=backend)
+
+    def _create_caller_identity_cache(self, backend):
+        return CallerIdentityResolverCache(backend=backend)
+
+    # The snapshot is flushed when the process exits, once however many plugins share it.
+    def _load_snapshot(self, snapshot):
+        self.snapshot = snapshot
+        if snapshot is not None:
+            snapshot.load()
+            atexit.unregister(snapshot.flush)
+            atexit.register(snapshot.flush)
+
     def register(self):
         self.s3_client.meta.events.register(
             'before-sign.s3', self._get_access_grants_credentials
         )
+        if self.split_delete_objects:
+            self.s3_client.meta.events.register(
+                'before-call.s3.DeleteObjects', self._split_delete_objects
+            )
+        if self.bucket_region_cache.observe_responses:
+            self.bucket_region_cache.observe(self.s3_client)
+        if self.multipart_upload_cache is not None:
+            self.s3_client.meta.events.register(
+                'after-call.s3.CreateMultipartUpload', self._pin_multipart_upload
+            )
+            for operation_name in ('CompleteMultipartUpload', 'AbortMultipartUpload'):
+                self.s3_client.meta.events.register(
+                    'after-call.s3.' + operation_name, self._unpin_multipart_upload
+                )
+
+    def warm(self, prefixes, permissions=("READ",), max_workers=DEFAULT_WARM_MAX_WORKERS):
+        """
+        Loads the bucket regions, bucket owner account ids, and Access Grants credentials for the given targets into
+        the caches, so that the first requests to them are served from the caches.
+
+        Args:
+            prefixes: S3 prefixes to warm, for example "s3://bucket/prefix/".
+            permissions: Permissions to warm each prefix for, any of READ, WRITE, and READWRITE.
+            max_workers: Maximum number of targets resolved in parallel.
+
+        Returns:
+            dict: The exception raised for each (prefix, permission) that could not be warmed.
+        """
+        targets = self._get_warm_targets(prefixes, permissions)
+        requester_credentials = self.s3_client._get_credentials()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-access-grants-warm") as executor:
+            futures = {target: executor.submit(self._resolve_credentials, requester_credentials, target[1],
+                                               target[0], self._get_bucket_name(target[0]))
+                       for target in targets}
+        failures = {target: future.exception() for target, future in futures.items()
+                    if future.exception() is not None}
+        for (s3_prefix, permission), e in failures.items():
+            logger.debug("Could not warm the caches for s3Prefix: %s and permission: %s: %s", s3_prefix, permission, e)
+        return failures
+
+    def resolve_bucket_owners(self, buckets, max_workers=DEFAULT_WARM_MAX_WORKERS):
+        """
+        Loads the owner account id of the given buckets into the account id cache, asking the S3 Control client of
+        the region of each bucket, see AccountIdResolverCache.resolve_many.
+
+        Args:
+            buckets: Names of the buckets.
+            max_workers: Maximum number of buckets resolved in parallel.
+
+        Returns:
+            tuple: The account id of each bucket that was resolved, and the exception raised for each bucket that
+            could not be.
+        """
+        requester_account_id = self.caller_identity_cache.resolve(self.sts_client, self.s3_client._get_credentials())
+        buckets = set(buckets)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-access-grants-resolve") as executor:
+            futures = {bucket: executor.submit(self.bucket_region_cache.resolve, self.internal_s3_client, bucket)
+                       for bucket in buckets}
+        failures = {bucket: future.exception() for bucket, future in futures.items()
+                    if future.exception() is not None}
+        account_ids = {}
+        for region, region_buckets in self._group_buckets_by_region(
+                {bucket: future.result() for bucket, future in futures.items() if bucket not in failures}).items():
+            s3_control_client = self.s3_control_client_pool.get_client(self.session, region, self.client_config)
+            resolved, region_failures = self.access_grants_cache.account_id_resolver_cache.resolve_many(
+                s3_control_client, requester_account_id, region_buckets, max_workers)
+            account_ids.update(resolved)
+            failures.update(region_failures)
+        return account_ids, failures
+
+    def _group_buckets_by_region(self, bucket_regions):
+        buckets_by_region = {}
+        for bucket, region in bucket_regions.items():
+            buckets_by_region.setdefault(region, []).append(bucket)
+        return buckets_by_region
+
+    def _get_warm_targets(self, prefixes, permissions):
+        for permission in permissions:
+            if permission not in ACCESS_GRANTS_PERMISSIONS:
+                raise IllegalArgumentException("Permission must be one of " + ", ".join(ACCESS_GRANTS_PERMISSIONS))
+        targets = []
+        for s3_prefix in prefixes:
+            if not s3_prefix.startswith("s3://") or self._get_bucket_name(s3_prefix) == "":
+                raise IllegalArgumentException("Prefix must be of the form s3://bucket/prefix: " + s3_prefix)
+            targets.extend((s3_prefix, permission) for permission in permissions)
+        return targets
+
+    def _get_bucket_name(self, s3_prefix):
+        return s3_prefix.split("/")[2]
 
     def _get_access_grants_credentials(self, operation_name, request, **kwargs):
         requester_credentials = self.s3_client._get_credentials()
+        if self.multipart_upload_cache is not None and operation_name in PINNED_MULTIPART_UPLOAD_OPERATIONS:
+            s3ag_credentials = self.multipart_upload_cache.get_credentials(self._get_upload_id(request.context),
+                                                                           requester_credentials.access_key)
+            if s3ag_credentials is not None:
+                request.context['signing']['request_credentials'] = s3ag_credentials.signing_credentials
+                return
+        if operation_name == 'DeleteObjects' and self._sign_delete_objects_batch(request):
+            return
         try:
-            permission = get_permission_for_s3_operation(operation_name)
-            s3_prefix = self._get_s3_prefix(operation_name, request)
-            cache_key = CacheKey(permission=permission, credentials=requester_credentials,
-                                 s3_prefix="s3://" + s3_prefix)
-            requester_account_id = self.sts_client.get_caller_identity()['Account']
+            permission, get_s3_prefix = get_s3_operation(operation_name)
+            s3_prefix = get_s3_prefix(self, request.context)
             bucket_name = request.context['input_params']['Bucket']
-            s3_control_client = self._get_s3_control_client_for_region(bucket_name)
-            s3ag_credentials = self._get_value_from_cache(cache_key, s3_control_client, requester_account_id)
-            request.context['signing']['request_credentials'] = botocore.credentials.Credentials(access_key=s3ag_credentials['AccessKeyId'],
-                                                                                                 secret_key=s3ag_credentials['SecretAccessKey'],
-                                                                                                 token=s3ag_credentials['SessionToken'])
+            s3ag_credentials = None
+            if self._queued_transfer_credentials is not None:
+                s3ag_credentials = self._get_queued_transfer_credentials(requester_credentials.access_key,
+                                                                         permission, "s3://" + s3_prefix)
+            if s3ag_credentials is None:
+                s3ag_credentials = self._resolve_credentials(requester_credentials, permission, "s3://" + s3_prefix,
+                                                             bucket_name)
+            # The signing credentials are built when the credentials are cached and shared by the requests signed with
+            # them, so a cache hit does not allocate any.
+            request.context['signing']['request_credentials'] = \
+                self.access_grants_cache._with_signing_credentials(s3ag_credentials).signing_credentials
+            if self.multipart_upload_cache is not None:
+                self._track_multipart_upload(operation_name, request.context, requester_credentials.access_key,
+                                             s3ag_credentials)
 
         except Exception as e:
             if self._should_fallback_to_default_credentials_for_this_case(e):
@@ -62,90 +274,219 @@ class S3AccessGrantsPlugin:
             else:
                 raise e
 
+    def _get_upload_id(self, context):
+        return context.get('s3_redirect', {}).get('params', {}).get('UploadId')
+
+    # The UploadId of a CreateMultipartUpload request is only known from its response, the parts of an upload that
+    # is not pinned yet pin the credentials they resolve.
+    def _track_multipart_upload(self, operation_name, context, requester_access_key, s3ag_credentials):
+        if operation_name == 'CreateMultipartUpload':
+            context[MULTIPART_UPLOAD_CONTEXT_KEY] = (requester_access_key, s3ag_credentials)
+        elif operation_name == 'UploadPart':
+            self._pin(self._get_upload_id(context), requester_access_key, s3ag_credentials)
+
+    def _pin(self, upload_id, requester_access_key, s3ag_credentials):
+        if upload_id is not None:
+            s3ag_credentials = self.access_grants_cache._with_signing_credentials(s3ag_credentials)
+            self.multipart_upload_cache.pin(upload_id, requester_access_key, s3ag_credentials,
+                                            self.access_grants_cache._get_cache_ttl(s3ag_credentials))
+
+    def _pin_multipart_upload(self, http_response, parsed, context, **kwargs):
+        upload = context.get(MULTIPART_UPLOAD_CONTEXT_KEY)
+        if upload is not None and http_response.status_code < 300:
+            self._pin(parsed.get('UploadId'), *upload)
+
+    def _unpin_multipart_upload(self, http_response, context, **kwargs):
+        upload_id = self._get_upload_id(context)
+        if upload_id is not None and http_response.status_code < 300:
+            self.multipart_upload_cache.unpin(upload_id)
+
+    # The credentials an AccessGrantsTransferSubscriber resolved when a transfer was queued sign the requests of the
+    # transfer until it is done, so that a grant on a single object, which is not cached, is not requested again.
+    def _pin_queued_transfer(self, requester_access_key, permission, s3_prefix, s3ag_credentials):
+        ttl = self.access_grants_cache._get_cache_ttl(s3ag_credentials)
+        if ttl <= 0:
+            return
+        if self._queued_transfer_credentials is None:
+            with S3AccessGrantsPlugin._queued_transfer_credentials_lock:
+                if self._queued_transfer_credentials is None:
+                    self._queued_transfer_credentials = Cache(maxsize=DEFAULT_QUEUED_TRANSFER_CACHE_SIZE)
+        self._queued_transfer_credentials.set((permission, s3_prefix), (requester_access_key, s3ag_credentials),
+                                                  ttl=ttl)
+
+    def _unpin_queued_transfer(self, permission, s3_prefix):
+        if self._queued_transfer_credentials is not None:
+            self._queued_transfer_credentials.delete((permission, s3_prefix))
+
+    def _get_queued_transfer_credentials(self, requester_access_key, permission, s3_prefix):
+        pinned = self._queued_transfer_credentials.get((permission, s3_prefix))
+        if pinned is None or pinned[0] != requester_access_key:
+            return None
+        return pinned[1]
+
+    def _split_delete_objects(self, model, params, context, **kwargs):
+        """
+        Splits a DeleteObjects request whose keys are covered by different grants into one request per grant, so that
+        every key is deleted with credentials for a grant that covers it instead of a grant on their common ancestor.
+
+        Returns:
+            tuple: The http response and the merged parsed response of the sub-requests, or None to send the request
+            as is, when all its keys are covered by the same grant.
+        """
+        if _sending_delete_objects_batches.get() or 's3_redirect' not in context:
+            return None
+        api_params = self._get_delete_objects_params(model, context)
+        batches = self._group_objects_by_grant(self.s3_client._get_credentials(), api_params)
+        if len(batches) < 2:
+            return None
+        logger.debug("Splitting DeleteObjects request into %s requests, one per grant.", len(batches))
+        token = _sending_delete_objects_batches.set(True)
+        try:
+            results = [self._delete_objects_batch(api_params, batch, s3ag_credentials)
+                       for s3ag_credentials, batch in batches]
+        finally:
+            _sending_delete_objects_batches.reset(token)
+        return AWSResponse(params['url'], 200, {}, None), self._merge_delete_objects_results(results)
+
+    # Sub-requests of a split DeleteObjects request are signed with the credentials of the grant their keys were grouped
+    # by, the common prefix of their keys may not be covered by any grant.
+    def _sign_delete_objects_batch(self, request):
+        s3ag_credentials = _delete_objects_batch_credentials.get()
+        if s3ag_credentials is None:
+            return False
+        request.context['signing']['request_credentials'] = \
+            self.access_grants_cache._with_signing_credentials(s3ag_credentials).signing_credentials
+        return True
+
+    def _get_delete_objects_params(self, model, context):
+        return {name: value for name, value in context['s3_redirect']['params'].items()
+                if name in model.input_shape.members}
+
+    # The key of the cached grant covering cache_key, and its credentials.
+    def _find_covering_grant(self, cache_key):
+        return self.access_grants_cache._search_cached_entry(cache_key)
+
+    def _group_objects_by_grant(self, requester_credentials, api_params):
+        bucket_name = api_params['Bucket']
+        permission = get_permission_for_s3_operation('DeleteObjects')
+        cache_keys = [CacheKey(permission=permission, credentials=requester_credentials,
+                               s3_prefix="s3://" + bucket_name + "/" + delete_object['Key'])
+                      for delete_object in api_params['Delete']['Objects']]
+        s3_prefixes = self._get_uncovered_directory_prefixes(cache_keys)
+        if s3_prefixes:
+            with ThreadPoolExecutor(max_workers=min(len(s3_prefixes), DEFAULT_WARM_MAX_WORKERS),
+                                    thread_name_prefix="s3-access-grants-delete-objects") as executor:
+                list(executor.map(lambda s3_prefix: self._resolve_delete_objects_grant(
+                    requester_credentials, permission, s3_prefix, bucket_name), s3_prefixes))
+        return self._group_by_covering_grant(api_params['Delete']['Objects'], cache_keys)
+
+    # Returns the credentials of each grant and the objects it covers. Object level grants are not cached, so keys
+    # without a cached grant are deleted together in a single request, signed like any other request, instead of one
+    # request each.
+    def _group_by_covering_grant(self, delete_objects, cache_keys):
+        groups = {}
+        for delete_object, cache_key in zip(delete_objects, cache_keys):
+            matched_key, s3ag_credentials = self._find_covering_grant(cache_key)
+            groups.setdefault(matched_key, (s3ag_credentials, []))[1].append(delete_object)
+        return list(groups.values())
+
+    # One key is resolved for each directory whose keys are not covered by a cached grant, so that a batch costs one
+    # GetDataAccess call per directory rather than per key.
+    def _get_uncovered_directory_prefixes(self, cache_keys):
+        s3_prefixes = {}
+        for cache_key in cache_keys:
+            if self._find_covering_grant(cache_key)[0] is None:
+                s3_prefixes.setdefault(cache_key.s3_prefix.rpartition("/")[0], cache_key.s3_prefix)
+        return list(s3_prefixes.values())
+
+    def _resolve_delete_objects_grant(self, requester_credentials, permission, s3_prefix, bucket_name):
+        try:
+            self._resolve_credentials(requester_credentials, permission, s3_prefix, bucket_name)
+        except Exception as e:
+            logger.debug("Could not find a grant for s3Prefix: %s: %s", s3_prefix, e)
+
+    def _get_delete_objects_batch_params(self, api_params, batch):
+        return dict(api_params, Delete=dict(api_params['Delete'], Objects=batch))
+
+    def _delete_objects_batch(self, api_params, batch, s3ag_credentials):
+        token = _delete_objects_batch_credentials.set(s3ag_credentials)
+        try:
+            return batch, self.s3_client.delete_objects(**self._get_delete_objects_batch_params(api_params, batch))
+        except ClientError as e:
+            return batch, e
+        finally:
+            _delete_objects_batch_credentials.reset(token)
+
+    # A sub-request that fails is reported as an error for each of its keys, like S3 reports the keys it could not
+    # delete.
+    def _merge_delete_objects_results(self, results):
+        deleted = []
+        errors = []
+        response_metadata = {'HTTPStatusCode': 200, 'HTTPHeaders': {}, 'RetryAttempts': 0}
+        for batch, response in results:
+            if isinstance(response, ClientError):
+                error = response.response.get('Error', {})
+                errors.extend(dict(self._get_object_identifier(delete_object), Code=error.get('Code'),
+                                   Message=error.get('Message')) for delete_object in batch)
+            else:
+                deleted.extend(response.get('Deleted', []))
+                errors.extend(response.get('Errors', []))
+                response_metadata = response['ResponseMetadata']
+        merged = {'ResponseMetadata': response_metadata}
+        if deleted:
+            merged['Deleted'] = deleted
+        if errors:
+            merged['Errors'] = errors
+        return merged
+
+    def _get_object_identifier(self, delete_object):
+        return {name: value for name, value in delete_object.items() if name in ('Key', 'VersionId')}
+
+    def _resolve_credentials(self, requester_credentials, permission, s3_prefix, bucket_name):
+        cache_key = CacheKey(permission=permission, credentials=requester_credentials, s3_prefix=s3_prefix)
+        requester_account_id = self.caller_identity_cache.resolve(self.sts_client, requester_credentials)
+        s3_control_client = self._get_s3_control_client_for_region(bucket_name)
+        return self._get_value_from_cache(cache_key, s3_control_client, requester_account_id)
+
     def _should_fallback_to_default_credentials_for_this_case(self, e):
         if e.__class__.__name__ == 'UnsupportedOperationError':
-            logging.debug(
+            logger.debug(
                 "Operation not supported by S3 access grants. Falling back to evaluate permission through policies.")
+            metrics.increment(metrics.FALLBACKS, metrics.UNSUPPORTED_OPERATION_FALLBACK_TAGS)
             return True
         if self.fallback_enabled:
-            logging.debug("Fall back enabled on the plugin. Falling back to evaluate permission through policies.")
+            logger.debug("Fall back enabled on the plugin. Falling back to evaluate permission through policies.")
+            metrics.increment(metrics.FALLBACKS, metrics.FALLBACK_ENABLED_FALLBACK_TAGS)
             return True
         return False
 
-    def _get_s3_prefix(self, operation_name, request):
-        if operation_name == 'DeleteObjects':
-            bucket_name = request.context['input_params']['Bucket']
-            prefixes = request.context['input_params']['Delete']['Objects']
-            prefix_list = []
-            for i in prefixes:
-                prefix_list.append(i['Key'])
-            s3_prefix = bucket_name + self._get_common_prefix_for_multiple_prefixes(prefix_list)
-            pass
-        elif operation_name == 'CopyObject':
-            destination_bucket_name = request.context['input_params']['Bucket']
-            source_split = request.context['s3_redirect']['params']['CopySource'].split('/', 1)
-            source_bucket = source_split[0]
-            if source_bucket != destination_bucket_name:
-                raise IllegalArgumentException("Source bucket and destination bucket must be the same.")
-            prefix_list = [source_split[1], request.context['input_params']['Key']]
-            s3_prefix = destination_bucket_name + self._get_common_prefix_for_multiple_prefixes(prefix_list)
-        elif (operation_name == 'ListObjectsV2' or
-              operation_name == 'ListObjects' or
-              operation_name == 'ListObjectVersions' or
-              operation_name == 'ListMultipartUploads'):
-            s3_prefix = request.context['input_params']['Bucket']
-            try:
-                s3_prefix = s3_prefix + "/" + request.context['input_params']['Prefix']
-            except KeyError:
-                pass
-        else:
-            s3_prefix = request.context['input_params']['Bucket']
-            try:
-                s3_prefix = s3_prefix + "/" + request.context['input_params']['Key']
-            except KeyError:
-                pass
-        return s3_prefix
-
+    # The common prefix is cut back to the last '/' before the keys diverge, keeping the characters the keys share
+    # after that '/'. For example, "folder/path123/A" and "folder/path234/A" give "/folder/path".
     def _get_common_prefix_for_multiple_prefixes(self, prefixes):
         if len(prefixes) == 0:
             return '/'
-        common_ancestor = first_key = prefixes[0]
-        last_prefix = ''
-        for prefix in prefixes[1:]:
-            while common_ancestor != "":
-                if not prefix.startswith(common_ancestor):
-                    last_index = common_ancestor.rfind('/')
-                    if last_index == -1:
-                        return "/"
-                    last_prefix = common_ancestor[last_index + 1:]
-                    common_ancestor = common_ancestor[:last_index]
-                else:
-                    break
-        new_common_ancestor = common_ancestor + "/" + last_prefix
-        for prefix in prefixes:
-            while last_prefix != "":
-                if not prefix.startswith(new_common_ancestor):
-                    last_prefix = last_prefix[0:-1]
-                    new_common_ancestor = common_ancestor + "/" + last_prefix
-                else:
-                    break
-        if new_common_ancestor == first_key + "/":
+        first_key = prefixes[0]
+        # Linear in the total length of the keys: the common prefix of all the keys is the common prefix of the
+        # lexicographically smallest and largest of them.
+        common_length = len(os.path.commonprefix(prefixes))
+        if common_length == len(first_key):
             return "/" + first_key
-        return "/" + new_common_ancestor
+        last_index = first_key.rfind('/', 0, common_length + 1)
+        if last_index == -1:
+            return "/"
+        if last_index == common_length:
+            # The keys diverge right at a '/' of the first key, that '/' is kept.
+            return "/" + first_key[:common_length] + "/"
+        return "/" + first_key[:common_length]
 
     def _get_s3_control_client_for_region(self, bucket_name):
         region = self.bucket_region_cache.resolve(self.internal_s3_client, bucket_name)
-        s3_control_client = self.client_dict.get(region)
-        if s3_control_client is None:
-            s3_control_client = create_nested_client(self.session, 's3control', region_name=region,
-                                                           config=self.session_config)
-            self.client_dict[region] = s3_control_client
-        return s3_control_client
+        return self.s3_control_client_pool.get_client(self.session, region, self.client_config)
 
     def _get_value_from_cache(self, cache_key, s3_control_client, requester_account_id):
         access_denied_exception = self.access_denied_cache.get_value_from_cache(cache_key)
         if access_denied_exception is not None:
-            logging.debug("Found cached Access Denied Exception.")
+            logger.debug("Found cached Access Denied Exception.")
             raise access_denied_exception
         return self.access_grants_cache.get_credentials(s3_control_client, cache_key,
                                                         requester_account_id,
@@ -0,0 +1,49 @@
+import threading
+import weakref
+from botocore.utils import create_nested_client
+
+DEFAULT_LOCK_STRIPES = 16
+
+
+class S3ControlClientPool:
+    """
+    Thread-safe pool of regional S3 Control clients, keyed by session, region and connection pool size.
+
+    Clients are created at most once per key. Creation is guarded by a fixed set of striped locks, so threads
+    creating clients for different regions do not wait for each other while lookups of existing clients take no
+    lock at all. Sessions are only referenced weakly: the clients of a session are released with it.
+    """
+
+    def __init__(self, lock_stripes=DEFAULT_LOCK_STRIPES):
+        self._clients = weakref.WeakKeyDictionary()
+        self._sessions_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    def _get_key(self, region, config):
+        return region, config.max_pool_connections
+
+    def _get_session_clients(self, session):
+        session_clients = self._clients.get(session)
+        if session_clients is None:
+            with self._sessions_lock:
+                session_clients = self._clients.setdefault(session, {})
+        return session_clients
+
+    def get_client(self, session, region, config):
+        session_clients = self._get_session_clients(session)
+        key = self._get_key(region, config)
+        client = session_clients.get(key)
+        if client is None:
+            with self._locks[hash((id(session), key)) % len(self._locks)]:
+                client = session_clients.get(key)
+                if client is None:
+                    client = create_nested_client(session, 's3control', region_name=region, config=config)
+                    session_clients[key] = client
+        return client
+
+    def warm_up(self, session, regions, config):
+        for region in regions:
+            self.get_client(session, region, config)
+
+    def contains(self, session, region, config):
+        return self._get_key(region, config) in self._clients.get(session, {})
@@ -0,0 +1,59 @@
+import logging
+from aws_s3_access_grants_boto3_plugin.cache.single_flight import SingleFlight
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
+from aws_s3_access_grants_boto3_plugin.operation_permissions import ACCESS_GRANTS_PERMISSIONS
+
+logger = logging.getLogger(__name__)
+
+
+class AccessGrantsTransferSubscriber:
+    """
+    s3transfer subscriber that resolves the Access Grants credentials of a transfer when it is queued, before any of
+    its requests is handed to the TransferManager's worker threads, so that these find their credentials in the cache.
+
+    Transfers are queued from several submission threads. The transfers of a batch that are queued at the same time
+    under the same directory share one resolution, so a batch covered by one grant calls Access Grants once instead of
+    once per thread. The requests of a transfer are signed with the credentials resolved when it was queued, until it
+    is done.
+
+    Pass one subscriber to all the transfers of a batch, with the permission they need: READ for downloads, WRITE for
+    uploads. It implements the subscriber methods of s3transfer.subscribers.BaseSubscriber, so that s3transfer is not
+    a dependency of the plugin.
+    """
+
+    def __init__(self, plugin, permission):
+        if permission not in ACCESS_GRANTS_PERMISSIONS:
+            raise IllegalArgumentException("Permission must be one of " + ", ".join(ACCESS_GRANTS_PERMISSIONS))
+        self.plugin = plugin
+        self.permission = permission
+        self._single_flight = SingleFlight()
+
+    def on_queued(self, future, **kwargs):
+        bucket_name = future.meta.call_args.bucket
+        key = future.meta.call_args.key
+        s3_prefix = "s3://" + bucket_name + "/" + key
+        requester_credentials = self.plugin.s3_client._get_credentials()
+        try:
+            resolved_s3_prefix, s3ag_credentials = self._single_flight.do(
+                (bucket_name, key.rpartition('/')[0]), self._resolve, requester_credentials, bucket_name, s3_prefix)
+            if resolved_s3_prefix != s3_prefix:
+                # A transfer that waited on another one of its directory finds its grant in the cache, unless the
+                # grant is on a single object.
+                s3ag_credentials = self._resolve(requester_credentials, bucket_name, s3_prefix)[1]
+        except Exception as e:
+            # The requests of the transfer resolve their credentials, or fall back, as usual.
+            logger.debug("Could not resolve the credentials for s3Prefix: %s before the transfer: %s", s3_prefix, e)
+            return
+        self.plugin._pin_queued_transfer(requester_credentials.access_key, self.permission, s3_prefix,
+                                         s3ag_credentials)
+
+    def _resolve(self, requester_credentials, bucket_name, s3_prefix):
+        return s3_prefix, self.plugin._resolve_credentials(requester_credentials, self.permission, s3_prefix,
+                                                           bucket_name)
+
+    def on_progress(self, future, bytes_transferred, **kwargs):
+        pass
+
+    def on_done(self, future, **kwargs):
+        self.plugin._unpin_queued_transfer(self.permission,
+                                           "s3://" + future.meta.call_args.bucket + "/" + future.meta.call_args.key)
@@ -0,0 +1,54 @@
+"""
+Micro-benchmark of the common prefix computed for DeleteObjects batches: the single pass implementation against the
+quadratic one it replaced.
+
+Run from the repository root with:  python -m benchmarks.common_prefix
+"""
+import argparse
+import timeit
+from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import S3AccessGrantsPlugin
+from tests.unit.common_prefix_reference import quadratic_common_prefix
+
+
+def _batch(keys, depth, segment_length, shared_depth):
+    segment = "s" * segment_length
+    batch = []
+    for key in range(keys):
+        shared = "/".join(segment for _ in range(shared_depth))
+        # The keys diverge in the last characters of a long segment, right below the shared segments.
+        private = "/".join(segment + str(key) for _ in range(depth - shared_depth))
+        batch.append(shared + "/" + "p" * segment_length * 4 + str(key % 7) + "/" + private)
+    return batch
+
+
+def _diverging_segment_batch(keys, segment_length):
+    # Every key shares a shorter part of the first key's long file name, each one trims the candidate prefix further.
+    first_key = "prefix/" + "x" * segment_length
+    return [first_key] + [first_key[:len(first_key) - key] + "y" for key in range(1, keys)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1000, help="keys per DeleteObjects batch")
+    parser.add_argument("--number", type=int, default=20, help="batches per measurement")
+    args = parser.parse_args()
+
+    common_prefix = S3AccessGrantsPlugin.__new__(S3AccessGrantsPlugin)._get_common_prefix_for_multiple_prefixes
+    scenarios = [
+        ("shallow keys, 40 chars", _batch(args.keys, 3, 10, 1)),
+        ("deep keys, 400 chars", _batch(args.keys, 20, 15, 10)),
+        ("deep keys, 1000 chars", _batch(args.keys, 40, 20, 30)),
+        ("diverging file names, 1000 chars", _diverging_segment_batch(args.keys, 1000)),
+        ("identical keys, 1000 chars", [_batch(1, 40, 20, 30)[0]] * args.keys),
+    ]
+    print(f"{'scenario':34} {'quadratic (ms)':>15} {'single pass (ms)':>17} {'speedup':>8}")
+    for name, batch in scenarios:
+        assert common_prefix(batch) == quadratic_common_prefix(batch)
+        quadratic = min(timeit.repeat(lambda: quadratic_common_prefix(batch), number=args.number,
+                                      repeat=5)) / args.number
+        single_pass = min(timeit.repeat(lambda: common_prefix(batch), number=args.number, repeat=5)) / args.number
+        print(f"{name:34} {quadratic * 1e3:15.3f} {single_pass * 1e3:17.3f} {quadratic / single_pass:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Micro-benchmark of the per-request logging overhead on the cached AccessGrantsCache.get_credentials path: eager string
+concatenation through the root logger against the guarded module logger, with DEBUG disabled.
+
+Both variants run the same cache hit path, metrics and refresh ahead check included, and only differ in their logging
+calls. The two are measured in alternation, --repeat times each, and the report gives the median and the standard
+deviation of the runs along with the median saving.
+
+Run from the repository root with:  python -m benchmarks.logging_overhead
+"""
+import argparse
+import logging
+import statistics
+import timeit
+from botocore import credentials
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
+from aws_s3_access_grants_boto3_plugin.cache.access_grants_cache import AccessGrantsCache, METRICS_TAGS
+from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+
+
+class EagerLoggingAccessGrantsCache(AccessGrantsCache):
+    """
+    The cache hit path as it logged before: every message is built with '+' and sent to the root logger. Apart from
+    the logging calls, get_credentials and _search_cached_entry are those of AccessGrantsCache.
+    """
+
+    def _search_cached_entry(self, cache_key):
+        search_keys = [cache_key]
+        if cache_key.permission == "READ" or cache_key.permission == "WRITE":
+            search_keys.append(CacheKey(permission="READWRITE", cache_key=cache_key))
+        matches = [self._grant_prefix_index.find(search_key) for search_key in search_keys]
+        for grant_type in (0, 1):
+            for search_key, found in zip(search_keys, matches):
+                for s3_prefix in found[grant_type]:
+                    matched_key = CacheKey(s3_prefix=s3_prefix, cache_key=search_key)
+                    cache_value = self.access_grants_cache.get(matched_key)
+                    if cache_value is not None:
+                        logging.debug("Successfully retrieved credentials from cache for s3Prefix: "
+                                      + matched_key.s3_prefix)
+                        return matched_key, cache_value
+        return None, None
+
+    def get_credentials(self, s3_control_client, cache_key, account_id, access_denied_cache):
+        logging.debug("Fetching credentials from Access Grants for s3Prefix: " + cache_key.s3_prefix)
+        matched_key, credentials = self._search_cached_entry(cache_key)
+        if credentials is not None and self.refresh_ahead_fraction is not None and self._should_refresh(matched_key):
+            self._schedule_refresh(matched_key, s3_control_client, cache_key, account_id, access_denied_cache)
+        if credentials is None:
+            metrics.increment(metrics.CACHE_MISSES, METRICS_TAGS)
+            logging.debug("Credentials not available in the cache. Fetching credentials from Access Grants service.")
+            with metrics.timer(metrics.CACHE_MISS_LATENCY, METRICS_TAGS):
+                credentials = self._single_flight.do(cache_key, self._load_credentials, s3_control_client, cache_key,
+                                                     account_id, access_denied_cache)
+        else:
+            metrics.increment(metrics.CACHE_HITS, METRICS_TAGS)
+        return credentials
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="lookups per run")
+    parser.add_argument("--repeat", type=int, default=15, help="runs of each variant")
+    args = parser.parse_args()
+    if args.repeat < 2:
+        parser.error("--repeat must be at least 2 to report a standard deviation")
+    logging.basicConfig(level=logging.INFO)
+
+    requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+    grant_key = CacheKey(requester_credentials, 'READ', "s3://bucket/prefix")
+    lookup_key = CacheKey(requester_credentials, 'READ', "s3://bucket/prefix/" + "a" * 150 + "/object.txt")
+    access_denied_cache = AccessDeniedCache()
+
+    def prepare(access_grants_cache):
+        access_grants_cache._put_value_in_cache(grant_key, {"grant": "s3://bucket/prefix"})
+        assert access_grants_cache.get_credentials(None, lookup_key, "123456789012", access_denied_cache)
+        return lambda: access_grants_cache.get_credentials(None, lookup_key, "123456789012", access_denied_cache)
+
+    variants = {"eager": prepare(EagerLoggingAccessGrantsCache()), "guarded": prepare(AccessGrantsCache())}
+    runs = {name: [] for name in variants}
+    # Alternating the variants spreads the drift of the machine over both of them.
+    for _ in range(args.repeat):
+        for name, lookup in variants.items():
+            runs[name].append(timeit.timeit(lookup, number=args.number) / args.number * 1e6)
+    savings = [eager - guarded for eager, guarded in zip(runs["eager"], runs["guarded"])]
+
+    print(f"{args.repeat} runs of {args.number} lookups per variant, times in us per lookup")
+    print(f"{'variant':>10} {'median':>8} {'stdev':>8} {'min':>8} {'max':>8}")
+    for name, times in list(runs.items()) + [("saved", savings)]:
+        print(f"{name:>10} {statistics.median(times):8.3f} {statistics.stdev(times):8.3f} {min(times):8.3f} "
+              f"{max(times):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark of the AccessGrantsCache lookup: the grant prefix index against the linear scan it replaced, and the
+memory the index takes for --memory-grants grants of the form s3://bucket/data/<32 hex digits>.
+
+Run from the repository root with:  python -m benchmarks.prefix_index
+"""
+import argparse
+import timeit
+import tracemalloc
+import uuid
+from botocore import credentials
+from aws_s3_access_grants_boto3_plugin.cache.access_grants_cache import AccessGrantsCache
+from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.cache.grant_prefix_index import GrantPrefixIndex
+
+
+def _search_credentials_at_prefix_level(cache, cache_key):
+    prefix = cache_key.s3_prefix
+    while prefix != "s3:":
+        cache_key = CacheKey(cache_key=cache_key, s3_prefix=prefix)
+        cache_value = cache.get(cache_key)
+        if cache_value is not None:
+            return cache_value
+        prefix = prefix.rsplit('/', 1)[0]
+    return None
+
+
+def _search_credentials_at_character_level(cache, cache_key):
+    prefix = cache_key.s3_prefix
+    while prefix != "s3://":
+        cache_key = CacheKey(cache_key=cache_key, s3_prefix=prefix + "*")
+        cache_value = cache.get(cache_key)
+        if cache_value is not None:
+            return cache_value
+        prefix = prefix[:-1]
+    return None
+
+
+def linear_scan(cache, cache_key):
+    credentials = _search_credentials_at_prefix_level(cache, cache_key)
+    if credentials is None and (cache_key.permission == "READ" or cache_key.permission == "WRITE"):
+        credentials = _search_credentials_at_prefix_level(cache, CacheKey(permission="READWRITE", cache_key=cache_key))
+    if credentials is None:
+        credentials = _search_credentials_at_character_level(cache, cache_key)
+    if credentials is None and (cache_key.permission == "READ" or cache_key.permission == "WRITE"):
+        credentials = _search_credentials_at_character_level(cache,
+                                                             CacheKey(permission="READWRITE", cache_key=cache_key))
+    return credentials
+
+
+def _build_key(depth, segment_length):
+    segment = "s" * (segment_length - 1)
+    return "s3://bucket/" + "/".join(segment + str(level % 10) for level in range(depth)) + "/object.txt"
+
+
+def measure_index_memory(requester_credentials, grants):
+    cache_keys = [CacheKey(requester_credentials, 'READ', "s3://bucket/data/" + uuid.uuid4().hex)
+                  for _ in range(grants)]
+    tracemalloc.start()
+    try:
+        index = GrantPrefixIndex()
+        for cache_key in cache_keys:
+            index.add(cache_key)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grants", type=int, default=1000, help="number of unrelated grants in the cache")
+    parser.add_argument("--number", type=int, default=2000, help="lookups per measurement")
+    parser.add_argument("--memory-grants", type=int, default=30000, help="grants indexed for the memory figure")
+    args = parser.parse_args()
+
+    requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+    access_grants_cache = AccessGrantsCache()
+    for grant in range(args.grants):
+        access_grants_cache._put_value_in_cache(
+            CacheKey(requester_credentials, 'READ', "s3://bucket-" + str(grant) + "/prefix"), {})
+
+    scenarios = [
+        ("grant at bucket, 200 char key", "s3://bucket", _build_key(19, 10)),
+        ("grant at depth 10, 200 char key", _build_key(10, 10).rsplit('/', 1)[0], _build_key(19, 10)),
+        ("character grant, 200 char key", "s3://bucket/s*", _build_key(19, 10)),
+        ("READWRITE grant at bucket, 200 char key", "s3://bucket", _build_key(19, 10)),
+    ]
+    print(f"{'scenario':45} {'linear (us)':>12} {'index (us)':>12} {'speedup':>8}")
+    for name, grant, key in scenarios:
+        permission = 'READWRITE' if name.startswith('READWRITE') else 'READ'
+        grant_key = CacheKey(requester_credentials, permission, grant)
+        access_grants_cache._put_value_in_cache(grant_key, {"grant": grant})
+        lookup_key = CacheKey(requester_credentials, 'READ', key)
+        assert linear_scan(access_grants_cache.access_grants_cache, lookup_key) == \
+            access_grants_cache._search_credentials_in_cache(lookup_key)
+        linear = min(timeit.repeat(lambda: linear_scan(access_grants_cache.access_grants_cache, lookup_key),
+                                   number=args.number, repeat=5)) / args.number
+        indexed = min(timeit.repeat(lambda: access_grants_cache._search_credentials_in_cache(lookup_key),
+                                    number=args.number, repeat=5)) / args.number
+        print(f"{name:45} {linear * 1e6:12.1f} {indexed * 1e6:12.1f} {linear / indexed:7.1f}x")
+        access_grants_cache.access_grants_cache.delete(grant_key)
+
+    size = measure_index_memory(requester_credentials, args.memory_grants)
+    print(f"index of {args.memory_grants} grants: {size / 2 ** 20:.1f} MB, "
+          f"{size / args.memory_grants:.0f} bytes per grant")
+
+
+if __name__ == "__main__":
+    main()
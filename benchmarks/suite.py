@@ -0,0 +1,264 @@
+"""
+Benchmark suite for the before-sign hook and the cache layers behind it.
+
+Every scenario drives S3AccessGrantsPlugin._get_access_grants_credentials, the handler registered on before-sign.s3,
+with stub sts, s3 and s3control clients that answer from memory, so results only measure the plugin and can be
+reproduced offline. Each scenario reports throughput and latency percentiles.
+
+Run from the repository root with:  python -m benchmarks.suite
+Save a baseline with --save baseline.json and compare against it with --baseline baseline.json; the run exits with
+status 1 if the throughput of a scenario drops by more than --threshold.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from botocore import credentials
+from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
+from aws_s3_access_grants_boto3_plugin.cache.access_grants_cache import AccessGrantsCache
+from aws_s3_access_grants_boto3_plugin.cache.bucket_region_resolver_cache import BucketRegionResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.caller_identity_resolver_cache import CallerIdentityResolverCache
+from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import S3AccessGrantsPlugin
+
+ACCOUNT_ID = "123456789012"
+DEFAULT_THRESHOLD = 0.2
+PERCENTILES = (50, 90, 99)
+
+
+class StubStsClient:
+
+    def get_caller_identity(self):
+        return {'UserId': 'AIDASAMPLEUSERID', 'Account': ACCOUNT_ID, 'Arn': 'arn:aws:iam::' + ACCOUNT_ID + ':user/user'}
+
+
+class StubS3Client:
+
+    def head_bucket(self, Bucket):
+        return {'BucketRegion': 'us-east-2'}
+
+
+class StubS3ControlClient:
+    """
+    Grants every request at the bucket level, "s3://bucket/*".
+    """
+
+    def get_access_grants_instance_for_prefix(self, AccountId, S3Prefix):
+        return {'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:' + ACCOUNT_ID + ':access-grants/default',
+                'AccessGrantsInstanceId': 'default'}
+
+    def get_data_access(self, AccountId, Target, Permission, Privilege, DurationSeconds):
+        return {
+            'Credentials': {
+                'AccessKeyId': 'access_key_id',
+                'SecretAccessKey': 'secret_access_key',
+                'SessionToken': 'session_token',
+                'Expiration': None
+            },
+            'MatchedGrantTarget': "s3://" + Target.split("/")[2] + "/*"
+        }
+
+
+class StubS3ControlClientPool:
+
+    def __init__(self):
+        self.client = StubS3ControlClient()
+
+    def get_client(self, session, region, config):
+        return self.client
+
+
+class StubRequestingS3Client:
+    """
+    The S3 client the plugin is registered on, signing with the current identity.
+    """
+
+    def __init__(self, requester_credentials):
+        self.requester_credentials = requester_credentials
+
+    def _get_credentials(self):
+        return self.requester_credentials
+
+
+class StubRequest:
+
+    def __init__(self, params):
+        self.context = {'input_params': params, 'signing': {}}
+
+
+def _create_identity(index):
+    return credentials.Credentials(access_key="access_key_" + str(index), secret_key="secret_key_" + str(index),
+                                   token="token")
+
+
+def _create_plugin(requester_credentials):
+    plugin = S3AccessGrantsPlugin.__new__(S3AccessGrantsPlugin)
+    plugin.s3_client = StubRequestingS3Client(requester_credentials)
+    plugin.fallback_enabled = False
+    plugin.session = None
+    plugin.client_config = S3AccessGrantsPlugin.session_config
+    plugin.sts_client = StubStsClient()
+    plugin.internal_s3_client = StubS3Client()
+    plugin.s3_control_client_pool = StubS3ControlClientPool()
+    # Every scenario starts from empty caches, independent of the shared class level ones.
+    plugin.access_denied_cache = AccessDeniedCache()
+    plugin.access_grants_cache = AccessGrantsCache()
+    plugin.bucket_region_cache = BucketRegionResolverCache()
+    plugin.caller_identity_cache = CallerIdentityResolverCache()
+    return plugin
+
+
+def _deep_key(depth):
+    return "/".join("segment" + str(level) for level in range(depth)) + "/object.txt"
+
+
+def _run(plugin, operations, number):
+    """
+    Sends number requests, cycling through operations, and returns the latency of each request in seconds.
+    """
+    latencies = []
+    handler = plugin._get_access_grants_credentials
+    for i in range(number):
+        operation_name, params, requester_credentials = operations[i % len(operations)]
+        plugin.s3_client.requester_credentials = requester_credentials
+        request = StubRequest(params)
+        start = time.perf_counter()
+        handler(operation_name, request)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def warm_hit(number):
+    identity = _create_identity(0)
+    plugin = _create_plugin(identity)
+    operations = [("GetObject", {'Bucket': 'bucket', 'Key': 'prefix/object.txt'}, identity)]
+    _run(plugin, operations, 1)
+    return plugin, operations
+
+
+def cold_miss(number):
+    # Every request goes to a new bucket, so the region, owner account and credentials all come from the service.
+    identity = _create_identity(0)
+    plugin = _create_plugin(identity)
+    operations = [("GetObject", {'Bucket': 'bucket-' + str(i), 'Key': 'object.txt'}, identity)
+                  for i in range(number)]
+    return plugin, operations
+
+
+def deep_key(number):
+    identity = _create_identity(0)
+    plugin = _create_plugin(identity)
+    operations = [("PutObject", {'Bucket': 'bucket', 'Key': _deep_key(100)}, identity)]
+    _run(plugin, operations, 1)
+    return plugin, operations
+
+
+def delete_objects_batch(number):
+    identity = _create_identity(0)
+    plugin = _create_plugin(identity)
+    objects = [{'Key': "prefix/" + _deep_key(i % 8) + str(i)} for i in range(1000)]
+    operations = [("DeleteObjects", {'Bucket': 'bucket', 'Delete': {'Objects': objects}}, identity)]
+    _run(plugin, operations, 1)
+    return plugin, operations
+
+
+def many_identities(number):
+    identities = [_create_identity(i) for i in range(1000)]
+    plugin = _create_plugin(identities[0])
+    operations = [("GetObject", {'Bucket': 'bucket', 'Key': 'prefix/object.txt'}, identity)
+                  for identity in identities]
+    _run(plugin, operations, len(operations))
+    return plugin, operations
+
+
+SCENARIOS = {
+    "warm_hit": warm_hit,
+    "cold_miss": cold_miss,
+    "deep_key": deep_key,
+    "delete_objects_batch": delete_objects_batch,
+    "many_identities": many_identities,
+    "many_threads": warm_hit,
+}
+
+
+def _percentile(sorted_latencies, percentile):
+    index = min(len(sorted_latencies) - 1, int(len(sorted_latencies) * percentile / 100))
+    return sorted_latencies[index]
+
+
+def run_scenario(name, number, threads, repeat):
+    """
+    Runs the scenario repeat times, from a fresh plugin each time, and keeps the fastest run to filter out noise.
+    """
+    runs = [_run_scenario_once(name, number, threads) for _ in range(repeat)]
+    return max(runs, key=lambda result: result["ops_per_sec"])
+
+
+def _run_scenario_once(name, number, threads):
+    plugin, operations = SCENARIOS[name](number)
+    if name != "many_threads":
+        threads = 1
+    # Every thread sends its own share of the requests against the same plugin and caches.
+    results = [None] * threads
+    workers = [threading.Thread(target=lambda index=index: results.__setitem__(
+        index, _run(plugin, operations, number // threads))) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result)
+    result = {"ops_per_sec": len(latencies) / elapsed}
+    for percentile in PERCENTILES:
+        result["p" + str(percentile) + "_us"] = _percentile(latencies, percentile) * 1e6
+    result["max_us"] = latencies[-1] * 1e6
+    return result
+
+
+def find_regressions(results, baseline, threshold):
+    regressions = {}
+    for name, result in results.items():
+        if name in baseline:
+            change = result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1
+            if change < -threshold:
+                regressions[name] = change
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="requests per scenario")
+    parser.add_argument("--threads", type=int, default=8, help="threads of the many_threads scenario")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the fastest one is reported")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run, can be repeated, defaults to all of them")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare the throughput against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="largest tolerated throughput drop against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'scenario':22} {'ops/sec':>10} {'p50 (us)':>9} {'p90 (us)':>9} {'p99 (us)':>9} {'max (us)':>10}")
+    for name in args.scenario or SCENARIOS:
+        result = results[name] = run_scenario(name, args.number, args.threads, args.repeat)
+        print(f"{name:22} {result['ops_per_sec']:10.0f} {result['p50_us']:9.1f} {result['p90_us']:9.1f} "
+              f"{result['p99_us']:9.1f} {result['max_us']:10.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, change in regressions.items():
+            print(f"REGRESSION {name}: throughput {change:+.1%} against the baseline")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
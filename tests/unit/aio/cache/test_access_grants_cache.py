@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from botocore import credentials
+from botocore.exceptions import ClientError
+from aws_s3_access_grants_boto3_plugin.aio.cache.access_grants_cache import AioAccessGrantsCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.account_id_resolver_cache import AioAccountIdResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
+from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+
+
+class TestAioAccessGrantsCache(unittest.IsolatedAsyncioTestCase):
+    requester_account_id = "123456789012"
+    requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+
+    def setUp(self):
+        self.access_grants_cache = AioAccessGrantsCache()
+        self.access_grants_cache.account_id_resolver_cache = AioAccountIdResolverCache()
+        self.access_denied_cache = AccessDeniedCache()
+        self.mock_s3_control_client = mock.AsyncMock()
+        self.mock_s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+            'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+        }
+        self.mock_s3_control_client.get_data_access.return_value = {
+            'Credentials': {
+                'AccessKeyId': 'access_key_id',
+                'SecretAccessKey': 'secret_access_key',
+                'SessionToken': 'session_token',
+                'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)
+            },
+            'MatchedGrantTarget': 's3://bucket-name/*'
+        }
+
+    async def _get_credentials(self, s3_prefix):
+        key = CacheKey(self.requester_credentials, 'READ', s3_prefix)
+        return await self.access_grants_cache.get_credentials(self.mock_s3_control_client, key,
+                                                              self.requester_account_id, self.access_denied_cache)
+
+    async def test_get_credentials_from_service_and_cache(self):
+        value = await self._get_credentials("s3://bucket-name/prefixA")
+        self.assertEqual(value['AccessKeyId'], 'access_key_id')
+        await self._get_credentials("s3://bucket-name/prefixB")
+        self.mock_s3_control_client.get_data_access.assert_awaited_once()
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_args.kwargs['AccountId'], '987654321098')
+
+    async def test_cache_hits_share_the_aio_signing_credentials(self):
+        from aiobotocore.credentials import AioCredentials
+        value_1 = await self._get_credentials("s3://bucket-name/prefixA")
+        value_2 = await self._get_credentials("s3://bucket-name/prefixB")
+        self.assertIsInstance(value_1.signing_credentials, AioCredentials)
+        self.assertEqual((await value_1.signing_credentials.get_frozen_credentials()).access_key, 'access_key_id')
+        self.assertIs(value_2.signing_credentials, value_1.signing_credentials)
+
+    async def test_concurrent_misses_for_same_key_make_one_service_call(self):
+        response = self.mock_s3_control_client.get_data_access.return_value
+        response['MatchedGrantTarget'] = 's3://bucket-name/prefixA'
+
+        async def get_data_access(**kwargs):
+            await asyncio.sleep(0.05)
+            return response
+        self.mock_s3_control_client.get_data_access.side_effect = get_data_access
+        results = await asyncio.gather(*[self._get_credentials("s3://bucket-name/prefixA") for _ in range(10)])
+        self.assertEqual(len(results), 10)
+        self.assertEqual(self.mock_s3_control_client.get_data_access.await_count, 1)
+        self.assertEqual(self.mock_s3_control_client.get_access_grants_instance_for_prefix.await_count, 1)
+
+    async def test_access_denied_is_cached(self):
+        error = ClientError({'Error': {'Message': 'Access denied', 'Code': 'AccessDenied'}}, 'GetDataAccess')
+        self.mock_s3_control_client.get_data_access.side_effect = error
+        with self.assertRaises(ClientError):
+            await self._get_credentials("s3://bucket-name/prefixA")
+        key = CacheKey(self.requester_credentials, 'READ', "s3://bucket-name/prefixA")
+        self.assertEqual(self.access_denied_cache.get_value_from_cache(key).response['Error']['Code'], 'AccessDenied')
+
+    async def test_widened_target_grant_serves_the_subtree(self):
+        self.access_grants_cache = AioAccessGrantsCache(widen_target_levels=1)
+        self.access_grants_cache.account_id_resolver_cache = AioAccountIdResolverCache()
+        self.mock_s3_control_client.get_data_access.return_value['MatchedGrantTarget'] = 's3://bucket-name/prefixA/*'
+        await self._get_credentials("s3://bucket-name/prefixA/file1.txt")
+        await self._get_credentials("s3://bucket-name/prefixA/file2.txt")
+        self.mock_s3_control_client.get_data_access.assert_awaited_once()
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_args.kwargs['Target'],
+                         "s3://bucket-name/prefixA/*")
+
+    async def test_key_that_is_its_own_widened_target_is_requested_once(self):
+        self.access_grants_cache = AioAccessGrantsCache(widen_target_levels=1)
+        self.access_grants_cache.account_id_resolver_cache = AioAccountIdResolverCache()
+        self.mock_s3_control_client.get_data_access.return_value['MatchedGrantTarget'] = 's3://bucket-name/a/*'
+        value = await asyncio.wait_for(self._get_credentials("s3://bucket-name/a/*"), timeout=3)
+        self.assertEqual(value['AccessKeyId'], 'access_key_id')
+        self.mock_s3_control_client.get_data_access.assert_awaited_once()
+
+    async def test_denied_widened_target_falls_back_to_the_key(self):
+        self.access_grants_cache = AioAccessGrantsCache(widen_target_levels=1)
+        self.access_grants_cache.account_id_resolver_cache = AioAccountIdResolverCache()
+        response = self.mock_s3_control_client.get_data_access.return_value
+        response['MatchedGrantTarget'] = 's3://bucket-name/prefixA/file1.txt'
+
+        async def get_data_access(**kwargs):
+            if kwargs['Target'].endswith('*'):
+                raise ClientError({'Error': {'Message': 'Access denied', 'Code': 'AccessDenied'}}, 'GetDataAccess')
+            return response
+        self.mock_s3_control_client.get_data_access.side_effect = get_data_access
+        value = await self._get_credentials("s3://bucket-name/prefixA/file1.txt")
+        self.assertEqual(value['AccessKeyId'], 'access_key_id')
+        targets = [call.kwargs['Target'] for call in self.mock_s3_control_client.get_data_access.call_args_list]
+        self.assertEqual(targets, ["s3://bucket-name/prefixA/*", "s3://bucket-name/prefixA/file1.txt"])
+
+    async def test_refresh_ahead_runs_as_a_task(self):
+        self.access_grants_cache = AioAccessGrantsCache(refresh_ahead_fraction=0.5, expiration_safety_margin=0)
+        self.access_grants_cache.account_id_resolver_cache = AioAccountIdResolverCache()
+        self.mock_s3_control_client.get_data_access.return_value['Credentials']['Expiration'] = \
+            datetime.now(timezone.utc) + timedelta(seconds=2)
+        await self._get_credentials("s3://bucket-name/prefixA")
+        await asyncio.sleep(1)
+        await self._get_credentials("s3://bucket-name/prefixA")
+        await asyncio.gather(*self.access_grants_cache._refresh_tasks)
+        self.assertEqual(self.mock_s3_control_client.get_data_access.await_count, 2)
+        self.assertEqual(self.access_grants_cache._refreshing, set())
+
+    async def test_failed_refresh_is_not_retried_on_every_hit(self):
+        self.access_grants_cache = AioAccessGrantsCache(refresh_ahead_fraction=0.5, expiration_safety_margin=0)
+        self.access_grants_cache.account_id_resolver_cache = AioAccountIdResolverCache()
+        self.mock_s3_control_client.get_data_access.return_value['Credentials']['Expiration'] = \
+            datetime.now(timezone.utc) + timedelta(seconds=2)
+        await self._get_credentials("s3://bucket-name/prefixA")
+        await asyncio.sleep(1)
+        self.mock_s3_control_client.get_data_access.side_effect = ClientError(
+            {'Error': {'Message': 'Rate exceeded', 'Code': 'ThrottlingException'}}, 'GetDataAccess')
+        await self._get_credentials("s3://bucket-name/prefixA")
+        await asyncio.gather(*self.access_grants_cache._refresh_tasks)
+        value = await self._get_credentials("s3://bucket-name/prefixA")
+        await asyncio.gather(*self.access_grants_cache._refresh_tasks)
+        self.assertEqual(value['AccessKeyId'], 'access_key_id')
+        self.assertEqual(self.mock_s3_control_client.get_data_access.await_count, 2)
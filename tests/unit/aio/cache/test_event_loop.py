@@ -0,0 +1,35 @@
+import asyncio
+import threading
+import unittest
+from aws_s3_access_grants_boto3_plugin.aio.cache.event_loop import PerEventLoop, call_backend
+
+
+class _Owner:
+    cache = PerEventLoop(object)
+
+
+class TestPerEventLoop(unittest.TestCase):
+
+    def test_one_instance_per_event_loop(self):
+        async def get_caches():
+            return _Owner().cache, _Owner().cache
+        first_loop_caches = asyncio.run(get_caches())
+        second_loop_caches = asyncio.run(get_caches())
+        self.assertIs(first_loop_caches[0], first_loop_caches[1])
+        self.assertIsNot(first_loop_caches[0], second_loop_caches[0])
+        self.assertIs(_Owner().cache, _Owner.cache)
+
+    def test_instance_attribute_takes_precedence(self):
+        owner = _Owner()
+        cache = object()
+        owner.cache = cache
+        self.assertIs(owner.cache, cache)
+        self.assertIsNot(_Owner().cache, cache)
+
+
+class TestCallBackend(unittest.IsolatedAsyncioTestCase):
+
+    async def test_backend_is_called_outside_the_event_loop(self):
+        loop_thread = threading.current_thread()
+        self.assertIsNot(await call_backend(object(), threading.current_thread), loop_thread)
+        self.assertIs(await call_backend(None, threading.current_thread), loop_thread)
@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+from unittest import mock
+from botocore import credentials
+from botocore.exceptions import ClientError
+from aws_s3_access_grants_boto3_plugin.aio.cache.account_id_resolver_cache import AioAccountIdResolverCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.bucket_region_resolver_cache import AioBucketRegionResolverCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.caller_identity_resolver_cache import AioCallerIdentityResolverCache
+
+
+class TestAioResolverCaches(unittest.IsolatedAsyncioTestCase):
+
+    async def test_account_id_resolver_coalesces_concurrent_misses(self):
+        cache = AioAccountIdResolverCache()
+        s3_control_client = mock.AsyncMock()
+
+        async def get_access_grants_instance_for_prefix(**kwargs):
+            await asyncio.sleep(0.05)
+            return {
+                'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+                'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+            }
+        s3_control_client.get_access_grants_instance_for_prefix.side_effect = get_access_grants_instance_for_prefix
+        results = await asyncio.gather(*[cache.resolve(s3_control_client, "123456789012", "s3://bucketName/prefix")
+                                         for _ in range(10)])
+        self.assertEqual(results, ["987654321098"] * 10)
+        s3_control_client.get_access_grants_instance_for_prefix.assert_awaited_once()
+
+    async def test_account_id_resolver_resolve_many_bounds_concurrency(self):
+        cache = AioAccountIdResolverCache()
+        s3_control_client = mock.AsyncMock()
+        in_flight = []
+        max_in_flight = []
+
+        async def get_access_grants_instance_for_prefix(**kwargs):
+            in_flight.append(kwargs['S3Prefix'])
+            max_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(kwargs['S3Prefix'])
+            return {
+                'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+                'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+            }
+        s3_control_client.get_access_grants_instance_for_prefix.side_effect = get_access_grants_instance_for_prefix
+        account_ids, failures = await cache.resolve_many(s3_control_client, "123456789012",
+                                                         ['bucket-' + str(i) for i in range(10)], max_workers=3)
+        self.assertEqual(account_ids, {'bucket-' + str(i): '987654321098' for i in range(10)})
+        self.assertEqual(failures, {})
+        self.assertEqual(max(max_in_flight), 3)
+
+    async def test_bucket_region_resolver(self):
+        cache = AioBucketRegionResolverCache()
+        s3_client = mock.AsyncMock()
+        s3_client.head_bucket.return_value = {'BucketRegion': 'us-east-2'}
+        self.assertEqual(await cache.resolve(s3_client, 'fakebucket'), 'us-east-2')
+        self.assertEqual(await cache.resolve(s3_client, 'fakebucket'), 'us-east-2')
+        s3_client.head_bucket.assert_awaited_once()
+
+    async def test_bucket_region_resolver_with_static_regions(self):
+        cache = AioBucketRegionResolverCache(static_regions={'fakebucket': 'eu-west-1'})
+        s3_client = mock.AsyncMock()
+        self.assertEqual(await cache.resolve(s3_client, 'fakebucket'), 'eu-west-1')
+        s3_client.head_bucket.assert_not_awaited()
+
+    async def test_bucket_region_resolver_with_redirect_header(self):
+        cache = AioBucketRegionResolverCache()
+        s3_client = mock.AsyncMock()
+        s3_client.head_bucket.side_effect = ClientError(
+            operation_name='head_bucket',
+            error_response={
+                'ResponseMetadata': {
+                    'HTTPStatusCode': 301,
+                    'HTTPHeaders': {
+                        'x-amz-bucket-region': 'us-east-2',
+                    }
+                }
+            }
+        )
+        self.assertEqual(await cache.resolve(s3_client, 'fakebucket'), 'us-east-2')
+
+    async def test_caller_identity_resolver(self):
+        cache = AioCallerIdentityResolverCache()
+        sts_client = mock.AsyncMock()
+
+        async def get_caller_identity():
+            await asyncio.sleep(0.05)
+            return {'Account': '123456789012'}
+        sts_client.get_caller_identity.side_effect = get_caller_identity
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key")
+        results = await asyncio.gather(*[cache.resolve(sts_client, requester_credentials) for _ in range(10)])
+        self.assertEqual(results, ["123456789012"] * 10)
+        sts_client.get_caller_identity.assert_awaited_once()
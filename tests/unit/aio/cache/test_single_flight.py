@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+from aws_s3_access_grants_boto3_plugin.aio.cache.single_flight import AioSingleFlight
+
+
+class TestAioSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_for_same_key_are_coalesced(self):
+        single_flight = AioSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+        results = await asyncio.gather(*[single_flight.do("key", fn) for _ in range(10)])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 10)
+
+    async def test_waiters_receive_the_exception_of_the_call(self):
+        single_flight = AioSingleFlight()
+        exception = ValueError("service call failed")
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            raise exception
+        results = await asyncio.gather(*[single_flight.do("key", fn) for _ in range(10)], return_exceptions=True)
+        self.assertEqual(results, [exception] * 10)
+
+    async def test_cancelled_waiter_does_not_cancel_the_call(self):
+        single_flight = AioSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return "value"
+        leader = asyncio.ensure_future(single_flight.do("key", fn))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(single_flight.do("key", fn))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        self.assertEqual(await leader, "value")
+
+    async def test_key_is_released_after_the_call_completes(self):
+        single_flight = AioSingleFlight()
+
+        async def fn(value):
+            return value
+        self.assertEqual(await single_flight.do("key", fn, 1), 1)
+        self.assertEqual(await single_flight.do("key", fn, 2), 2)
+
+    async def test_waiter_takes_over_the_call_of_a_cancelled_leader(self):
+        single_flight = AioSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+        leader = asyncio.ensure_future(single_flight.do("key", fn))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(single_flight.do("key", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await asyncio.gather(*waiters), ["value"] * 3)
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(len(calls), 2)
@@ -0,0 +1,203 @@
+import asyncio
+import atexit
+import importlib.util
+import subprocess
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from botocore import credentials
+from aws_s3_access_grants_boto3_plugin.aio.cache.access_grants_cache import AioAccessGrantsCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.account_id_resolver_cache import AioAccountIdResolverCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.bucket_region_resolver_cache import AioBucketRegionResolverCache
+from aws_s3_access_grants_boto3_plugin.aio.cache.caller_identity_resolver_cache import AioCallerIdentityResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.multipart_upload_cache import MultipartUploadCache
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
+
+aiobotocore_installed = importlib.util.find_spec("aiobotocore") is not None
+
+
+class TestAioS3AccessGrantsPluginImport(unittest.TestCase):
+
+    def test_module_imports_without_aiobotocore(self):
+        # A None entry in sys.modules makes importing aiobotocore fail like it does when it is not installed.
+        subprocess.run([sys.executable, "-c", "import sys; sys.modules['aiobotocore'] = None; "
+                        "import aws_s3_access_grants_boto3_plugin.aio.s3_access_grants_plugin"], check=True)
+
+
+@unittest.skipUnless(aiobotocore_installed, "aiobotocore is not installed")
+class TestAioS3AccessGrantsPlugin(unittest.IsolatedAsyncioTestCase):
+
+    def _create_plugin(self, fallback_enabled=False):
+        from aws_s3_access_grants_boto3_plugin.aio.s3_access_grants_plugin import AioS3AccessGrantsPlugin
+        from aiobotocore.credentials import AioCredentials
+        s3_client = mock.Mock()
+        s3_client._get_credentials.return_value = AioCredentials(access_key="access_key", secret_key="secret_key",
+                                                                 token="token")
+        plugin = AioS3AccessGrantsPlugin(s3_client, fallback_enabled)
+        plugin.access_grants_cache = AioAccessGrantsCache()
+        plugin.access_grants_cache.account_id_resolver_cache = AioAccountIdResolverCache()
+        plugin.bucket_region_cache = AioBucketRegionResolverCache()
+        plugin.caller_identity_cache = AioCallerIdentityResolverCache()
+
+        self.sts_client = mock.AsyncMock()
+        self.sts_client.get_caller_identity.return_value = {'Account': '123456789012'}
+        self.internal_s3_client = mock.AsyncMock()
+        self.internal_s3_client.head_bucket.return_value = {'BucketRegion': 'us-east-2'}
+        self.s3_control_client = mock.AsyncMock()
+        self.s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+            'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+        }
+        self.s3_control_client.get_data_access.return_value = {
+            'Credentials': {
+                'AccessKeyId': 'access_key_id',
+                'SecretAccessKey': 'secret_access_key',
+                'SessionToken': 'session_token',
+                'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)
+            },
+            'MatchedGrantTarget': 's3://bucket/*'
+        }
+        plugin._clients = {('sts', None): self.sts_client, ('s3', None): self.internal_s3_client,
+                           ('s3control', 'us-east-2'): self.s3_control_client}
+        return plugin
+
+    def _create_request(self, key):
+        request = mock.Mock()
+        request.context = {'input_params': {'Bucket': 'bucket', 'Key': key}, 'signing': {}}
+        return request
+
+    async def test_get_access_grants_credentials(self):
+        plugin = self._create_plugin()
+        requests = [self._create_request("prefix/file" + str(i)) for i in range(10)]
+        await asyncio.gather(*[plugin._get_access_grants_credentials('GetObject', request) for request in requests])
+        for request in requests:
+            request_credentials = request.context['signing']['request_credentials']
+            frozen_credentials = await request_credentials.get_frozen_credentials()
+            self.assertEqual(frozen_credentials.access_key, 'access_key_id')
+        self.sts_client.get_caller_identity.assert_awaited_once()
+        self.internal_s3_client.head_bucket.assert_awaited_once()
+        self.s3_control_client.get_data_access.assert_awaited_once()
+
+    async def test_upload_parts_are_signed_with_pinned_credentials(self):
+        from aiobotocore.credentials import AioCredentials
+        plugin = self._create_plugin()
+        plugin.multipart_upload_cache = MultipartUploadCache()
+        requests = [self._create_request("prefix/file") for _ in range(2)]
+        for request in requests:
+            request.context['s3_redirect'] = {'params': {'Bucket': 'bucket', 'Key': 'prefix/file',
+                                                         'UploadId': 'upload-id'}}
+        await plugin._get_access_grants_credentials('UploadPart', requests[0])
+        # The second part is not resolved again, even though the grant is gone from the cache.
+        plugin.access_grants_cache = AioAccessGrantsCache()
+        self.s3_control_client.get_data_access.side_effect = Exception("Service unavailable")
+        await plugin._get_access_grants_credentials('UploadPart', requests[1])
+        request_credentials = requests[1].context['signing']['request_credentials']
+        self.assertIsInstance(request_credentials, AioCredentials)
+        self.assertIs(request_credentials, requests[0].context['signing']['request_credentials'])
+        self.s3_control_client.get_data_access.assert_awaited_once()
+
+    async def test_falls_back_for_unsupported_operations(self):
+        plugin = self._create_plugin()
+        request = self._create_request("prefix/file")
+        await plugin._get_access_grants_credentials('GetBucketPolicy', request)
+        self.assertNotIn('request_credentials', request.context['signing'])
+
+    async def test_raises_when_fallback_is_disabled(self):
+        plugin = self._create_plugin()
+        self.s3_control_client.get_data_access.side_effect = Exception("Service unavailable")
+        with self.assertRaises(Exception):
+            await plugin._get_access_grants_credentials('GetObject', self._create_request("prefix/file"))
+
+    async def test_falls_back_when_fallback_is_enabled(self):
+        plugin = self._create_plugin(fallback_enabled=True)
+        self.s3_control_client.get_data_access.side_effect = Exception("Service unavailable")
+        request = self._create_request("prefix/file")
+        await plugin._get_access_grants_credentials('GetObject', request)
+        self.assertNotIn('request_credentials', request.context['signing'])
+
+    async def test_internal_clients_are_created_once_and_closed(self):
+        from aws_s3_access_grants_boto3_plugin.aio.s3_access_grants_plugin import AioS3AccessGrantsPlugin
+        async with AioS3AccessGrantsPlugin(mock.Mock()) as plugin:
+            clients = await asyncio.gather(*[plugin._get_client('s3control', 'us-east-2') for _ in range(5)])
+            self.assertEqual(len(set(map(id, clients))), 1)
+        self.assertEqual(plugin._clients, {})
+
+    async def test_warm(self):
+        plugin = self._create_plugin()
+        failures = await plugin.warm(["s3://bucket/prefixA/", "s3://bucket/prefixB/"], ["READ", "WRITE"],
+                                     max_workers=2)
+        self.assertEqual(failures, {})
+        self.assertEqual(self.s3_control_client.get_data_access.await_count, 2)
+        await plugin._get_access_grants_credentials('PutObject', self._create_request("prefixA/file"))
+        self.assertEqual(self.s3_control_client.get_data_access.await_count, 2)
+
+    async def test_resolve_bucket_owners_uses_the_s3_control_client_of_each_region(self):
+        plugin = self._create_plugin()
+        plugin.bucket_region_cache = AioBucketRegionResolverCache(static_regions={'bucket-1': 'us-east-2',
+                                                                                  'bucket-2': 'eu-west-1'})
+        eu_s3_control_client = mock.AsyncMock()
+        eu_s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:eu-west-1:111111111111:access-grants/default'}
+        plugin._clients[('s3control', 'eu-west-1')] = eu_s3_control_client
+        account_ids, failures = await plugin.resolve_bucket_owners(['bucket-1', 'bucket-2'])
+        self.assertEqual(account_ids, {'bucket-1': '987654321098', 'bucket-2': '111111111111'})
+        self.assertEqual(failures, {})
+        self.s3_control_client.get_access_grants_instance_for_prefix.assert_awaited_once_with(
+            AccountId='123456789012', S3Prefix="s3://bucket-1")
+        eu_s3_control_client.get_access_grants_instance_for_prefix.assert_awaited_once_with(
+            AccountId='123456789012', S3Prefix="s3://bucket-2")
+
+    def test_invalid_session(self):
+        from aws_s3_access_grants_boto3_plugin.aio.s3_access_grants_plugin import AioS3AccessGrantsPlugin
+        with self.assertRaises(IllegalArgumentException):
+            AioS3AccessGrantsPlugin(mock.Mock(), customer_session=credentials.Credentials("access_key", "secret_key"))
+
+    async def test_split_delete_objects(self):
+        from botocore.session import get_session
+        from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import _delete_objects_batch_credentials
+        plugin = self._create_plugin()
+
+        async def get_data_access(Target, **kwargs):
+            return dict(self.s3_control_client.get_data_access.return_value,
+                        MatchedGrantTarget="s3://bucket/" + Target.split("/")[3] + "/*")
+        self.s3_control_client.get_data_access.side_effect = get_data_access
+        signed_with = []
+
+        async def delete_objects(Bucket, Delete):
+            signed_with.append(_delete_objects_batch_credentials.get())
+            return {'Deleted': [{'Key': delete_object['Key']} for delete_object in Delete['Objects']],
+                    'ResponseMetadata': {'HTTPStatusCode': 200}}
+        plugin.s3_client.delete_objects = mock.AsyncMock(side_effect=delete_objects)
+        model = get_session().get_service_model('s3').operation_model('DeleteObjects')
+        objects = [{'Key': 'a/1.txt'}, {'Key': 'b/1.txt'}, {'Key': 'a/2.txt'}]
+        context = {'s3_redirect': {'params': {'Bucket': 'bucket', 'Delete': {'Objects': objects}}}}
+        http, parsed = await plugin._split_delete_objects(model, {'url': 'https://bucket.s3.amazonaws.com/?delete'},
+                                                          context)
+        self.assertEqual(sorted(call.kwargs['Delete']['Objects'][0]['Key']
+                                for call in plugin.s3_client.delete_objects.await_args_list), ['a/1.txt', 'b/1.txt'])
+        self.assertEqual(sorted(deleted['Key'] for deleted in parsed['Deleted']), ['a/1.txt', 'a/2.txt', 'b/1.txt'])
+        self.assertEqual(self.s3_control_client.get_data_access.await_count, 2)
+        # Each sub-request is signed with the grant its keys were grouped by.
+        self.assertEqual(len(signed_with), 2)
+        self.assertNotIn(None, signed_with)
+
+    def test_access_grants_cache_sized_through_constructor(self):
+        from aws_s3_access_grants_boto3_plugin.aio.s3_access_grants_plugin import AioS3AccessGrantsPlugin
+        plugin = AioS3AccessGrantsPlugin(mock.Mock(), cache_size=100)
+        self.assertIsInstance(plugin.access_grants_cache, AioAccessGrantsCache)
+        self.assertEqual(plugin.access_grants_cache.cache_size, 100)
+        self.assertIsNot(plugin.access_grants_cache, AioS3AccessGrantsPlugin.access_grants_cache)
+
+    async def test_snapshot_caches_are_flushed_on_close(self):
+        from aws_s3_access_grants_boto3_plugin.aio.s3_access_grants_plugin import AioS3AccessGrantsPlugin
+        snapshot = mock.Mock()
+        plugin = AioS3AccessGrantsPlugin(mock.Mock(), snapshot=snapshot)
+        self.addCleanup(atexit.unregister, snapshot.flush)
+        snapshot.load.assert_called_once()
+        self.assertIsInstance(plugin.caller_identity_cache, AioCallerIdentityResolverCache)
+        self.assertIsInstance(plugin.bucket_region_cache, AioBucketRegionResolverCache)
+        self.assertIs(plugin.access_grants_cache.backend, snapshot)
+        self.assertIs(plugin.bucket_region_cache.backend, snapshot)
+        await plugin.close()
+        snapshot.flush.assert_called_once()
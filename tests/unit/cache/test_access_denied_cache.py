@@ -3,10 +3,12 @@ from botocore import credentials
 from botocore.exceptions import ClientError
 from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
 from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
 
 
 class TestAccessDeniedCache(unittest.TestCase):
     access_denied_cache = AccessDeniedCache()
+    requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
 
     def test_cache_key_equals(self):
         credentials_1 = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
@@ -25,4 +27,53 @@ class TestAccessDeniedCache(unittest.TestCase):
 
         self.access_denied_cache.put_value_in_cache(key_1, e)
         self.assertIsNotNone(self.access_denied_cache.get_value_from_cache(key_1))
-        self.assertIsNotNone(self.access_denied_cache.get_value_from_cache(key_2))
\ No newline at end of file
+        self.assertIsNotNone(self.access_denied_cache.get_value_from_cache(key_2))
+
+    def _error(self, code):
+        return ClientError({'Error': {'Message': 'Denied', 'Code': code},
+                            'ResponseMetadata': {'HTTPHeaders': {'x-amz-request-id': 'request-id'}}}, "GetDataAccess")
+
+    def test_cached_error_is_rebuilt_from_compact_record(self):
+        access_denied_cache = AccessDeniedCache()
+        key = CacheKey(self.requester_credentials, 'READ', "s3://bucket-name/prefix")
+        access_denied_cache.put_value_in_cache(key, self._error('AccessDenied'))
+        self.assertNotIsInstance(access_denied_cache.access_denied_cache.get(key), ClientError)
+        error = access_denied_cache.get_value_from_cache(key)
+        self.assertEqual(error.response['Error'], {'Code': 'AccessDenied', 'Message': 'Denied'})
+        self.assertEqual(error.operation_name, "GetDataAccess")
+
+    def test_ttl_per_error_code(self):
+        access_denied_cache = AccessDeniedCache(error_code_ttls={'AccessDenied': 60, 'InvalidRequest': 10})
+        key_1 = CacheKey(self.requester_credentials, 'READ', "s3://bucket-name/prefix1")
+        key_2 = CacheKey(self.requester_credentials, 'READ', "s3://bucket-name/prefix2")
+        key_3 = CacheKey(self.requester_credentials, 'READ', "s3://bucket-name/prefix3")
+        access_denied_cache.put_value_in_cache(key_1, self._error('AccessDenied'))
+        access_denied_cache.put_value_in_cache(key_2, self._error('InvalidRequest'))
+        access_denied_cache.put_value_in_cache(key_3, self._error('Throttling'))
+        self.assertAlmostEqual(access_denied_cache.access_denied_cache.get_ttl(key_1), 60, delta=1)
+        self.assertAlmostEqual(access_denied_cache.access_denied_cache.get_ttl(key_2), 10, delta=1)
+        self.assertIsNone(access_denied_cache.get_value_from_cache(key_3))
+
+    def test_cache_creation_with_invalid_error_code_ttl(self):
+        with self.assertRaises(IllegalArgumentException):
+            AccessDeniedCache(error_code_ttls={'AccessDenied': 0})
+
+    def test_prefix_matching(self):
+        access_denied_cache = AccessDeniedCache(prefix_matching=True)
+        access_denied_cache.put_value_in_cache(CacheKey(self.requester_credentials, 'READ', "s3://bucket-name/a/"),
+                                               self._error('AccessDenied'))
+        for s3_prefix in ("s3://bucket-name/a/", "s3://bucket-name/a/b/c.txt", "s3://bucket-name/a/b/"):
+            self.assertIsNotNone(access_denied_cache.get_value_from_cache(
+                CacheKey(self.requester_credentials, 'READ', s3_prefix)), s3_prefix)
+        for s3_prefix in ("s3://bucket-name/ab/c.txt", "s3://bucket-name/b/a/c.txt", "s3://bucket-name"):
+            self.assertIsNone(access_denied_cache.get_value_from_cache(
+                CacheKey(self.requester_credentials, 'READ', s3_prefix)), s3_prefix)
+        self.assertIsNone(access_denied_cache.get_value_from_cache(
+            CacheKey(self.requester_credentials, 'WRITE', "s3://bucket-name/a/b/c.txt")))
+
+    def test_prefix_matching_is_disabled_by_default(self):
+        access_denied_cache = AccessDeniedCache()
+        access_denied_cache.put_value_in_cache(CacheKey(self.requester_credentials, 'READ', "s3://bucket-name/a"),
+                                               self._error('AccessDenied'))
+        self.assertIsNone(access_denied_cache.get_value_from_cache(
+            CacheKey(self.requester_credentials, 'READ', "s3://bucket-name/a/b/c.txt")))
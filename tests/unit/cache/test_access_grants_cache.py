@@ -1,11 +1,16 @@
+import os
+import tempfile
+import threading
 import time
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from botocore import credentials
+from botocore.exceptions import ClientError
 from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
 from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
 from aws_s3_access_grants_boto3_plugin.cache.access_grants_cache import AccessGrantsCache
 from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.cache.sqlite_cache_backend import SqliteCacheBackend
 import mock
 
 
@@ -16,6 +21,7 @@ class TestAccessGrantsCache(unittest.TestCase):
     mock_account_id_resolver_cache = None
     access_denied_cache = None
     requester_account_id = "123456789012"
+    expiration = datetime.now(timezone.utc) + timedelta(hours=1)
 
     def setUp(self):
         self.access_grants_cache = AccessGrantsCache()
@@ -105,7 +111,7 @@ class TestAccessGrantsCache(unittest.TestCase):
                 'AccessKeyId': 'access_key_id',
                 'SecretAccessKey': 'secret_access_key',
                 'SessionToken': 'session_token',
-                'Expiration': datetime(2015, 1, 1)
+                'Expiration': self.expiration
             },
             'MatchedGrantTarget': 'string'
         }
@@ -123,7 +129,7 @@ class TestAccessGrantsCache(unittest.TestCase):
             'AccessKeyId': 'access_key_id',
             'SecretAccessKey': 'secret_access_key',
             'SessionToken': 'session_token',
-            'Expiration': datetime(2015, 1, 1)
+            'Expiration': self.expiration
         }
         self.assertEqual(access_grants_credentials, value)
 
@@ -133,7 +139,7 @@ class TestAccessGrantsCache(unittest.TestCase):
                 'AccessKeyId': 'access_key_id',
                 'SecretAccessKey': 'secret_access_key',
                 'SessionToken': 'session_token',
-                'Expiration': datetime(2015, 1, 1)
+                'Expiration': self.expiration
             },
             'MatchedGrantTarget': 's3://bucket-name/*'
         }
@@ -157,7 +163,7 @@ class TestAccessGrantsCache(unittest.TestCase):
                 'AccessKeyId': 'access_key_id',
                 'SecretAccessKey': 'secret_access_key',
                 'SessionToken': 'session_token',
-                'Expiration': datetime(2015, 1, 1)
+                'Expiration': self.expiration
             },
             'MatchedGrantTarget': 's3://bucket-name/prefixA'
         }
@@ -196,11 +202,323 @@ class TestAccessGrantsCache(unittest.TestCase):
         with self.assertRaises(IllegalArgumentException):
             AccessGrantsCache(duration=4099000)
 
+    def test_cache_creation_with_duration_below_the_get_data_access_minimum(self):
+        with self.assertRaises(IllegalArgumentException):
+            AccessGrantsCache(duration=899)
+        self.assertEqual(AccessGrantsCache(duration=900).duration, 900)
+
     def test_cache_ttl(self):
-        access_grants_cache = AccessGrantsCache(duration=2)
+        access_grants_cache = AccessGrantsCache(duration=1000)
+        self.assertEqual(access_grants_cache.cache_ttl, 900)
         requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
         key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixA")
-        access_grants_cache._put_value_in_cache(key, self.access_grants_credentials)
+        access_grants_cache._put_value_in_cache(key, self.access_grants_credentials, ttl=2)
         time.sleep(2)
         self.assertEqual(access_grants_cache._get_value_from_cache(key), None)
 
+    def test_cache_hit_prefers_longest_matching_prefix(self):
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        bucket_credentials = credentials.Credentials(access_key="bucket", secret_key="secret_key", token="token")
+        self.access_grants_cache._put_value_in_cache(CacheKey(requester_credentials, 'READ', "s3://bucket-name"),
+                                                     bucket_credentials)
+        self.access_grants_cache._put_value_in_cache(CacheKey(requester_credentials, 'READ', "s3://bucket-name/A"),
+                                                     self.access_grants_credentials)
+        key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/A/B/file.txt")
+        value = self.access_grants_cache.get_credentials(self.mock_s3_control_client, key,
+                                                         self.requester_account_id, self.access_denied_cache)
+        self.assertEqual(value, self.access_grants_credentials)
+
+    def test_cache_hit_for_readwrite_grant_at_character_level(self):
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        self.access_grants_cache._put_value_in_cache(CacheKey(requester_credentials, 'READWRITE', "s3://bucket-name/P*"),
+                                                     self.access_grants_credentials)
+        key = CacheKey(requester_credentials, 'WRITE', "s3://bucket-name/PrefixA/file.txt")
+        value = self.access_grants_cache.get_credentials(self.mock_s3_control_client, key,
+                                                         self.requester_account_id, self.access_denied_cache)
+        self.assertEqual(value, self.access_grants_credentials)
+        self.mock_s3_control_client.get_data_access.assert_not_called()
+
+    def test_evicted_entries_are_removed_from_index(self):
+        access_grants_cache = AccessGrantsCache(cache_size=1)
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        key_1 = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixA")
+        key_2 = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixB")
+        access_grants_cache._put_value_in_cache(key_1, self.access_grants_credentials)
+        access_grants_cache._put_value_in_cache(key_2, self.access_grants_credentials)
+        self.assertEqual(access_grants_cache._grant_prefix_index.find(key_1), ([], []))
+        self.assertEqual(access_grants_cache._grant_prefix_index.find(key_2), (["s3://bucket-name/prefixB"], []))
+
+    def test_expired_entries_are_not_served_from_index(self):
+        access_grants_cache = AccessGrantsCache()
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixA")
+        access_grants_cache._put_value_in_cache(key, self.access_grants_credentials, ttl=1)
+        time.sleep(1)
+        self.assertIsNone(access_grants_cache._search_credentials_in_cache(key))
+        self.assertEqual(access_grants_cache._grant_prefix_index.find(key), ([], []))
+
+    def _data_access_response(self, access_key_id, matched_grant_target='s3://bucket-name/*'):
+        return {
+            'Credentials': {
+                'AccessKeyId': access_key_id,
+                'SecretAccessKey': 'secret_access_key',
+                'SessionToken': 'session_token',
+                'Expiration': datetime.now(timezone.utc) + timedelta(seconds=2)
+            },
+            'MatchedGrantTarget': matched_grant_target
+        }
+
+    def test_cache_creation_with_invalid_refresh_ahead_fraction(self):
+        with self.assertRaises(IllegalArgumentException):
+            AccessGrantsCache(refresh_ahead_fraction=1)
+
+    def test_refresh_ahead_serves_cached_credentials_and_refreshes_in_background(self):
+        access_grants_cache = AccessGrantsCache(refresh_ahead_fraction=0.5, expiration_safety_margin=0)
+        self.mock_s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+            'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+        }
+        self.mock_s3_control_client.get_data_access.return_value = self._data_access_response('access_key_id_1')
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixA")
+        access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                            self.access_denied_cache)
+        self.assertIsNone(access_grants_cache._refresh_executor)
+
+        time.sleep(1)
+        self.mock_s3_control_client.get_data_access.return_value = self._data_access_response('access_key_id_2')
+        value = access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                                    self.access_denied_cache)
+        self.assertEqual(value['AccessKeyId'], 'access_key_id_1')
+        access_grants_cache._refresh_executor.shutdown(wait=True)
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_count, 2)
+        value = access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                                    self.access_denied_cache)
+        self.assertEqual(value['AccessKeyId'], 'access_key_id_2')
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_count, 2)
+
+    def test_failed_refresh_keeps_cached_credentials(self):
+        access_grants_cache = AccessGrantsCache(refresh_ahead_fraction=0.5, expiration_safety_margin=0)
+        self.mock_s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+            'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+        }
+        self.mock_s3_control_client.get_data_access.return_value = self._data_access_response('access_key_id_1')
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixA")
+        access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                            self.access_denied_cache)
+
+        time.sleep(1)
+        self.mock_s3_control_client.get_data_access.side_effect = Exception("Service unavailable")
+        access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                            self.access_denied_cache)
+        access_grants_cache._refresh_executor.shutdown(wait=True)
+        self.assertEqual(access_grants_cache._refreshing, set())
+        value = access_grants_cache._search_credentials_in_cache(key)
+        self.assertEqual(value['AccessKeyId'], 'access_key_id_1')
+
+    def test_failed_refresh_is_not_retried_on_every_hit(self):
+        access_grants_cache = AccessGrantsCache(refresh_ahead_fraction=0.5, expiration_safety_margin=0)
+        self.mock_s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+            'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+        }
+        self.mock_s3_control_client.get_data_access.return_value = self._data_access_response('access_key_id_1')
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixA")
+        access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                            self.access_denied_cache)
+
+        time.sleep(1)
+        self.mock_s3_control_client.get_data_access.side_effect = ClientError(
+            {'Error': {'Message': 'Rate exceeded', 'Code': 'ThrottlingException'}}, 'GetDataAccess')
+        access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                            self.access_denied_cache)
+        access_grants_cache._refresh_executor.shutdown(wait=True)
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_count, 2)
+        value = access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                                    self.access_denied_cache)
+        self.assertEqual(value['AccessKeyId'], 'access_key_id_1')
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_count, 2)
+
+    def _get_credentials_with_expiration(self, access_grants_cache, expiration):
+        self.mock_s3_control_client.get_data_access.return_value = {
+            'Credentials': {
+                'AccessKeyId': 'access_key_id',
+                'SecretAccessKey': 'secret_access_key',
+                'SessionToken': 'session_token',
+                'Expiration': expiration
+            },
+            'MatchedGrantTarget': 's3://bucket-name/*'
+        }
+        self.mock_s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+            'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+        }
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixA")
+        access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                            self.access_denied_cache)
+        return CacheKey(requester_credentials, 'READ', "s3://bucket-name")
+
+    def test_duration_is_passed_to_get_data_access(self):
+        access_grants_cache = AccessGrantsCache(duration=2 * 60 * 60)
+        self._get_credentials_with_expiration(access_grants_cache, self.expiration)
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_args.kwargs['DurationSeconds'], 7200)
+
+    def test_cache_ttl_is_derived_from_credentials_expiration(self):
+        access_grants_cache = AccessGrantsCache(expiration_safety_margin=60)
+        expiration = datetime.now(timezone.utc) + timedelta(hours=3)
+        matched_key = self._get_credentials_with_expiration(access_grants_cache, expiration)
+        ttl = access_grants_cache.access_grants_cache.get_ttl(matched_key)
+        self.assertAlmostEqual(ttl, 3 * 60 * 60 - 60, delta=5)
+
+    def test_credentials_expiring_within_safety_margin_are_not_cached(self):
+        access_grants_cache = AccessGrantsCache(expiration_safety_margin=5 * 60)
+        expiration = datetime.now(timezone.utc) + timedelta(minutes=4)
+        matched_key = self._get_credentials_with_expiration(access_grants_cache, expiration)
+        self.assertIsNone(access_grants_cache._get_value_from_cache(matched_key))
+
+    def test_cache_creation_with_invalid_expiration_safety_margin(self):
+        with self.assertRaises(IllegalArgumentException):
+            AccessGrantsCache(expiration_safety_margin=-1)
+
+    def test_concurrent_misses_for_same_key_make_one_service_call(self):
+        release = threading.Event()
+
+        def get_data_access(**kwargs):
+            release.wait()
+            return {
+                'Credentials': {
+                    'AccessKeyId': 'access_key_id',
+                    'SecretAccessKey': 'secret_access_key',
+                    'SessionToken': 'session_token',
+                    'Expiration': self.expiration
+                },
+                'MatchedGrantTarget': 's3://bucket-name/prefixA'
+            }
+        self.mock_s3_control_client.get_data_access.side_effect = get_data_access
+        self.mock_s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+            'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+        }
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixA")
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                                     self.access_denied_cache))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_count, 1)
+        self.assertEqual(len(results), 5)
+
+    def test_caches_sharing_a_backend_make_one_service_call(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SqliteCacheBackend(os.path.join(directory, "cache.db"))
+            self._get_credentials_with_expiration(AccessGrantsCache(backend=backend), self.expiration)
+            other_cache = AccessGrantsCache(backend=SqliteCacheBackend(os.path.join(directory, "cache.db")))
+            requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key",
+                                                            token="token")
+            key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/prefixB")
+            value = other_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                                self.access_denied_cache)
+            self.assertEqual(value['AccessKeyId'], 'access_key_id')
+            self.assertEqual(value['Expiration'], self.expiration)
+            self.mock_s3_control_client.get_data_access.assert_called_once()
+            # The entry found in the backend is now served from memory.
+            self.assertIsNotNone(other_cache._search_credentials_in_cache(key))
+            self.assertEqual(value.signing_credentials.access_key, 'access_key_id')
+
+    def test_cache_hits_share_the_signing_credentials(self):
+        key = self._get_credentials_with_expiration(self.access_grants_cache, self.expiration)
+        value_1 = self.access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                                           self.access_denied_cache)
+        value_2 = self.access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                                           self.access_denied_cache)
+        signing_credentials = value_1.signing_credentials
+        self.assertIsInstance(signing_credentials, credentials.Credentials)
+        self.assertEqual((signing_credentials.access_key, signing_credentials.secret_key, signing_credentials.token),
+                         ('access_key_id', 'secret_access_key', 'session_token'))
+        self.assertIs(value_2.signing_credentials, signing_credentials)
+
+    def test_signing_credentials_are_added_to_plain_credentials(self):
+        value = self.access_grants_cache._with_signing_credentials({'AccessKeyId': 'access_key_id',
+                                                                    'SecretAccessKey': 'secret_access_key',
+                                                                    'SessionToken': 'session_token'})
+        self.assertEqual(value['AccessKeyId'], 'access_key_id')
+        self.assertEqual(value.signing_credentials.access_key, 'access_key_id')
+        self.assertIs(self.access_grants_cache._with_signing_credentials(value), value)
+
+    def _get_widened_credentials(self, access_grants_cache, s3_prefix):
+        self.mock_s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:987654321098:access-grants/default',
+            'AccessGrantsInstanceId': 'abcdefghijklmnopqrstuvwxyz'
+        }
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        key = CacheKey(requester_credentials, 'READ', s3_prefix)
+        return access_grants_cache.get_credentials(self.mock_s3_control_client, key, self.requester_account_id,
+                                                   self.access_denied_cache)
+
+    def test_widened_target_grant_serves_the_subtree(self):
+        access_grants_cache = AccessGrantsCache(widen_target_levels=1)
+        response = self._data_access_response('access_key_id', 's3://bucket-name/prefixA/*')
+        response['Credentials']['Expiration'] = self.expiration
+        self.mock_s3_control_client.get_data_access.return_value = response
+        self._get_widened_credentials(access_grants_cache, "s3://bucket-name/prefixA/file1.txt")
+        value = self._get_widened_credentials(access_grants_cache, "s3://bucket-name/prefixA/file2.txt")
+        self.assertEqual(value['AccessKeyId'], 'access_key_id')
+        self.mock_s3_control_client.get_data_access.assert_called_once()
+        self.assertEqual(self.mock_s3_control_client.get_data_access.call_args.kwargs['Target'],
+                         "s3://bucket-name/prefixA/*")
+
+    def test_denied_widened_target_falls_back_to_the_key_and_is_not_requested_again(self):
+        access_grants_cache = AccessGrantsCache(widen_target_levels=1)
+        error = ClientError({'Error': {'Message': 'Access denied', 'Code': 'AccessDenied'}}, 'GetDataAccess')
+
+        def get_data_access(**kwargs):
+            if kwargs['Target'].endswith('*'):
+                raise error
+            return self._data_access_response('access_key_id', kwargs['Target'])
+        self.mock_s3_control_client.get_data_access.side_effect = get_data_access
+
+        self._get_widened_credentials(access_grants_cache, "s3://bucket-name/prefixA/file1.txt")
+        self._get_widened_credentials(access_grants_cache, "s3://bucket-name/prefixA/file2.txt")
+        targets = [call.kwargs['Target'] for call in self.mock_s3_control_client.get_data_access.call_args_list]
+        self.assertEqual(targets, ["s3://bucket-name/prefixA/*", "s3://bucket-name/prefixA/file1.txt",
+                                   "s3://bucket-name/prefixA/file2.txt"])
+
+    def test_widened_target_stops_at_the_bucket(self):
+        access_grants_cache = AccessGrantsCache(widen_target_levels=3)
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        self.assertEqual(access_grants_cache._get_widened_key(
+            CacheKey(requester_credentials, 'READ', "s3://bucket-name/a/b/c/d.txt")).s3_prefix, "s3://bucket-name/a/*")
+        self.assertEqual(access_grants_cache._get_widened_key(
+            CacheKey(requester_credentials, 'READ', "s3://bucket-name/a/b.txt")).s3_prefix, "s3://bucket-name/*")
+        self.assertIsNone(access_grants_cache._get_widened_key(
+            CacheKey(requester_credentials, 'READ', "s3://bucket-name")))
+        self.assertIsNone(self.access_grants_cache._get_widened_key(
+            CacheKey(requester_credentials, 'READ', "s3://bucket-name/a/b.txt")))
+
+    def test_key_that_is_its_own_widened_target_is_requested_once(self):
+        access_grants_cache = AccessGrantsCache(widen_target_levels=1)
+        self.mock_s3_control_client.get_data_access.return_value = self._data_access_response(
+            'access_key_id', 's3://bucket-name/a/*')
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            self._get_widened_credentials(access_grants_cache, "s3://bucket-name/a/*")), daemon=True)
+        thread.start()
+        thread.join(timeout=3)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results[0]['AccessKeyId'], 'access_key_id')
+        self.assertEqual([call.kwargs['Target'] for call in self.mock_s3_control_client.get_data_access.call_args_list],
+                         ["s3://bucket-name/a/*"])
+
+    def test_cache_creation_with_invalid_widen_target_levels(self):
+        with self.assertRaises(IllegalArgumentException):
+            AccessGrantsCache(widen_target_levels=-1)
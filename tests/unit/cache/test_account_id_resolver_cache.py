@@ -1,7 +1,11 @@
+import atexit
+import os
+import tempfile
 import unittest
 import mock
 from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
 from aws_s3_access_grants_boto3_plugin.cache.account_id_resolver_cache import AccountIdResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.account_id_snapshot import AccountIdSnapshot
 
 
 class TestAccountIdResolverCache(unittest.TestCase):
@@ -50,3 +54,70 @@ class TestAccountIdResolverCache(unittest.TestCase):
     def test_cache_creation_with_invalid_ttl(self):
         with self.assertRaises(IllegalArgumentException):
             AccountIdResolverCache(cache_ttl=2592001)
+
+    def _create_s3_control_client(self, account_id):
+        s3_control_client = mock.Mock()
+        s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-2:' + account_id + ':access-grants/default',
+            'AccessGrantsInstanceId': 'default'
+        }
+        return s3_control_client
+
+    def _create_snapshot_cache(self, snapshot):
+        cache = AccountIdResolverCache(snapshot=snapshot)
+        self.addCleanup(atexit.unregister, cache.save_snapshot)
+        return cache
+
+    def test_snapshot_is_served_and_revalidated_in_background(self):
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = AccountIdSnapshot(os.path.join(directory, "account-ids.json"))
+            snapshot.save({'bucketName': '111111111111'})
+            cache = self._create_snapshot_cache(snapshot)
+            s3_control_client = self._create_s3_control_client('987654321098')
+            self.assertEqual(cache.resolve(s3_control_client, "123456789012", "s3://bucketName/prefixA"),
+                             "111111111111")
+            cache._revalidation_executor.shutdown(wait=True)
+            self.assertEqual(cache.resolve(s3_control_client, "123456789012", "s3://bucketName/prefixA"),
+                             "987654321098")
+            s3_control_client.get_access_grants_instance_for_prefix.assert_called_once()
+
+    def test_failed_revalidation_keeps_snapshot_account_id(self):
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = AccountIdSnapshot(os.path.join(directory, "account-ids.json"))
+            snapshot.save({'bucketName': '111111111111'})
+            cache = self._create_snapshot_cache(snapshot)
+            s3_control_client = mock.Mock()
+            s3_control_client.get_access_grants_instance_for_prefix.side_effect = Exception("Throttled")
+            cache.resolve(s3_control_client, "123456789012", "s3://bucketName/prefixA")
+            cache._revalidation_executor.shutdown(wait=True)
+            self.assertEqual(cache.resolve(s3_control_client, "123456789012", "s3://bucketName/prefixA"),
+                             "111111111111")
+
+    def test_resolve_many_resolves_each_bucket_once(self):
+        cache = AccountIdResolverCache()
+        s3_control_client = self._create_s3_control_client('987654321098')
+        account_ids, failures = cache.resolve_many(s3_control_client, "123456789012",
+                                                   ['bucket-' + str(i) for i in range(20)] + ['bucket-0'],
+                                                   max_workers=4)
+        self.assertEqual(account_ids, {'bucket-' + str(i): '987654321098' for i in range(20)})
+        self.assertEqual(failures, {})
+        self.assertEqual(s3_control_client.get_access_grants_instance_for_prefix.call_count, 20)
+
+    @mock.patch('aws_s3_access_grants_boto3_plugin.cache.account_id_resolver_cache.atexit')
+    def test_snapshot_is_saved_when_the_process_exits(self, mock_atexit):
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = AccountIdSnapshot(os.path.join(directory, "account-ids.json"))
+            cache = AccountIdResolverCache(snapshot=snapshot)
+            mock_atexit.register.assert_called_once_with(cache.save_snapshot)
+            cache.resolve(self._create_s3_control_client('987654321098'), "123456789012", "s3://bucketName/prefixA")
+            cache.save_snapshot()
+            self.assertEqual(snapshot.load(), {'bucketName': '987654321098'})
+
+    def test_resolve_many_reports_failures(self):
+        cache = AccountIdResolverCache()
+        s3_control_client = mock.Mock()
+        error = Exception("AccessDenied")
+        s3_control_client.get_access_grants_instance_for_prefix.side_effect = error
+        account_ids, failures = cache.resolve_many(s3_control_client, "123456789012", ['bucket'])
+        self.assertEqual(account_ids, {})
+        self.assertEqual(failures, {'bucket': error})
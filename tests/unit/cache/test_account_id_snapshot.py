@@ -0,0 +1,49 @@
+import json
+import os
+import stat
+import tempfile
+import time
+import unittest
+from aws_s3_access_grants_boto3_plugin.cache.account_id_snapshot import AccountIdSnapshot, MAX_SNAPSHOT_AGE
+
+
+class TestAccountIdSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "snapshots", "account-ids.json")
+        self.snapshot = AccountIdSnapshot(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_load_returns_saved_account_ids(self):
+        self.snapshot.save({'bucket-a': '111111111111', 'bucket-b': '222222222222'})
+        self.assertEqual(AccountIdSnapshot(self.path).load(), {'bucket-a': '111111111111', 'bucket-b': '222222222222'})
+
+    def test_load_without_snapshot(self):
+        self.assertEqual(self.snapshot.load(), {})
+
+    def test_snapshot_is_only_accessible_by_its_owner(self):
+        self.snapshot.save({'bucket-a': '111111111111'})
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(self.path)).st_mode), 0o700)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["account-ids.json"])
+
+    def _write(self, snapshot):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as f:
+            f.write(snapshot)
+
+    def test_snapshot_of_another_version_is_ignored(self):
+        self._write(json.dumps({"version": 0, "saved_at": time.time(), "account_ids": {'bucket-a': '111111111111'}}))
+        self.assertEqual(self.snapshot.load(), {})
+
+    def test_expired_snapshot_is_ignored(self):
+        self._write(json.dumps({"version": 1, "saved_at": time.time() - MAX_SNAPSHOT_AGE - 1,
+                                "account_ids": {'bucket-a': '111111111111'}}))
+        self.assertEqual(self.snapshot.load(), {})
+
+    def test_corrupt_snapshot_is_ignored(self):
+        self._write("{\"version\": 1, \"account_ids\"")
+        self.assertEqual(self.snapshot.load(), {})
@@ -1,5 +1,7 @@
 import unittest
 import mock
+from botocore import session
+from botocore.awsrequest import AWSResponse
 from botocore.exceptions import ClientError
 from aws_s3_access_grants_boto3_plugin.cache.bucket_region_resolver_cache import BucketRegionResolverCache
 
@@ -82,3 +84,31 @@ class TestBucketRegionResolverCache(unittest.TestCase):
             cache.resolve(self.s3_client, 'fakebucket')
             self.assertEqual(e.response['Error']['Message'], 'Bucket does not exist')
         self.__reset_mock()
+
+    def test_static_regions_are_resolved_without_head_bucket(self):
+        s3_client = mock.Mock()
+        cache = BucketRegionResolverCache(static_regions={'fakebucket': 'eu-west-1'})
+        self.assertEqual(cache.resolve(s3_client, 'fakebucket'), 'eu-west-1')
+        s3_client.head_bucket.assert_not_called()
+
+    def test_preloaded_regions_are_resolved_without_head_bucket(self):
+        s3_client = mock.Mock()
+        cache = BucketRegionResolverCache()
+        cache.preload({'fakebucket': 'eu-west-1', 'otherbucket': 'ap-south-1'})
+        self.assertEqual(cache.resolve(s3_client, 'fakebucket'), 'eu-west-1')
+        self.assertEqual(cache.resolve(s3_client, 'otherbucket'), 'ap-south-1')
+        s3_client.head_bucket.assert_not_called()
+
+    def test_observed_response_regions_are_resolved_without_head_bucket(self):
+        observed_client = session.get_session().create_client('s3', region_name='us-east-1',
+                                                              aws_access_key_id='access_key',
+                                                              aws_secret_access_key='secret_key')
+        observed_client.meta.events.register('before-send.s3', lambda request, **kwargs: AWSResponse(
+            request.url, 200, {'x-amz-bucket-region': 'eu-west-1'}, mock.Mock(stream=lambda: iter([b""]))))
+        cache = BucketRegionResolverCache()
+        cache.observe(observed_client)
+        observed_client.head_object(Bucket='fakebucket', Key='key')
+
+        s3_client = mock.Mock()
+        self.assertEqual(cache.resolve(s3_client, 'fakebucket'), 'eu-west-1')
+        s3_client.head_bucket.assert_not_called()
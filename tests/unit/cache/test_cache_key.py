@@ -1,8 +1,16 @@
+import gc
 import unittest
+import weakref
+import mock
 from botocore import credentials
 from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
 
 
+# A str that can be weakly referenced.
+class _SecretKey(str):
+    pass
+
+
 class TestCacheKey(unittest.TestCase):
     # verify if both the keys are equal if they are equal in value not object id
     def test_cache_key_equals(self):
@@ -33,9 +41,40 @@ class TestCacheKey(unittest.TestCase):
         cache_key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/*")
         cache_key_1 = CacheKey(cache_key=cache_key, permission='WRITE')
         cache_key_2 = CacheKey(cache_key=cache_key, s3_prefix="s3://*")
-        self.assertEqual(cache_key_1.credentials, cache_key.credentials)
+        self.assertEqual(cache_key_1.identity, cache_key.identity)
         self.assertEqual(cache_key_1.s3_prefix, cache_key.s3_prefix)
         self.assertEqual(cache_key_1.permission, 'WRITE')
-        self.assertEqual(cache_key_2.credentials, cache_key.credentials)
+        self.assertEqual(cache_key_2.identity, cache_key.identity)
         self.assertEqual(cache_key_2.permission, cache_key.permission)
-        self.assertEqual(cache_key_2.s3_prefix, "s3://*")
\ No newline at end of file
+        self.assertEqual(cache_key_2.s3_prefix, "s3://*")
+
+    def test_cache_key_does_not_keep_credentials(self):
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        cache_key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/*")
+        self.assertNotIn("secret_key", cache_key.identity)
+        self.assertFalse(hasattr(cache_key, '__dict__'))
+        self.assertEqual(len(cache_key), 3)
+        other_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key_2")
+        self.assertNotEqual(cache_key, CacheKey(other_credentials, 'READ', "s3://bucket-name/*"))
+        self.assertIs(cache_key.identity, CacheKey(cache_key=cache_key, permission='WRITE').identity)
+
+    def test_cache_key_does_not_keep_secret_keys_alive(self):
+        secret_key = _SecretKey("secret_key_of_a_single_cache_key")
+        secret_key_ref = weakref.ref(secret_key)
+        CacheKey(credentials.Credentials(access_key="access_key", secret_key=secret_key), 'READ', "s3://bucket/")
+        del secret_key
+        gc.collect()
+        self.assertIsNone(secret_key_ref())
+
+    def test_cache_key_is_immutable(self):
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+        cache_key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/*")
+        with self.assertRaises(AttributeError):
+            cache_key.s3_prefix = "s3://other-bucket/*"
+
+    def test_hashing_does_not_read_credentials(self):
+        requester_credentials = mock.Mock(access_key="access_key", secret_key="secret_key")
+        cache_key = CacheKey(requester_credentials, 'READ', "s3://bucket-name/*")
+        requester_credentials.reset_mock()
+        type(requester_credentials).access_key = mock.PropertyMock(side_effect=AssertionError)
+        {cache_key: None}.get(CacheKey(cache_key=cache_key, s3_prefix="s3://bucket-name/*"))
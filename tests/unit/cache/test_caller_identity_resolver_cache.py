@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+import mock
+from botocore import credentials
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
+from aws_s3_access_grants_boto3_plugin.cache.caller_identity_resolver_cache import CallerIdentityResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.sqlite_cache_backend import SqliteCacheBackend
+
+
+class TestCallerIdentityResolverCache(unittest.TestCase):
+    requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+
+    def setUp(self):
+        self.mock_sts_client = mock.Mock()
+        self.mock_sts_client.get_caller_identity.return_value = {
+            'UserId': 'AIDASAMPLEUSERID',
+            'Account': '123456789012',
+            'Arn': 'arn:aws:iam::123456789012:user/test'
+        }
+
+    # test to check if resolve method returns expected accountId
+    def test_resolve_method(self):
+        cache = CallerIdentityResolverCache()
+        self.assertEqual(cache.resolve(self.mock_sts_client, self.requester_credentials), "123456789012")
+
+    # test to check if service call is made only once for the same access key
+    def test_count_resolve_method(self):
+        cache = CallerIdentityResolverCache()
+        cache.resolve(self.mock_sts_client, self.requester_credentials)
+        cache.resolve(self.mock_sts_client, credentials.Credentials(access_key="access_key",
+                                                                   secret_key="secret_key", token="token_2"))
+        self.mock_sts_client.get_caller_identity.assert_called_once()
+
+    # test to check if service call is made again for a different access key
+    def test_resolve_for_different_access_keys(self):
+        cache = CallerIdentityResolverCache()
+        cache.resolve(self.mock_sts_client, self.requester_credentials)
+        cache.resolve(self.mock_sts_client, credentials.Credentials(access_key="access_key_2",
+                                                                   secret_key="secret_key_2", token="token_2"))
+        self.assertEqual(self.mock_sts_client.get_caller_identity.call_count, 2)
+
+    def test_cache_creation_with_invalid_cache_size(self):
+        with self.assertRaises(IllegalArgumentException):
+            CallerIdentityResolverCache(cache_size=1000001)
+
+    def test_cache_creation_with_invalid_ttl(self):
+        with self.assertRaises(IllegalArgumentException):
+            CallerIdentityResolverCache(cache_ttl=2592001)
+
+    # test to check if a resolved account id is shared through the backend
+    def test_resolve_from_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SqliteCacheBackend(os.path.join(directory, "cache.db"))
+            CallerIdentityResolverCache(backend=backend).resolve(self.mock_sts_client, self.requester_credentials)
+            other_cache = CallerIdentityResolverCache(backend=backend)
+            self.assertEqual(other_cache.resolve(self.mock_sts_client, self.requester_credentials), "123456789012")
+            self.mock_sts_client.get_caller_identity.assert_called_once()
+            # The access key is stored as a digest.
+            self.assertIsNone(backend.get("caller_identity", self.requester_credentials.access_key))
@@ -0,0 +1,83 @@
+import importlib.util
+import os
+import stat
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from aws_s3_access_grants_boto3_plugin.cache.encrypted_snapshot_cache_backend import EncryptedSnapshotCacheBackend
+
+cryptography_installed = importlib.util.find_spec("cryptography") is not None
+
+
+@unittest.skipUnless(cryptography_installed, "cryptography is not installed")
+class TestEncryptedSnapshotCacheBackend(unittest.TestCase):
+
+    def setUp(self):
+        from cryptography.fernet import Fernet
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "snapshots", "cache.snapshot")
+        self.key = Fernet.generate_key()
+        self.backend = EncryptedSnapshotCacheBackend(self.path, self.key)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_flushed_entries_are_loaded_with_their_remaining_ttl(self):
+        expiration = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        self.backend.set("access_grants", "identity|READ|s3://bucket", {'AccessKeyId': 'a', 'Expiration': expiration},
+                         60)
+        self.backend.set("bucket_region", "bucket", "us-west-2", 60)
+        self.backend.flush()
+
+        backend = EncryptedSnapshotCacheBackend(self.path, self.key)
+        self.assertIsNone(backend.get("bucket_region", "bucket"))
+        backend.load()
+        value, ttl = backend.get("access_grants", "identity|READ|s3://bucket")
+        self.assertEqual(value, {'AccessKeyId': 'a', 'Expiration': expiration})
+        self.assertAlmostEqual(ttl, 60, delta=5)
+        self.assertEqual(backend.get("bucket_region", "bucket")[0], "us-west-2")
+
+    def test_expired_entries_are_neither_served_nor_flushed(self):
+        self.backend.set("bucket_region", "bucket", "us-west-2", 0.1)
+        self.backend.set("bucket_region", "other-bucket", "us-east-1", 60)
+        time.sleep(0.2)
+        self.assertIsNone(self.backend.get("bucket_region", "bucket"))
+        self.backend.flush()
+        backend = EncryptedSnapshotCacheBackend(self.path, self.key)
+        backend.load()
+        self.assertEqual(list(backend._entries), [("bucket_region", "other-bucket")])
+
+    def test_snapshot_is_encrypted_and_only_accessible_by_its_owner(self):
+        self.backend.set("bucket_region", "bucket", "us-west-2", 60)
+        self.backend.flush()
+        with open(self.path, "rb") as f:
+            self.assertNotIn(b"us-west-2", f.read())
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(self.path)).st_mode), 0o700)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["cache.snapshot"])
+
+    def test_snapshot_encrypted_with_another_key_is_ignored(self):
+        self.backend.set("bucket_region", "bucket", "us-west-2", 60)
+        self.backend.flush()
+        from cryptography.fernet import Fernet
+        backend = EncryptedSnapshotCacheBackend(self.path, Fernet.generate_key())
+        backend.load()
+        self.assertIsNone(backend.get("bucket_region", "bucket"))
+
+    def test_load_without_snapshot(self):
+        self.backend.load()
+        self.assertIsNone(self.backend.get("bucket_region", "bucket"))
+
+    def test_load_keeps_entries_cached_since_the_process_started(self):
+        self.backend.set("bucket_region", "bucket", "us-west-2", 60)
+        self.backend.flush()
+        backend = EncryptedSnapshotCacheBackend(self.path, self.key)
+        backend.set("bucket_region", "bucket", "eu-west-1", 120)
+        backend.load()
+        self.assertEqual(backend.get("bucket_region", "bucket")[0], "eu-west-1")
+
+    def test_delete(self):
+        self.backend.set("bucket_region", "bucket", "us-west-2", 60)
+        self.backend.delete("bucket_region", "bucket")
+        self.assertIsNone(self.backend.get("bucket_region", "bucket"))
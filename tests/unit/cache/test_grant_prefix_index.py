@@ -0,0 +1,119 @@
+import random
+import unittest
+from botocore import credentials
+from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.cache.grant_prefix_index import GrantPrefixIndex
+
+
+class TestGrantPrefixIndex(unittest.TestCase):
+    requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key", token="token")
+
+    def _key(self, s3_prefix, permission='READ', requester_credentials=None):
+        return CacheKey(requester_credentials or self.requester_credentials, permission, s3_prefix)
+
+    # Candidates as visited by walking the key one '/' segment, or one character, at a time.
+    def _linear_scan(self, cached_prefixes, s3_prefix):
+        prefix_level = []
+        prefix = s3_prefix
+        while prefix != "s3:":
+            if prefix in cached_prefixes:
+                prefix_level.append(prefix)
+            prefix = prefix.rsplit('/', 1)[0]
+        character_level = []
+        prefix = s3_prefix
+        while prefix != "s3://":
+            if prefix + "*" in cached_prefixes:
+                character_level.append(prefix + "*")
+            prefix = prefix[:-1]
+        return prefix_level, character_level
+
+    def test_find_prefix_level_grants_longest_first(self):
+        index = GrantPrefixIndex()
+        index.add(self._key("s3://bucket"))
+        index.add(self._key("s3://bucket/foo"))
+        index.add(self._key("s3://bucket/fo"))
+        self.assertEqual(index.find(self._key("s3://bucket/foo/bar.txt")), (["s3://bucket/foo", "s3://bucket"], []))
+
+    def test_find_character_level_grants_longest_first(self):
+        index = GrantPrefixIndex()
+        index.add(self._key("s3://bucket/f*"))
+        index.add(self._key("s3://bucket/foo/b*"))
+        self.assertEqual(index.find(self._key("s3://bucket/foo/bar.txt")),
+                         ([], ["s3://bucket/foo/b*", "s3://bucket/f*"]))
+
+    def test_find_grant_for_all_buckets(self):
+        index = GrantPrefixIndex()
+        index.add(self._key("s3:/"))
+        self.assertEqual(index.find(self._key("s3://bucket/foo")), (["s3:/"], []))
+
+    def test_find_is_scoped_to_identity_and_permission(self):
+        index = GrantPrefixIndex()
+        index.add(self._key("s3://bucket"))
+        other_credentials = credentials.Credentials(access_key="access_key_2", secret_key="secret_key_2")
+        self.assertEqual(index.find(self._key("s3://bucket/foo", permission='WRITE')), ([], []))
+        self.assertEqual(index.find(self._key("s3://bucket/foo", requester_credentials=other_credentials)), ([], []))
+
+    def test_remove(self):
+        index = GrantPrefixIndex()
+        index.add(self._key("s3://bucket"))
+        index.add(self._key("s3://bucket/foo"))
+        index.remove(self._key("s3://bucket/foo"))
+        self.assertEqual(index.find(self._key("s3://bucket/foo/bar")), (["s3://bucket"], []))
+        index.remove(self._key("s3://bucket"))
+        self.assertEqual(index.find(self._key("s3://bucket/foo/bar")), ([], []))
+        self.assertEqual(index._roots, {})
+
+    def test_remove_prefix_not_in_index(self):
+        index = GrantPrefixIndex()
+        index.add(self._key("s3://bucket/foo"))
+        index.remove(self._key("s3://bucket/bar"))
+        index.remove(self._key("s3://bucket"))
+        self.assertEqual(index.find(self._key("s3://bucket/foo")), (["s3://bucket/foo"], []))
+
+    def test_find_matches_linear_scan(self):
+        rng = random.Random(7)
+        alphabet = "ab/*"
+        cached_prefixes = set()
+        index = GrantPrefixIndex()
+        for _ in range(300):
+            s3_prefix = "s3://" + "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+            if s3_prefix.endswith("/"):
+                s3_prefix = s3_prefix.rstrip("/") or "s3:/"
+            cached_prefixes.add(s3_prefix)
+            index.add(self._key(s3_prefix))
+        for _ in range(1000):
+            s3_prefix = "s3://" + "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+            self.assertEqual(index.find(self._key(s3_prefix)), self._linear_scan(cached_prefixes, s3_prefix))
+
+    def _count_nodes(self, node):
+        return 1 + sum(self._count_nodes(child) for child in (node.children or {}).values())
+
+    def test_find_matches_linear_scan_after_removals(self):
+        rng = random.Random(11)
+        alphabet = "ab/*"
+        cached_prefixes = set()
+        index = GrantPrefixIndex()
+        for _ in range(3):
+            for _ in range(200):
+                s3_prefix = "s3://" + "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 10)))
+                cached_prefixes.add(s3_prefix)
+                index.add(self._key(s3_prefix))
+            for s3_prefix in rng.sample(sorted(cached_prefixes), len(cached_prefixes) // 2):
+                cached_prefixes.discard(s3_prefix)
+                index.remove(self._key(s3_prefix))
+            for _ in range(500):
+                s3_prefix = "s3://" + "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+                self.assertEqual(index.find(self._key(s3_prefix)), self._linear_scan(cached_prefixes, s3_prefix))
+            (root,) = index._roots.values()
+            # Every node is either a cached prefix or a branch, so there are fewer than two nodes per prefix.
+            self.assertLess(self._count_nodes(root), 2 * len(cached_prefixes) + 1)
+
+    def test_prefixes_sharing_a_parent_share_its_node(self):
+        index = GrantPrefixIndex()
+        for i in range(100):
+            index.add(self._key("s3://bucket/data/" + format(i, "032x")))
+        (root,) = index._roots.values()
+        self.assertLess(self._count_nodes(root), 200)
+        for i in range(100):
+            index.remove(self._key("s3://bucket/data/" + format(i, "032x")))
+        self.assertEqual(index._roots, {})
@@ -0,0 +1,29 @@
+import unittest
+from aws_s3_access_grants_boto3_plugin.cache.multipart_upload_cache import MultipartUploadCache
+
+
+class TestMultipartUploadCache(unittest.TestCase):
+    credentials = {'AccessKeyId': 'access_key_id', 'SecretAccessKey': 'secret_access_key',
+                   'SessionToken': 'session_token'}
+
+    def test_pinned_credentials(self):
+        cache = MultipartUploadCache()
+        cache.pin('upload-id', 'access_key', self.credentials, 60)
+        self.assertIs(cache.get_credentials('upload-id', 'access_key'), self.credentials)
+        self.assertIsNone(cache.get_credentials('other-upload-id', 'access_key'))
+
+    def test_pinned_credentials_are_not_used_by_other_requesters(self):
+        cache = MultipartUploadCache()
+        cache.pin('upload-id', 'access_key', self.credentials, 60)
+        self.assertIsNone(cache.get_credentials('upload-id', 'other_access_key'))
+
+    def test_expired_credentials_are_not_pinned(self):
+        cache = MultipartUploadCache()
+        cache.pin('upload-id', 'access_key', self.credentials, 0)
+        self.assertIsNone(cache.get_credentials('upload-id', 'access_key'))
+
+    def test_unpin(self):
+        cache = MultipartUploadCache()
+        cache.pin('upload-id', 'access_key', self.credentials, 60)
+        cache.unpin('upload-id')
+        self.assertIsNone(cache.get_credentials('upload-id', 'access_key'))
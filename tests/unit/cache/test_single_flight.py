@@ -0,0 +1,70 @@
+import threading
+import unittest
+from aws_s3_access_grants_boto3_plugin.cache.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    thread_count = 10
+
+    def _run_concurrently(self, single_flight, key, fn):
+        results = []
+        errors = []
+        all_started = threading.Barrier(self.thread_count)
+
+        def worker():
+            all_started.wait()
+            try:
+                results.append(single_flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(self.thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def _blocking_call(self, release, return_value=None, exception=None):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait()
+            if exception is not None:
+                raise exception
+            return return_value
+        return fn, calls
+
+    def test_concurrent_calls_for_same_key_are_coalesced(self):
+        release = threading.Event()
+        fn, calls = self._blocking_call(release, return_value="value")
+        threading.Timer(0.2, release.set).start()
+        results, errors = self._run_concurrently(SingleFlight(), "key", fn)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * self.thread_count)
+        self.assertEqual(errors, [])
+
+    def test_waiters_receive_the_exception_of_the_call(self):
+        release = threading.Event()
+        exception = ValueError("service call failed")
+        fn, calls = self._blocking_call(release, exception=exception)
+        threading.Timer(0.2, release.set).start()
+        results, errors = self._run_concurrently(SingleFlight(), "key", fn)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [])
+        self.assertEqual(errors, [exception] * self.thread_count)
+
+    def test_calls_for_different_keys_are_not_coalesced(self):
+        single_flight = SingleFlight()
+        self.assertEqual(single_flight.do("key_1", lambda: 1), 1)
+        self.assertEqual(single_flight.do("key_2", lambda: 2), 2)
+
+    def test_key_is_released_after_the_call_completes(self):
+        single_flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            single_flight.do("key", self._raise_value_error)
+        self.assertEqual(single_flight.do("key", lambda: "value"), "value")
+
+    def _raise_value_error(self):
+        raise ValueError()
@@ -0,0 +1,88 @@
+import os
+import stat
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+import mock
+from aws_s3_access_grants_boto3_plugin.cache.cache_backend import CacheBackend
+from aws_s3_access_grants_boto3_plugin.cache.sqlite_cache_backend import PURGE_EXPIRED_INTERVAL, SqliteCacheBackend
+
+
+class TestSqliteCacheBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache", "cache.db")
+        self.backend = SqliteCacheBackend(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_database_is_only_accessible_by_owner(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(self.path)).st_mode), 0o700)
+
+    def test_set_and_get(self):
+        self.backend.set("namespace", "key", "value", 60)
+        value, ttl = self.backend.get("namespace", "key")
+        self.assertEqual(value, "value")
+        self.assertAlmostEqual(ttl, 60, delta=1)
+
+    def test_entries_are_scoped_to_namespace(self):
+        self.backend.set("namespace", "key", "value", 60)
+        self.assertIsNone(self.backend.get("other_namespace", "key"))
+
+    def test_datetime_round_trip(self):
+        value = {'AccessKeyId': 'access_key_id', 'Expiration': datetime(2030, 1, 1, tzinfo=timezone.utc)}
+        self.backend.set("namespace", "key", value, 60)
+        self.assertEqual(self.backend.get("namespace", "key")[0], value)
+
+    def test_expired_entries_are_not_returned(self):
+        with mock.patch('aws_s3_access_grants_boto3_plugin.cache.sqlite_cache_backend.time.time', return_value=1000):
+            self.backend.set("namespace", "key", "value", 60)
+        with mock.patch('aws_s3_access_grants_boto3_plugin.cache.sqlite_cache_backend.time.time', return_value=1061):
+            self.assertIsNone(self.backend.get("namespace", "key"))
+
+    def test_entries_without_ttl_are_not_stored(self):
+        self.backend.set("namespace", "key", "value", 0)
+        self.assertIsNone(self.backend.get("namespace", "key"))
+
+    def test_get_many(self):
+        keys = ["key_" + str(i) for i in range(1200)]
+        for key in keys[::2]:
+            self.backend.set("namespace", key, key, 60)
+        entries = self.backend.get_many("namespace", keys)
+        self.assertEqual(sorted(entries), sorted(keys[::2]))
+
+    def test_delete(self):
+        self.backend.set("namespace", "key", "value", 60)
+        self.backend.delete("namespace", "key")
+        self.assertIsNone(self.backend.get("namespace", "key"))
+
+    def test_entries_are_shared_between_backends_and_threads(self):
+        self.backend.set("namespace", "key", "value", 60)
+        results = []
+        thread = threading.Thread(target=lambda: results.append(SqliteCacheBackend(self.path).get("namespace", "key")))
+        thread.start()
+        thread.join()
+        self.assertEqual(results[0][0], "value")
+
+    def test_writes_from_several_threads_are_all_counted(self):
+        def set_entries(thread):
+            backend = self.backend
+            for i in range(PURGE_EXPIRED_INTERVAL // 4):
+                backend.set("namespace", str(thread) + "-" + str(i), "value", 60)
+        threads = [threading.Thread(target=set_entries, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.backend._writes, PURGE_EXPIRED_INTERVAL // 4 * 4)
+
+    def test_backends_implement_the_whole_interface(self):
+        class GetOnlyCacheBackend(CacheBackend):
+            def get(self, namespace, key):
+                return None
+        with self.assertRaises(TypeError):
+            GetOnlyCacheBackend()
@@ -0,0 +1,27 @@
+# The implementation _get_common_prefix_for_multiple_prefixes replaced, kept as a reference for its output.
+def quadratic_common_prefix(prefixes):
+    if len(prefixes) == 0:
+        return '/'
+    common_ancestor = first_key = prefixes[0]
+    last_prefix = ''
+    for prefix in prefixes[1:]:
+        while common_ancestor != "":
+            if not prefix.startswith(common_ancestor):
+                last_index = common_ancestor.rfind('/')
+                if last_index == -1:
+                    return "/"
+                last_prefix = common_ancestor[last_index + 1:]
+                common_ancestor = common_ancestor[:last_index]
+            else:
+                break
+    new_common_ancestor = common_ancestor + "/" + last_prefix
+    for prefix in prefixes:
+        while last_prefix != "":
+            if not prefix.startswith(new_common_ancestor):
+                last_prefix = last_prefix[0:-1]
+                new_common_ancestor = common_ancestor + "/" + last_prefix
+            else:
+                break
+    if new_common_ancestor == first_key + "/":
+        return "/" + first_key
+    return "/" + new_common_ancestor
@@ -0,0 +1,83 @@
+import unittest
+from botocore import credentials
+from botocore.exceptions import ClientError
+import mock
+from aws_s3_access_grants_boto3_plugin import metrics
+from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
+from aws_s3_access_grants_boto3_plugin.cache.bucket_region_resolver_cache import BucketRegionResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.exceptions import UnsupportedOperationError
+from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import S3AccessGrantsPlugin
+
+
+class RecordingMetricsSink(metrics.MetricsSink):
+
+    def __init__(self):
+        self.counters = {}
+        self.observations = []
+
+    def increment(self, name, tags, value=1):
+        key = (name, tuple(sorted(tags.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, tags, value):
+        self.observations.append((name, tags, value))
+
+    def count(self, name, **tags):
+        return self.counters.get((name, tuple(sorted(tags.items()))), 0)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = RecordingMetricsSink()
+        metrics.set_metrics_sink(self.sink)
+
+    def tearDown(self):
+        metrics.set_metrics_sink(None)
+
+    def test_nothing_is_reported_without_sink(self):
+        metrics.set_metrics_sink(None)
+        with metrics.downstream_call(metrics.HEAD_BUCKET_TAGS):
+            metrics.increment(metrics.CACHE_HITS, {"cache": "bucket_region"})
+        self.assertEqual(self.sink.counters, {})
+        self.assertEqual(self.sink.observations, [])
+
+    def test_downstream_call_counts_errors(self):
+        with self.assertRaises(ValueError):
+            with metrics.downstream_call(metrics.GET_DATA_ACCESS_TAGS):
+                raise ValueError()
+        self.assertEqual(self.sink.count(metrics.DOWNSTREAM_CALLS, operation="GetDataAccess"), 1)
+        self.assertEqual(self.sink.count(metrics.DOWNSTREAM_ERRORS, operation="GetDataAccess"), 1)
+        self.assertEqual([name for name, _, _ in self.sink.observations], [metrics.DOWNSTREAM_LATENCY])
+
+    def test_cache_hits_misses_and_downstream_calls(self):
+        mock_s3_client = mock.Mock()
+        mock_s3_client.head_bucket.return_value = {'BucketRegion': 'us-east-2'}
+        cache = BucketRegionResolverCache()
+        cache.resolve(mock_s3_client, "bucket")
+        cache.resolve(mock_s3_client, "bucket")
+        self.assertEqual(self.sink.count(metrics.CACHE_MISSES, cache="bucket_region"), 1)
+        self.assertEqual(self.sink.count(metrics.CACHE_HITS, cache="bucket_region"), 1)
+        self.assertEqual(self.sink.count(metrics.DOWNSTREAM_CALLS, operation="HeadBucket"), 1)
+        self.assertEqual(sorted(name for name, _, _ in self.sink.observations),
+                         [metrics.CACHE_MISS_LATENCY, metrics.DOWNSTREAM_LATENCY])
+
+    def test_access_denied_cache(self):
+        cache = AccessDeniedCache()
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key")
+        key = CacheKey(requester_credentials, 'READ', "s3://bucket/prefix")
+        cache.get_value_from_cache(key)
+        cache.put_value_in_cache(key, ClientError({'Error': {'Code': 'AccessDenied'}}, 'GetDataAccess'))
+        cache.get_value_from_cache(key)
+        self.assertEqual(self.sink.count(metrics.CACHE_MISSES, cache="access_denied"), 1)
+        self.assertEqual(self.sink.count(metrics.CACHE_HITS, cache="access_denied"), 1)
+
+    def test_fallbacks(self):
+        s3_client = mock.Mock()
+        s3_client.meta.service_model.service_id = 's3'
+        S3AccessGrantsPlugin(s3_client, False)._should_fallback_to_default_credentials_for_this_case(
+            UnsupportedOperationError("Access Grants does not support the requested operation."))
+        S3AccessGrantsPlugin(s3_client, True)._should_fallback_to_default_credentials_for_this_case(mock.Mock())
+        self.assertEqual(self.sink.count(metrics.FALLBACKS, reason="unsupported_operation"), 1)
+        self.assertEqual(self.sink.count(metrics.FALLBACKS, reason="fallback_enabled"), 1)
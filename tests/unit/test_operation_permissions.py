@@ -1,7 +1,10 @@
 import unittest
 
-from aws_s3_access_grants_boto3_plugin.operation_permissions import get_permission_for_s3_operation
-from aws_s3_access_grants_boto3_plugin.exceptions import UnsupportedOperationError
+from aws_s3_access_grants_boto3_plugin import operation_permissions
+from aws_s3_access_grants_boto3_plugin.operation_permissions import get_permission_for_s3_operation, get_s3_operation, \
+    get_copy_object_prefix, get_delete_objects_prefix, get_listing_prefix, get_object_prefix, register_s3_operation
+from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import S3AccessGrantsPlugin
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException, UnsupportedOperationError
 
 
 class TestOperationPermissionMapper(unittest.TestCase):
@@ -14,3 +17,42 @@ class TestOperationPermissionMapper(unittest.TestCase):
         operation = "DELETE_ACCOUNT"  # obviously not a real operation
         with self.assertRaises(UnsupportedOperationError):
             get_permission_for_s3_operation(operation)
+
+    def test_get_s3_operation(self):
+        self.assertEqual(get_s3_operation("GetObject"), ("READ", get_object_prefix))
+        self.assertEqual(get_s3_operation("ListObjectsV2"), ("READ", get_listing_prefix))
+        with self.assertRaises(UnsupportedOperationError):
+            get_s3_operation("GetObjectTagging")
+
+    def test_register_s3_operation(self):
+        self.addCleanup(operation_permissions._s3_operations.pop, "GetObjectTagging")
+        self.addCleanup(operation_permissions._s3_operations_by_upper_name.pop, "GETOBJECTTAGGING")
+        register_s3_operation("GetObjectTagging", "READ")
+        self.assertEqual(get_s3_operation("GetObjectTagging"), ("READ", get_object_prefix))
+        self.assertEqual(get_permission_for_s3_operation("getobjecttagging"), "READ")
+
+    def test_register_s3_operation_with_invalid_permission(self):
+        with self.assertRaises(IllegalArgumentException):
+            register_s3_operation("GetObjectTagging", "LIST")
+        with self.assertRaises(UnsupportedOperationError):
+            get_s3_operation("GetObjectTagging")
+
+    def test_prefix_extractors(self):
+        self.assertEqual(get_object_prefix(None, {'input_params': {'Bucket': 'bucket', 'Key': 'a/b.txt'}}),
+                         "bucket/a/b.txt")
+        self.assertEqual(get_object_prefix(None, {'input_params': {'Bucket': 'bucket'}}), "bucket")
+        self.assertEqual(get_listing_prefix(None, {'input_params': {'Bucket': 'bucket', 'Prefix': 'a/'}}),
+                         "bucket/a/")
+        self.assertEqual(get_listing_prefix(None, {'input_params': {'Bucket': 'bucket'}}), "bucket")
+
+    def test_multiple_key_prefix_extractors(self):
+        plugin = S3AccessGrantsPlugin.__new__(S3AccessGrantsPlugin)
+        context = {'input_params': {'Bucket': 'bucket', 'Delete': {'Objects': [{'Key': 'a/b/1.txt'},
+                                                                               {'Key': 'a/c/2.txt'}]}}}
+        self.assertEqual(get_delete_objects_prefix(plugin, context), "bucket/a/")
+        context = {'input_params': {'Bucket': 'bucket', 'Key': 'a/c/2.txt'},
+                   's3_redirect': {'params': {'CopySource': 'bucket/a/b/1.txt'}}}
+        self.assertEqual(get_copy_object_prefix(plugin, context), "bucket/a/")
+        context['s3_redirect']['params']['CopySource'] = 'other-bucket/a/b/1.txt'
+        with self.assertRaises(IllegalArgumentException):
+            get_copy_object_prefix(plugin, context)
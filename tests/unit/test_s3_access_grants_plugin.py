@@ -1,12 +1,22 @@
 import unittest
-import os
-from datetime import datetime
+import random
+import re
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 import mock
 from botocore import credentials, session
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
+from aws_s3_access_grants_boto3_plugin.cache.access_grants_cache import AccessGrantsCache
+from aws_s3_access_grants_boto3_plugin.cache.account_id_resolver_cache import AccountIdResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.bucket_region_resolver_cache import BucketRegionResolverCache
+from aws_s3_access_grants_boto3_plugin.cache.caller_identity_resolver_cache import CallerIdentityResolverCache
 from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.cache.multipart_upload_cache import MultipartUploadCache
 from aws_s3_access_grants_boto3_plugin.exceptions import UnsupportedOperationError, IllegalArgumentException
 from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import S3AccessGrantsPlugin, initialize_client_plugin, is_valid_boto3_s3_client
+from .common_prefix_reference import quadratic_common_prefix
 
 
 class TestS3AccessGrantsPlugin(unittest.TestCase):
@@ -74,13 +84,42 @@ class TestS3AccessGrantsPlugin(unittest.TestCase):
         prefix_list = ["ABC/A/B/C/log.txt","ABC/A/B/C/log.txt"]
         self.assertEqual(plugin._get_common_prefix_for_multiple_prefixes(prefix_list), '/ABC/A/B/C/log.txt')
 
+    def test_get_common_prefix_for_multiple_prefixes_matches_previous_implementation(self):
+        s3_client = self._create_mock_s3_client()
+        plugin = S3AccessGrantsPlugin(s3_client, False)
+        rng = random.Random(13)
+        for alphabet in ("ab/", "a/", "abc//"):
+            for _ in range(3000):
+                # Keys derived from a shared stem, so that batches often have long common prefixes.
+                stem = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+                prefix_list = [stem[:rng.randint(0, len(stem))] +
+                               "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 4)))
+                               for _ in range(rng.randint(1, 6))]
+                self.assertEqual(plugin._get_common_prefix_for_multiple_prefixes(prefix_list),
+                                 quadratic_common_prefix(prefix_list), prefix_list)
+
+    def test_get_common_prefix_for_keys_diverging_at_a_slash(self):
+        s3_client = self._create_mock_s3_client()
+        plugin = S3AccessGrantsPlugin(s3_client, False)
+        self.assertEqual(plugin._get_common_prefix_for_multiple_prefixes(["A/B", "A"]), '/A/')
+        self.assertEqual(plugin._get_common_prefix_for_multiple_prefixes(["A/B", "A/C"]), '/A/')
+        self.assertEqual(plugin._get_common_prefix_for_multiple_prefixes(["A/BC", "A/BD"]), '/A/B')
+        self.assertEqual(plugin._get_common_prefix_for_multiple_prefixes(["A", "A/B"]), '/A')
+
     @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.BucketRegionResolverCache.resolve')
     def test_get_s3_control_client_for_region(self, mock_resolve):
         s3_client = self._create_mock_s3_client()
         plugin = S3AccessGrantsPlugin(s3_client, False)
         mock_resolve.return_value = 'us-east-1'
         plugin._get_s3_control_client_for_region("bucket-name")
-        self.assertTrue(plugin.client_dict.__contains__('us-east-1'))
+        self.assertTrue(plugin.s3_control_client_pool.contains(plugin.session, 'us-east-1', plugin.client_config))
+
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.BucketRegionResolverCache.resolve')
+    def test_plugins_without_a_session_share_their_s3_control_clients(self, mock_resolve):
+        mock_resolve.return_value = 'us-east-1'
+        plugins = [S3AccessGrantsPlugin(self._create_mock_s3_client()) for _ in range(5)]
+        clients = [plugin._get_s3_control_client_for_region("bucket-name") for plugin in plugins]
+        self.assertEqual(len(set(map(id, clients))), 1)
 
     def test_initializing_plugin_with_non_s3_client_does_not_throw_exception(self):
         client = session.get_session().create_client('dynamodb')
@@ -109,3 +148,302 @@ class TestS3AccessGrantsPlugin(unittest.TestCase):
         s3_client = self._create_mock_s3_client()
         plugin = S3AccessGrantsPlugin(s3_client)
         self.assertFalse(plugin.fallback_enabled)
+
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.AccessGrantsCache.get_credentials')
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.BucketRegionResolverCache.resolve')
+    def test_caller_identity_is_cached_across_requests(self, mock_resolve, get_credentials_mock):
+        s3_client = self._create_mock_s3_client()
+        s3_client._get_credentials.return_value = credentials.Credentials(access_key="caller_identity_access_key",
+                                                                          secret_key="secret_key", token="token")
+        mock_resolve.return_value = 'us-east-1'
+        get_credentials_mock.return_value = {
+            'AccessKeyId': 'access_key_id',
+            'SecretAccessKey': 'secret_access_key',
+            'SessionToken': 'session_token'
+        }
+        plugin = S3AccessGrantsPlugin(s3_client, False)
+        plugin.sts_client = mock.Mock()
+        plugin.sts_client.get_caller_identity.return_value = {'Account': '123456789012'}
+        for _ in range(3):
+            request = mock.Mock()
+            request.context = {'input_params': {'Bucket': 'bucket', 'Key': 'key'}, 'signing': {}}
+            plugin._get_access_grants_credentials('GetObject', request)
+            self.assertEqual(request.context['signing']['request_credentials'].access_key, 'access_key_id')
+        plugin.sts_client.get_caller_identity.assert_called_once()
+
+    def test_warm_up_regions_and_max_pool_connections(self):
+        s3_client = self._create_mock_s3_client()
+        customer_session = session.get_session()
+        plugin = S3AccessGrantsPlugin(s3_client, customer_session=customer_session,
+                                      warm_up_regions=['us-west-2', 'eu-west-1'], max_pool_connections=50)
+        self.assertEqual(plugin.client_config.max_pool_connections, 50)
+        self.assertEqual(plugin.client_config.user_agent, "aws_s3_access_grants_boto3_plugin")
+        for region in ['us-west-2', 'eu-west-1']:
+            self.assertTrue(plugin.s3_control_client_pool.contains(customer_session, region, plugin.client_config))
+        self.assertFalse(plugin.s3_control_client_pool.contains(session.get_session(), 'us-west-2',
+                                                                plugin.client_config))
+
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.S3AccessGrantsPlugin._get_value_from_cache')
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.S3AccessGrantsPlugin._get_s3_control_client_for_region')
+    def test_warm(self, mock_get_s3_control_client_for_region, mock_get_value_from_cache):
+        s3_client = self._create_mock_s3_client()
+        s3_client._get_credentials.return_value = credentials.Credentials(access_key="warm_access_key",
+                                                                          secret_key="secret_key", token="token")
+        plugin = S3AccessGrantsPlugin(s3_client, False)
+        plugin.sts_client = mock.Mock()
+        plugin.sts_client.get_caller_identity.return_value = {'Account': '123456789012'}
+        error = Exception("Access denied")
+
+        def get_value_from_cache(cache_key, s3_control_client, requester_account_id):
+            if cache_key.s3_prefix == "s3://bucket-2/prefix" and cache_key.permission == "WRITE":
+                raise error
+            return {}
+        mock_get_value_from_cache.side_effect = get_value_from_cache
+        failures = plugin.warm(["s3://bucket-1/prefix/", "s3://bucket-2/prefix"], ["READ", "WRITE"])
+        self.assertEqual(mock_get_value_from_cache.call_count, 4)
+        self.assertEqual({call.args[0] for call in mock_get_s3_control_client_for_region.call_args_list},
+                         {"bucket-1", "bucket-2"})
+        self.assertEqual(failures, {("s3://bucket-2/prefix", "WRITE"): error})
+        plugin.sts_client.get_caller_identity.assert_called_once()
+
+    def test_resolve_bucket_owners_uses_the_s3_control_client_of_each_region(self):
+        s3_client = self._create_mock_s3_client()
+        s3_client._get_credentials.return_value = credentials.Credentials(access_key="access_key",
+                                                                          secret_key="secret_key")
+        plugin = S3AccessGrantsPlugin(s3_client, False)
+        plugin.sts_client = mock.Mock()
+        plugin.sts_client.get_caller_identity.return_value = {'Account': '123456789012'}
+        plugin.caller_identity_cache = CallerIdentityResolverCache()
+        plugin.bucket_region_cache = BucketRegionResolverCache(
+            static_regions={'bucket-1': 'us-east-1', 'bucket-2': 'us-east-1', 'bucket-3': 'eu-west-1'})
+        plugin.access_grants_cache = AccessGrantsCache(account_id_resolver_cache=AccountIdResolverCache())
+        plugin.internal_s3_client = mock.Mock()
+        error = Exception("Bucket not found")
+        plugin.internal_s3_client.head_bucket.side_effect = error
+        s3_control_clients = {}
+
+        def get_client(customer_session, region, client_config):
+            s3_control_client = s3_control_clients.setdefault(region, mock.Mock())
+            s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+                'AccessGrantsInstanceArn': 'arn:aws:s3:' + region + ':987654321098:access-grants/default'}
+            return s3_control_client
+        plugin.s3_control_client_pool = mock.Mock()
+        plugin.s3_control_client_pool.get_client.side_effect = get_client
+        account_ids, failures = plugin.resolve_bucket_owners(['bucket-1', 'bucket-2', 'bucket-3', 'bucket-4'])
+        self.assertEqual(account_ids, {'bucket-1': '987654321098', 'bucket-2': '987654321098',
+                                       'bucket-3': '987654321098'})
+        self.assertEqual(failures, {'bucket-4': error})
+        self.assertEqual({region: sorted(call.kwargs['S3Prefix'] for call in
+                                         client.get_access_grants_instance_for_prefix.call_args_list)
+                          for region, client in s3_control_clients.items()},
+                         {'us-east-1': ["s3://bucket-1", "s3://bucket-2"], 'eu-west-1': ["s3://bucket-3"]})
+
+    def test_warm_with_invalid_targets(self):
+        s3_client = self._create_mock_s3_client()
+        plugin = S3AccessGrantsPlugin(s3_client, False)
+        with self.assertRaises(IllegalArgumentException):
+            plugin.warm(["bucket/prefix"])
+        with self.assertRaises(IllegalArgumentException):
+            plugin.warm(["s3://bucket/prefix"], ["LIST"])
+
+    def _create_split_delete_objects_plugin(self, s3_client):
+        plugin = S3AccessGrantsPlugin(s3_client, False, split_delete_objects=True)
+        plugin.access_grants_cache = AccessGrantsCache()
+        plugin.access_denied_cache = AccessDeniedCache()
+        plugin.sts_client = mock.Mock()
+        plugin.sts_client.get_caller_identity.return_value = {'Account': '123456789012'}
+        plugin.internal_s3_client = mock.Mock()
+        plugin.internal_s3_client.head_bucket.return_value = {'BucketRegion': 'us-east-1'}
+        plugin.s3_control_client_pool = mock.Mock()
+        return plugin
+
+    def _cache_grant(self, plugin, requester_credentials, s3_prefix, access_key_id):
+        plugin.access_grants_cache._put_value_in_cache(
+            CacheKey(requester_credentials, 'WRITE', s3_prefix),
+            {'AccessKeyId': access_key_id, 'SecretAccessKey': 'secret_access_key', 'SessionToken': 'session_token'})
+
+    def test_split_delete_objects_sends_one_request_per_grant(self):
+        s3_client = session.get_session().create_client('s3', region_name='us-east-1', aws_access_key_id='access_key',
+                                                        aws_secret_access_key='secret_key')
+        plugin = self._create_split_delete_objects_plugin(s3_client)
+        requester_credentials = s3_client._get_credentials()
+        self._cache_grant(plugin, requester_credentials, "s3://bucket/a", 'access_key_id_a')
+        self._cache_grant(plugin, requester_credentials, "s3://bucket/b", 'access_key_id_b')
+        plugin.register()
+        sent = []
+
+        def send(request, **kwargs):
+            keys = re.findall(r"<Key>(.*?)</Key>", request.body.decode("utf-8"))
+            sent.append((request.headers['Authorization'].decode("utf-8").split('/')[0], keys))
+            body = "<DeleteResult>" + "".join("<Deleted><Key>" + key + "</Key></Deleted>" for key in keys) \
+                   + "</DeleteResult>"
+            return AWSResponse(request.url, 200, {}, mock.Mock(stream=lambda: iter([body.encode("utf-8")])))
+        s3_client.meta.events.register('before-send.s3', send)
+
+        response = s3_client.delete_objects(Bucket='bucket', Delete={'Objects': [
+            {'Key': 'a/1.txt'}, {'Key': 'b/1.txt'}, {'Key': 'a/2.txt'}]})
+        self.assertEqual(sorted(sent), [('AWS4-HMAC-SHA256 Credential=access_key_id_a', ['a/1.txt', 'a/2.txt']),
+                                        ('AWS4-HMAC-SHA256 Credential=access_key_id_b', ['b/1.txt'])])
+        self.assertEqual(sorted(deleted['Key'] for deleted in response['Deleted']), ['a/1.txt', 'a/2.txt', 'b/1.txt'])
+
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.S3AccessGrantsPlugin._resolve_credentials')
+    def test_split_delete_objects_signs_requests_with_the_grant_of_their_keys(self, mock_resolve_credentials):
+        s3_client = session.get_session().create_client('s3', region_name='us-east-1', aws_access_key_id='access_key',
+                                                        aws_secret_access_key='secret_key')
+        plugin = self._create_split_delete_objects_plugin(s3_client)
+        requester_credentials = s3_client._get_credentials()
+        # The common prefix of "abc/1" and "abd/2" is "s3://bucket/", which no grant covers.
+        self._cache_grant(plugin, requester_credentials, "s3://bucket/ab*", 'access_key_id_ab')
+        self._cache_grant(plugin, requester_credentials, "s3://bucket/c", 'access_key_id_c')
+        mock_resolve_credentials.side_effect = ClientError({'Error': {'Code': 'AccessDenied'}}, 'GetDataAccess')
+        plugin.register()
+        sent = []
+
+        def send(request, **kwargs):
+            keys = re.findall(r"<Key>(.*?)</Key>", request.body.decode("utf-8"))
+            sent.append((request.headers['Authorization'].decode("utf-8").split('/')[0], keys))
+            body = "<DeleteResult>" + "".join("<Deleted><Key>" + key + "</Key></Deleted>" for key in keys) \
+                   + "</DeleteResult>"
+            return AWSResponse(request.url, 200, {}, mock.Mock(stream=lambda: iter([body.encode("utf-8")])))
+        s3_client.meta.events.register('before-send.s3', send)
+
+        response = s3_client.delete_objects(Bucket='bucket', Delete={'Objects': [
+            {'Key': 'abc/1'}, {'Key': 'c/1'}, {'Key': 'abd/2'}]})
+        self.assertEqual(sorted(sent), [('AWS4-HMAC-SHA256 Credential=access_key_id_ab', ['abc/1', 'abd/2']),
+                                        ('AWS4-HMAC-SHA256 Credential=access_key_id_c', ['c/1'])])
+        self.assertEqual(sorted(deleted['Key'] for deleted in response['Deleted']), ['abc/1', 'abd/2', 'c/1'])
+        mock_resolve_credentials.assert_not_called()
+
+    def _get_delete_objects_call(self, objects):
+        model = session.get_session().get_service_model('s3').operation_model('DeleteObjects')
+        context = {'s3_redirect': {'params': {'Bucket': 'bucket', 'Delete': {'Objects': objects}}}}
+        return model, {'url': 'https://bucket.s3.amazonaws.com/?delete'}, context
+
+    def test_split_delete_objects_does_not_split_keys_covered_by_one_grant(self):
+        s3_client = self._create_mock_s3_client()
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key")
+        s3_client._get_credentials.return_value = requester_credentials
+        plugin = self._create_split_delete_objects_plugin(s3_client)
+        self._cache_grant(plugin, requester_credentials, "s3://bucket/a", 'access_key_id_a')
+        model, params, context = self._get_delete_objects_call([{'Key': 'a/1.txt'}, {'Key': 'a/b/2.txt'}])
+        self.assertIsNone(plugin._split_delete_objects(model, params, context))
+        s3_client.delete_objects.assert_not_called()
+
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.S3AccessGrantsPlugin._resolve_credentials')
+    def test_split_delete_objects_reports_failed_requests_per_key(self, mock_resolve_credentials):
+        s3_client = self._create_mock_s3_client()
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key")
+        s3_client._get_credentials.return_value = requester_credentials
+        plugin = self._create_split_delete_objects_plugin(s3_client)
+        self._cache_grant(plugin, requester_credentials, "s3://bucket/a", 'access_key_id_a')
+        mock_resolve_credentials.side_effect = ClientError({'Error': {'Code': 'AccessDenied'}}, 'GetDataAccess')
+
+        def delete_objects(Bucket, Delete):
+            if Delete['Objects'][0]['Key'].startswith('c/'):
+                raise ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'Access Denied'}}, 'DeleteObjects')
+            return {'Deleted': [{'Key': delete_object['Key']} for delete_object in Delete['Objects']],
+                    'ResponseMetadata': {'HTTPStatusCode': 200}}
+        s3_client.delete_objects.side_effect = delete_objects
+        model, params, context = self._get_delete_objects_call(
+            [{'Key': 'a/1.txt'}, {'Key': 'c/1.txt', 'VersionId': 'version'}])
+        http, parsed = plugin._split_delete_objects(model, params, context)
+        self.assertEqual(http.status_code, 200)
+        self.assertEqual(parsed['Deleted'], [{'Key': 'a/1.txt'}])
+        self.assertEqual(parsed['Errors'], [{'Key': 'c/1.txt', 'VersionId': 'version', 'Code': 'AccessDenied',
+                                             'Message': 'Access Denied'}])
+
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.S3AccessGrantsPlugin._resolve_credentials')
+    def test_split_delete_objects_deletes_keys_of_object_level_grants_together(self, mock_resolve_credentials):
+        s3_client = self._create_mock_s3_client()
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key")
+        s3_client._get_credentials.return_value = requester_credentials
+        s3_client.delete_objects.return_value = {'Deleted': [], 'ResponseMetadata': {'HTTPStatusCode': 200}}
+        plugin = self._create_split_delete_objects_plugin(s3_client)
+        self._cache_grant(plugin, requester_credentials, "s3://bucket/a", 'access_key_id_a')
+        objects = [{'Key': directory + '/' + str(i) + '.txt'} for directory in 'cd' for i in range(50)]
+        model, params, context = self._get_delete_objects_call([{'Key': 'a/1.txt'}] + objects)
+        plugin._split_delete_objects(model, params, context)
+        self.assertEqual(sorted(call.args[2] for call in mock_resolve_credentials.call_args_list),
+                         ["s3://bucket/c/0.txt", "s3://bucket/d/0.txt"])
+        self.assertEqual(sorted(len(call.kwargs['Delete']['Objects'])
+                                for call in s3_client.delete_objects.call_args_list), [1, 100])
+
+    def test_split_delete_objects_is_not_registered_by_default(self):
+        s3_client = self._create_mock_s3_client()
+        S3AccessGrantsPlugin(s3_client, False).register()
+        s3_client.meta.events.register.assert_called_once()
+
+    def test_observe_responses_registers_the_bucket_region_observer(self):
+        s3_client = self._create_mock_s3_client()
+        bucket_region_cache = BucketRegionResolverCache(observe_responses=True)
+        S3AccessGrantsPlugin(s3_client, bucket_region_cache=bucket_region_cache).register()
+        s3_client.meta.events.register.assert_called_with('after-call.s3', bucket_region_cache._record_response_region)
+
+    def _send_multipart_upload_request(self, request, **kwargs):
+        self.sent.append(request.headers['Authorization'].decode("utf-8").split('/')[0])
+        if request.method == 'POST' and 'uploads' in request.url:
+            body = b"<InitiateMultipartUploadResult><Bucket>bucket</Bucket><Key>key</Key>" \
+                   b"<UploadId>upload-id</UploadId></InitiateMultipartUploadResult>"
+        elif request.method == 'POST':
+            body = b"<CompleteMultipartUploadResult><Bucket>bucket</Bucket><Key>key</Key>" \
+                   b"</CompleteMultipartUploadResult>"
+        else:
+            body = b""
+        return AWSResponse(request.url, 200, {'ETag': '"etag"'}, mock.Mock(stream=lambda: iter([body])))
+
+    @patch('aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin.S3AccessGrantsPlugin._resolve_credentials')
+    def test_multipart_upload_parts_are_signed_with_pinned_credentials(self, mock_resolve_credentials):
+        s3_client = session.get_session().create_client('s3', region_name='us-east-1', aws_access_key_id='access_key',
+                                                        aws_secret_access_key='secret_key')
+        mock_resolve_credentials.return_value = {
+            'AccessKeyId': 'access_key_id', 'SecretAccessKey': 'secret_access_key', 'SessionToken': 'session_token',
+            'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)}
+        multipart_upload_cache = MultipartUploadCache()
+        S3AccessGrantsPlugin(s3_client, multipart_upload_cache=multipart_upload_cache).register()
+        self.sent = []
+        s3_client.meta.events.register('before-send.s3', self._send_multipart_upload_request)
+
+        upload_id = s3_client.create_multipart_upload(Bucket='bucket', Key='key')['UploadId']
+        parts = [{'PartNumber': number, 'ETag': s3_client.upload_part(Bucket='bucket', Key='key', UploadId=upload_id,
+                                                                      PartNumber=number, Body=b"part")['ETag']}
+                 for number in range(1, 4)]
+        s3_client.complete_multipart_upload(Bucket='bucket', Key='key', UploadId=upload_id,
+                                            MultipartUpload={'Parts': parts})
+
+        self.assertEqual(self.sent, ['AWS4-HMAC-SHA256 Credential=access_key_id'] * 5)
+        mock_resolve_credentials.assert_called_once()
+        self.assertIsNone(multipart_upload_cache.get_credentials(upload_id, 'access_key'))
+
+    def test_caches_are_shared_by_default(self):
+        plugin_1 = S3AccessGrantsPlugin(self._create_mock_s3_client())
+        plugin_2 = S3AccessGrantsPlugin(self._create_mock_s3_client())
+        self.assertIs(plugin_1.access_grants_cache, plugin_2.access_grants_cache)
+        self.assertIs(plugin_1.access_denied_cache, S3AccessGrantsPlugin.access_denied_cache)
+
+    def test_caches_passed_to_constructor_are_scoped_to_plugin(self):
+        access_denied_cache = AccessDeniedCache(cache_size=10)
+        bucket_region_cache = BucketRegionResolverCache(cache_ttl=60)
+        caller_identity_cache = CallerIdentityResolverCache(cache_ttl=60)
+        plugin = S3AccessGrantsPlugin(self._create_mock_s3_client(), access_denied_cache=access_denied_cache,
+                                      bucket_region_cache=bucket_region_cache,
+                                      caller_identity_cache=caller_identity_cache)
+        self.assertIs(plugin.access_denied_cache, access_denied_cache)
+        self.assertIs(plugin.bucket_region_cache, bucket_region_cache)
+        self.assertIs(plugin.caller_identity_cache, caller_identity_cache)
+        self.assertIs(plugin.access_grants_cache, S3AccessGrantsPlugin.access_grants_cache)
+        self.assertIsNot(S3AccessGrantsPlugin.access_denied_cache, access_denied_cache)
+
+    def test_access_grants_cache_sized_through_constructor(self):
+        account_id_resolver_cache = AccountIdResolverCache(cache_ttl=60)
+        plugin = S3AccessGrantsPlugin(self._create_mock_s3_client(), cache_size=100, duration=2 * 60 * 60,
+                                      account_id_resolver_cache=account_id_resolver_cache)
+        self.assertIsNot(plugin.access_grants_cache, S3AccessGrantsPlugin.access_grants_cache)
+        self.assertEqual(plugin.access_grants_cache.cache_size, 100)
+        self.assertEqual(plugin.access_grants_cache.duration, 2 * 60 * 60)
+        self.assertIs(plugin.access_grants_cache.account_id_resolver_cache, account_id_resolver_cache)
+        self.assertIsNot(AccessGrantsCache.account_id_resolver_cache, account_id_resolver_cache)
+
+    def test_access_grants_cache_and_its_sizing_cannot_be_passed_together(self):
+        with self.assertRaises(IllegalArgumentException):
+            S3AccessGrantsPlugin(self._create_mock_s3_client(), cache_size=100,
+                                 access_grants_cache=AccessGrantsCache())
@@ -0,0 +1,61 @@
+import atexit
+import importlib.util
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+import mock
+from botocore import credentials
+from aws_s3_access_grants_boto3_plugin.cache.cache_key import CacheKey
+from aws_s3_access_grants_boto3_plugin.cache.encrypted_snapshot_cache_backend import EncryptedSnapshotCacheBackend
+from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import S3AccessGrantsPlugin
+
+cryptography_installed = importlib.util.find_spec("cryptography") is not None
+
+
+@unittest.skipUnless(cryptography_installed, "cryptography is not installed")
+class TestS3AccessGrantsPluginSnapshot(unittest.TestCase):
+
+    def _create_snapshot_plugin(self, path, key):
+        snapshot = EncryptedSnapshotCacheBackend(path, key)
+        self.addCleanup(atexit.unregister, snapshot.flush)
+        s3_client = mock.Mock()
+        s3_client.meta.service_model.service_id = 's3'
+        return S3AccessGrantsPlugin(s3_client, snapshot=snapshot)
+
+    def test_plugin_starts_with_the_caches_of_its_snapshot(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "cache.snapshot")
+        from cryptography.fernet import Fernet
+        key = Fernet.generate_key()
+        requester_credentials = credentials.Credentials(access_key="access_key", secret_key="secret_key")
+
+        plugin = self._create_snapshot_plugin(path, key)
+        self.assertIsNot(plugin.access_grants_cache, S3AccessGrantsPlugin.access_grants_cache)
+        self.assertIsNot(plugin.caller_identity_cache, S3AccessGrantsPlugin.caller_identity_cache)
+        self.assertIsNot(plugin.bucket_region_cache, S3AccessGrantsPlugin.bucket_region_cache)
+        plugin.caller_identity_cache._cache_resolved("access_key", "123456789012")
+        plugin.bucket_region_cache._cache_resolved("bucket", "us-west-2")
+        plugin.access_grants_cache._cache_service_response(CacheKey(requester_credentials, 'READ', "s3://bucket/a"), {
+            'Credentials': {'AccessKeyId': 'access_key_id', 'SecretAccessKey': 'secret_access_key',
+                            'SessionToken': 'session_token',
+                            'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)},
+            'MatchedGrantTarget': 's3://bucket/*'})
+        plugin.snapshot.flush()
+
+        plugin = self._create_snapshot_plugin(path, key)
+        plugin.sts_client = mock.Mock()
+        plugin.internal_s3_client = mock.Mock()
+        s3_control_client = mock.Mock()
+        with patch.object(plugin.s3_control_client_pool, 'get_client', return_value=s3_control_client):
+            value = plugin._resolve_credentials(requester_credentials, 'READ', "s3://bucket/a/b", "bucket")
+        self.assertEqual(value['AccessKeyId'], 'access_key_id')
+        plugin.sts_client.get_caller_identity.assert_not_called()
+        plugin.internal_s3_client.head_bucket.assert_not_called()
+        s3_control_client.get_data_access.assert_not_called()
+        # Credentials stay bound to the requester they were issued for.
+        other_requester_credentials = credentials.Credentials(access_key="other_access_key", secret_key="secret_key")
+        self.assertIsNone(plugin.access_grants_cache._search_credentials_in_backend(
+            CacheKey(other_requester_credentials, 'READ', "s3://bucket/a/b")))
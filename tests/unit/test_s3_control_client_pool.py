@@ -0,0 +1,69 @@
+import gc
+import threading
+import time
+import unittest
+import mock
+from botocore import config
+from aws_s3_access_grants_boto3_plugin.s3_control_client_pool import S3ControlClientPool
+
+
+class TestS3ControlClientPool(unittest.TestCase):
+    client_config = config.Config(user_agent="aws_s3_access_grants_boto3_plugin")
+
+    @mock.patch('aws_s3_access_grants_boto3_plugin.s3_control_client_pool.create_nested_client')
+    def test_client_is_created_once_per_region_under_concurrency(self, mock_create_nested_client):
+        def create_nested_client(*args, **kwargs):
+            time.sleep(0.05)
+            return mock.Mock()
+        mock_create_nested_client.side_effect = create_nested_client
+        pool = S3ControlClientPool()
+        session = mock.Mock()
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(pool.get_client(session, 'us-east-1',
+                                                                                  self.client_config)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        mock_create_nested_client.assert_called_once_with(session, 's3control', region_name='us-east-1',
+                                                          config=self.client_config)
+        self.assertEqual(len(set(map(id, clients))), 1)
+
+    @mock.patch('aws_s3_access_grants_boto3_plugin.s3_control_client_pool.create_nested_client')
+    def test_clients_are_not_shared_across_sessions(self, mock_create_nested_client):
+        mock_create_nested_client.side_effect = lambda *args, **kwargs: mock.Mock()
+        pool = S3ControlClientPool()
+        client_1 = pool.get_client(mock.Mock(), 'us-east-1', self.client_config)
+        client_2 = pool.get_client(mock.Mock(), 'us-east-1', self.client_config)
+        self.assertIsNot(client_1, client_2)
+
+    @mock.patch('aws_s3_access_grants_boto3_plugin.s3_control_client_pool.create_nested_client')
+    def test_clients_are_not_shared_across_pool_sizes(self, mock_create_nested_client):
+        mock_create_nested_client.side_effect = lambda *args, **kwargs: mock.Mock()
+        pool = S3ControlClientPool()
+        session = mock.Mock()
+        client_1 = pool.get_client(session, 'us-east-1', self.client_config)
+        client_2 = pool.get_client(session, 'us-east-1',
+                                   self.client_config.merge(config.Config(max_pool_connections=50)))
+        self.assertIsNot(client_1, client_2)
+
+    @mock.patch('aws_s3_access_grants_boto3_plugin.s3_control_client_pool.create_nested_client')
+    def test_warm_up(self, mock_create_nested_client):
+        pool = S3ControlClientPool()
+        session = mock.Mock()
+        pool.warm_up(session, ['us-east-1', 'us-west-2'], self.client_config)
+        self.assertEqual(mock_create_nested_client.call_count, 2)
+        self.assertTrue(pool.contains(session, 'us-west-2', self.client_config))
+
+    @mock.patch('aws_s3_access_grants_boto3_plugin.s3_control_client_pool.create_nested_client')
+    def test_clients_are_released_with_their_session(self, mock_create_nested_client):
+        pool = S3ControlClientPool()
+        session = mock.Mock()
+        pool.get_client(session, 'us-east-1', self.client_config)
+        self.assertEqual(len(pool._clients), 1)
+        # The mock records the session it was called with.
+        mock_create_nested_client.reset_mock()
+        del session
+        gc.collect()
+        self.assertEqual(len(pool._clients), 0)
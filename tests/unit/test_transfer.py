@@ -0,0 +1,123 @@
+import importlib.util
+import io
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import mock
+from botocore import credentials, session
+from botocore.awsrequest import AWSResponse
+from aws_s3_access_grants_boto3_plugin.cache.access_denied_cache import AccessDeniedCache
+from aws_s3_access_grants_boto3_plugin.cache.access_grants_cache import AccessGrantsCache
+from aws_s3_access_grants_boto3_plugin.cache.account_id_resolver_cache import AccountIdResolverCache
+from aws_s3_access_grants_boto3_plugin.exceptions import IllegalArgumentException
+from aws_s3_access_grants_boto3_plugin.s3_access_grants_plugin import S3AccessGrantsPlugin
+from aws_s3_access_grants_boto3_plugin.transfer import AccessGrantsTransferSubscriber
+
+s3transfer_installed = importlib.util.find_spec("s3transfer") is not None
+
+
+class TestAccessGrantsTransferSubscriber(unittest.TestCase):
+
+    def _create_plugin(self, s3_client):
+        plugin = S3AccessGrantsPlugin(s3_client)
+        plugin.access_grants_cache = AccessGrantsCache(account_id_resolver_cache=AccountIdResolverCache())
+        plugin.access_denied_cache = AccessDeniedCache()
+        plugin.sts_client = mock.Mock()
+        plugin.sts_client.get_caller_identity.return_value = {'Account': '123456789012'}
+        plugin.internal_s3_client = mock.Mock()
+        plugin.internal_s3_client.head_bucket.return_value = {'BucketRegion': 'us-east-1'}
+        self.s3_control_client = mock.Mock()
+        self.s3_control_client.get_access_grants_instance_for_prefix.return_value = {
+            'AccessGrantsInstanceArn': 'arn:aws:s3:us-east-1:123456789012:access-grants/default',
+            'AccessGrantsInstanceId': 'default'
+        }
+        self.s3_control_client.get_data_access.return_value = {
+            'Credentials': {
+                'AccessKeyId': 'access_key_id',
+                'SecretAccessKey': 'secret_access_key',
+                'SessionToken': 'session_token',
+                'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)
+            },
+            'MatchedGrantTarget': 's3://bucket/prefix/*'
+        }
+        plugin.s3_control_client_pool = mock.Mock()
+        plugin.s3_control_client_pool.get_client.return_value = self.s3_control_client
+        return plugin
+
+    @unittest.skipUnless(s3transfer_installed, "s3transfer is not installed")
+    def test_transfers_of_a_batch_resolve_their_grant_once(self):
+        from s3transfer.manager import TransferManager
+        s3_client = session.get_session().create_client('s3', region_name='us-east-1', aws_access_key_id='access_key',
+                                                        aws_secret_access_key='secret_key')
+        plugin = self._create_plugin(s3_client)
+        plugin.register()
+        sent = []
+
+        def send(request, **kwargs):
+            sent.append(request.headers['Authorization'].decode("utf-8").split('/')[0])
+            return AWSResponse(request.url, 200, {'ETag': '"etag"'}, mock.Mock(stream=lambda: iter([b""])))
+        s3_client.meta.events.register('before-send.s3', send)
+
+        # A slow GetDataAccess, that the worker threads would all be waiting on if they resolved the grant themselves.
+        response = self.s3_control_client.get_data_access.return_value
+        self.s3_control_client.get_data_access.side_effect = lambda **kwargs: time.sleep(0.1) or response
+        subscriber = AccessGrantsTransferSubscriber(plugin, "WRITE")
+        with TransferManager(s3_client) as transfer_manager:
+            futures = [transfer_manager.upload(io.BytesIO(b"content"), 'bucket', 'prefix/file' + str(i),
+                                               subscribers=[subscriber]) for i in range(20)]
+            for future in futures:
+                future.result()
+
+        self.assertEqual(sent, ['AWS4-HMAC-SHA256 Credential=access_key_id'] * 20)
+        self.s3_control_client.get_data_access.assert_called_once()
+
+    @unittest.skipUnless(s3transfer_installed, "s3transfer is not installed")
+    def test_transfers_are_signed_with_the_object_level_grant_resolved_when_queued(self):
+        from s3transfer.manager import TransferManager
+        s3_client = session.get_session().create_client('s3', region_name='us-east-1', aws_access_key_id='access_key',
+                                                        aws_secret_access_key='secret_key')
+        plugin = self._create_plugin(s3_client)
+        plugin.register()
+        sent = []
+
+        def send(request, **kwargs):
+            sent.append(request.headers['Authorization'].decode("utf-8").split('/')[0])
+            return AWSResponse(request.url, 200, {'ETag': '"etag"'}, mock.Mock(stream=lambda: iter([b""])))
+        s3_client.meta.events.register('before-send.s3', send)
+
+        response = self.s3_control_client.get_data_access.return_value
+        self.s3_control_client.get_data_access.side_effect = \
+            lambda Target, **kwargs: dict(response, MatchedGrantTarget=Target)
+        s3_client.put_object(Bucket='bucket', Key='prefix/unqueued', Body=b"content")
+        # Until a subscriber pins credentials, signing does not look queued transfers up.
+        self.assertIsNone(plugin._queued_transfer_credentials)
+        self.s3_control_client.get_data_access.reset_mock()
+        sent.clear()
+        subscriber = AccessGrantsTransferSubscriber(plugin, "WRITE")
+        with TransferManager(s3_client) as transfer_manager:
+            futures = [transfer_manager.upload(io.BytesIO(b"content"), 'bucket', 'prefix/file' + str(i),
+                                               subscribers=[subscriber]) for i in range(5)]
+            for future in futures:
+                future.result()
+
+        self.assertEqual(sent, ['AWS4-HMAC-SHA256 Credential=access_key_id'] * 5)
+        # One call per object, made when its transfer is queued, none when its request is signed.
+        targets = [call.kwargs['Target'] for call in self.s3_control_client.get_data_access.call_args_list]
+        self.assertEqual(sorted(targets), ["s3://bucket/prefix/file" + str(i) for i in range(5)])
+        self.assertEqual(len(plugin._queued_transfer_credentials), 0)
+
+    def test_failures_are_left_to_the_requests(self):
+        s3_client = mock.Mock()
+        s3_client._get_credentials.return_value = credentials.Credentials(access_key="access_key",
+                                                                          secret_key="secret_key")
+        plugin = self._create_plugin(s3_client)
+        self.s3_control_client.get_data_access.side_effect = Exception("Service unavailable")
+        future = mock.Mock()
+        future.meta = SimpleNamespace(call_args=SimpleNamespace(bucket='bucket', key='prefix/file'))
+        AccessGrantsTransferSubscriber(plugin, "READ").on_queued(future)
+        self.s3_control_client.get_data_access.assert_called_once()
+
+    def test_invalid_permission(self):
+        with self.assertRaises(IllegalArgumentException):
+            AccessGrantsTransferSubscriber(mock.Mock(), "LIST")